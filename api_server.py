@@ -1,19 +1,42 @@
 import asyncio
+import heapq
 import os
+import sqlite3
+import time
 
 import google.api_core.exceptions as google_exceptions
 from dotenv import load_dotenv
-from flask import Flask, jsonify, request
+from flask import Flask, Response, jsonify, request
 from flask_cors import CORS
 from flask_limiter import Limiter
 from flask_limiter.util import get_remote_address
 
+from storage import MODERATION_ACTIONS, ROLLUP_BUCKETS
+from utils.guild_backup import BackupSpool, iter_ndjson
 from utils.logger import log
+from utils.profanity_matcher import normalize_words
 from utils.sanitize import sanitize_prompt
 
 load_dotenv()
 
 FLASK_DEBUG = os.getenv("FLASK_ENV", "production") == "development"
+MAX_CUSTOM_WORDS = 500
+MAX_CUSTOM_WORD_LENGTH = 64
+# Members per /members page, and most users one warnings reset may cover.
+MEMBERS_PAGE_SIZE = 1000
+MAX_RESET_USERS = 1000
+# Most hourly or daily buckets one moderation stats request may cover.
+MAX_STATS_BUCKETS = 400
+# Accepted ranges for the numeric spam settings; the upper bounds match the
+# spam detector's per-key history caps and longest window.
+SPAM_SETTING_RANGES = {
+    "spamMessageLimit": (2, 100),
+    "spamChannelLimit": (2, 500),
+    "spamWindow": (1, 300),
+    "spamDuplicateLimit": (2, 100),
+    "raidJoinLimit": (0, 1000),
+    "raidWindow": (1, 300),
+}
 
 app = Flask(__name__)
 app.config["DEBUG"] = FLASK_DEBUG
@@ -39,6 +62,18 @@ def _run_on_bot_loop(coro):
     return future.result()
 
 
+def _stream_from_bot_loop(agen):
+    # Pulls one item at a time, so only the current chunk is ever in memory.
+    try:
+        while True:
+            try:
+                yield _run_on_bot_loop(agen.__anext__())
+            except StopAsyncIteration:
+                return
+    finally:
+        _run_on_bot_loop(agen.aclose())
+
+
 def _get_build_request_context(data):
     guild_id_raw = data.get("guildId", "")
     if not str(guild_id_raw).isdigit():
@@ -110,6 +145,71 @@ def _serialize_build_preview(setup_plan):
     }
 
 
+def _parse_word_list(data, key):
+    """(normalized words or None if absent, error message or None)."""
+    words = data.get(key)
+    if words is None:
+        return None, None
+    if not isinstance(words, list) or not all(isinstance(word, str) for word in words):
+        return None, f"{key} must be a list of strings"
+    words = normalize_words(words)
+    if len(words) > MAX_CUSTOM_WORDS:
+        return None, f"{key} can hold at most {MAX_CUSTOM_WORDS} words"
+    if any(len(word) > MAX_CUSTOM_WORD_LENGTH for word in words):
+        return None, f"Words in {key} can be at most {MAX_CUSTOM_WORD_LENGTH} characters"
+    return words, None
+
+
+def _parse_spam_settings(data):
+    """(spam settings present in data or None if none, error message or None)."""
+    settings = {}
+    if data.get("spamFilter") is not None:
+        if not isinstance(data["spamFilter"], bool):
+            return None, "spamFilter must be true or false"
+        settings["spamFilter"] = data["spamFilter"]
+    for key, (low, high) in SPAM_SETTING_RANGES.items():
+        value = data.get(key)
+        if value is None:
+            continue
+        if not isinstance(value, int) or isinstance(value, bool) or not low <= value <= high:
+            return None, f"{key} must be a whole number from {low} to {high}"
+        settings[key] = value
+    return settings or None, None
+
+
+def _parse_user_ids(data):
+    """(user ids from "userIds" or a single "userId", error message or None).
+    Ids may be strings, as the dashboard sends them, or integers."""
+    raw_ids = data.get("userIds")
+    if raw_ids is None and data.get("userId") is not None:
+        raw_ids = [data["userId"]]
+    if not isinstance(raw_ids, list) or not raw_ids:
+        return None, "userId or userIds is required"
+    if len(raw_ids) > MAX_RESET_USERS:
+        return None, f"At most {MAX_RESET_USERS} users can be reset at once"
+    user_ids = []
+    for raw_id in raw_ids:
+        if isinstance(raw_id, bool) or not (
+            isinstance(raw_id, int) or (isinstance(raw_id, str) and raw_id.isdigit())
+        ):
+            return None, "User ids must be numeric"
+        user_ids.append(int(raw_id))
+    return user_ids, None
+
+
+def _encode_leaderboard_cursor(row):
+    user_id, level, xp = row
+    return f"{level}:{xp}:{user_id}"
+
+
+def _decode_leaderboard_cursor(raw):
+    parts = raw.split(":")
+    if len(parts) != 3 or not all(part.isdigit() for part in parts):
+        return None
+    level, xp, user_id = (int(part) for part in parts)
+    return level, xp, user_id
+
+
 @app.before_request
 def require_api_key():
     if request.method == "OPTIONS" or request.path == "/health":
@@ -134,6 +234,24 @@ def health_check():
     )
 
 
+@app.route("/api/stats", methods=["GET"])
+def get_stats():
+    general = app.bot.get_cog("General")
+    spam_guard = app.bot.get_cog("SpamGuard")
+    ai_cog = app.bot.get_cog("AICommands")
+    return jsonify(
+        {
+            "db": app.bot.db.get_stats(),
+            "message_pipeline": app.bot.message_pipeline.get_stats(),
+            "work_queue": app.bot.work_queue.get_stats(),
+            "xp_cooldowns": general.xp_cooldowns.get_stats() if general else None,
+            "profanity": app.bot.profanity_scanner.get_stats(),
+            "spam": spam_guard.detector.get_stats() if spam_guard else None,
+            "build_plan_cache": ai_cog.plan_cache.get_stats() if ai_cog else None,
+        }
+    )
+
+
 @app.route("/api/guilds", methods=["GET"])
 def get_guilds():
     guilds_list = [
@@ -163,17 +281,209 @@ def get_guild_info(guild_id):
     return jsonify(info)
 
 
+@app.route("/api/guilds/<int:guild_id>/leaderboard", methods=["GET"])
+def get_guild_leaderboard(guild_id):
+    guild = app.bot.get_guild(guild_id)
+    if not guild:
+        return jsonify({"error": "Guild not found"}), 404
+
+    limit = max(1, min(request.args.get("limit", default=25, type=int), 100))
+    after = None
+    after_raw = request.args.get("after")
+    if after_raw:
+        after = _decode_leaderboard_cursor(after_raw)
+        if after is None:
+            return jsonify({"error": "Invalid cursor"}), 400
+
+    # One extra row tells us whether another page exists.
+    rows = _run_on_bot_loop(app.bot.db.get_leaderboard(guild_id, limit + 1, after))
+    page, has_more = rows[:limit], len(rows) > limit
+
+    entries = []
+    for user_id, level, xp in page:
+        member = guild.get_member(user_id)
+        entries.append(
+            {
+                "userId": str(user_id),
+                "name": member.display_name if member else None,
+                "level": level,
+                "xp": xp,
+            }
+        )
+
+    return jsonify(
+        {
+            "entries": entries,
+            "nextCursor": _encode_leaderboard_cursor(page[-1]) if has_more else None,
+        }
+    )
+
+
+@app.route("/api/guilds/<int:guild_id>/members", methods=["GET"])
+def get_guild_members(guild_id):
+    guild = app.bot.get_guild(guild_id)
+    if not guild:
+        return jsonify({"error": "Guild not found"}), 404
+
+    # Pages are ordered by member id; pass the last id seen as ?after= to
+    # get the next one.
+    limit = max(1, min(request.args.get("limit", default=MEMBERS_PAGE_SIZE, type=int), MEMBERS_PAGE_SIZE))
+    after = request.args.get("after", default=0, type=int)
+    page = heapq.nsmallest(
+        limit,
+        (member for member in guild.members if not member.bot and member.id > after),
+        key=lambda member: member.id,
+    )
+    stats = _run_on_bot_loop(app.bot.db.get_member_stats(guild_id, [member.id for member in page]))
+
+    members = []
+    for member in page:
+        warnings, xp, level = stats.get(member.id, (0, 0, 0))
+        members.append(
+            {
+                "id": str(member.id),
+                "name": member.display_name,
+                "username": member.name,
+                "warnings": warnings,
+                "xp": xp,
+                "level": level,
+            }
+        )
+    return jsonify(members)
+
+
+@app.route("/api/guilds/<int:guild_id>/warnings/reset", methods=["POST"])
+def reset_guild_warnings(guild_id):
+    guild = app.bot.get_guild(guild_id)
+    if not guild:
+        return jsonify({"error": "Guild not found"}), 404
+
+    user_ids, error = _parse_user_ids(request.get_json(silent=True) or {})
+    if error is not None:
+        return jsonify({"error": error}), 400
+
+    reset = _run_on_bot_loop(app.bot.db.reset_warnings_bulk(guild_id, user_ids))
+    member = guild.get_member(user_ids[0]) if len(user_ids) == 1 else None
+    if member is not None:
+        message = f"Warnings for {member.display_name} have been reset."
+    else:
+        message = f"Warnings have been reset for {len(user_ids)} member(s)."
+    return jsonify({"message": message, "reset": reset})
+
+
+@app.route("/api/guilds/<int:guild_id>/moderation/stats", methods=["GET"])
+def get_moderation_stats(guild_id):
+    if not app.bot.get_guild(guild_id):
+        return jsonify({"error": "Guild not found"}), 404
+
+    granularity = request.args.get("granularity", "hour")
+    if granularity not in ROLLUP_BUCKETS:
+        return jsonify({"error": f"granularity must be one of {', '.join(ROLLUP_BUCKETS)}"}), 400
+    seconds = ROLLUP_BUCKETS[granularity]
+    default_buckets = 48 if granularity == "hour" else 30
+    count = max(1, min(request.args.get("buckets", default=default_buckets, type=int), MAX_STATS_BUCKETS))
+
+    # The last bucket is the current, still-filling hour or day.
+    now = int(time.time())
+    until = now - now % seconds + seconds
+    since = until - count * seconds
+    rows = _run_on_bot_loop(app.bot.db.get_moderation_stats(guild_id, granularity, since, until))
+
+    buckets = {start: dict.fromkeys(MODERATION_ACTIONS, 0) for start in range(since, until, seconds)}
+    totals = dict.fromkeys(MODERATION_ACTIONS, 0)
+    for bucket_start, action, events in rows:
+        buckets[bucket_start][action] = events
+        totals[action] += events
+
+    return jsonify(
+        {
+            "granularity": granularity,
+            "bucketSeconds": seconds,
+            "buckets": [{"start": start, "counts": counts} for start, counts in buckets.items()],
+            "totals": totals,
+        }
+    )
+
+
+@app.route("/api/guilds/<int:guild_id>/export", methods=["GET"])
+def export_guild_data(guild_id):
+    if not app.bot.get_guild(guild_id):
+        return jsonify({"error": "Guild not found"}), 404
+
+    return Response(
+        _stream_from_bot_loop(iter_ndjson(app.bot.db, guild_id)),
+        mimetype="application/x-ndjson",
+        headers={"Content-Disposition": f'attachment; filename="guild-{guild_id}-backup.ndjson"'},
+    )
+
+
+@app.route("/api/guilds/<int:guild_id>/import", methods=["POST"])
+def import_guild_data(guild_id):
+    if not app.bot.get_guild(guild_id):
+        return jsonify({"error": "Guild not found"}), 404
+
+    db = app.bot.db
+    counts = {}
+    batch = []
+
+    def import_batch():
+        for table, rows in _run_on_bot_loop(db.import_guild_records(guild_id, batch)).items():
+            counts[table] = counts.get(table, 0) + rows
+        batch.clear()
+
+    # Check every line before importing any of them, so a bad backup is
+    # rejected without half-applying it.
+    with BackupSpool() as spool:
+        try:
+            for line in request.stream:
+                spool.add(line)
+        except ValueError as e:
+            return jsonify({"error": f"Invalid backup at {e}", "imported": counts}), 400
+
+        try:
+            for record in spool:
+                batch.append(record)
+                if len(batch) >= 500:
+                    import_batch()
+            if batch:
+                import_batch()
+        except sqlite3.Error as e:
+            log.error("Backup import for guild %s failed: %s", guild_id, e)
+            return jsonify({"error": "Import failed", "imported": counts}), 500
+
+    if counts.get("reaction_roles") or counts.get("reaction_role_mappings"):
+        app.bot.reaction_role_mapping = _run_on_bot_loop(db.get_all_reaction_roles())
+
+    return jsonify({"imported": counts})
+
+
 @app.route("/api/automod_settings/<int:guild_id>", methods=["GET", "POST"])
 def automod_settings(guild_id):
     db = app.bot.db
     if request.method == "POST":
         data = request.get_json(silent=True) or {}
+        xp_cooldown = data.get("xpCooldown")
+        if xp_cooldown is not None and (
+            not isinstance(xp_cooldown, int) or isinstance(xp_cooldown, bool) or not 0 <= xp_cooldown <= 3600
+        ):
+            return jsonify({"error": "xpCooldown must be a whole number of seconds from 0 to 3600"}), 400
+        blocked_words, error = _parse_word_list(data, "blockedWords")
+        if error is None:
+            allowed_words, error = _parse_word_list(data, "allowedWords")
+        if error is None:
+            spam_settings, error = _parse_spam_settings(data)
+        if error is not None:
+            return jsonify({"error": error}), 400
         _run_on_bot_loop(
             db.set_automod_settings(
                 guild_id,
                 data.get("profanityFilter"),
                 data.get("warningLimit"),
                 data.get("limitAction"),
+                xp_cooldown,
+                blocked_words,
+                allowed_words,
+                spam_settings,
             )
         )
         return jsonify({"message": "Settings updated successfully"})
@@ -191,9 +501,11 @@ def build_server_preview():
         return error_response
 
     variation_hint = str(data.get("variationHint", "")).strip()
+    # "regenerate" asks for a fresh plan even if this theme is cached.
+    new_variation = data.get("regenerate") is True
 
     try:
-        setup_plan = _run_on_bot_loop(ai_cog.generate_build_plan(prompt, variation_hint))
+        setup_plan = _run_on_bot_loop(ai_cog.generate_build_plan(prompt, variation_hint, new_variation))
     except google_exceptions.ResourceExhausted:
         return (
             jsonify(
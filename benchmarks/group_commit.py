@@ -0,0 +1,83 @@
+"""Measure durable write latency and throughput at different group-commit windows.
+
+In the durable scenario each simulated client loops on set_afk() followed by
+wait_for_commit(), so every sample covers the full "my write is committed"
+round trip. In the fire-and-forget scenario clients only await set_afk(),
+which is how the message path uses the database.
+
+Usage: python -m benchmarks.group_commit [--clients N] [--writes N] [--windows 0,5,10,20]
+"""
+
+import argparse
+import asyncio
+import os
+import statistics
+import tempfile
+import time
+
+from database import PersistentDB
+
+
+def _percentile(samples, pct):
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+async def _client(db, client_id, writes, latencies, durable):
+    for i in range(writes):
+        start = time.perf_counter()
+        await db.set_afk(1, client_id, f"away {i}")
+        if durable:
+            await db.wait_for_commit()
+        latencies.append(time.perf_counter() - start)
+
+
+async def run_window(directory, window_ms, clients, writes, durable):
+    path = os.path.join(directory, f"group_commit_{window_ms}_{int(durable)}.db")
+    db = PersistentDB(path, xp_flush_interval=0, group_commit_window=window_ms / 1000)
+    await db.connect()
+    latencies = []
+    try:
+        start = time.perf_counter()
+        await asyncio.gather(
+            *(_client(db, c, writes, latencies, durable) for c in range(clients))
+        )
+        await db.wait_for_commit()
+        elapsed = time.perf_counter() - start
+        commits = db.get_stats()["group_commit"]["commits"] if window_ms else len(latencies)
+    finally:
+        await db.close()
+
+    print(
+        f"{window_ms:>6} ms {len(latencies) / elapsed:>10.0f} {commits:>8} "
+        f"{statistics.median(latencies) * 1000:>9.2f} {_percentile(latencies, 95) * 1000:>9.2f} "
+        f"{_percentile(latencies, 99) * 1000:>9.2f}"
+    )
+
+
+async def run(clients, writes, windows):
+    with tempfile.TemporaryDirectory(dir=os.getcwd()) as directory:
+        for durable in (True, False):
+            mode = "durable" if durable else "fire-and-forget"
+            print(f"\n{clients} concurrent clients x {writes} {mode} writes each")
+            print(
+                f"{'window':>9} {'writes/s':>10} {'commits':>8} "
+                f"{'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}"
+            )
+            for window_ms in windows:
+                await run_window(directory, window_ms, clients, writes, durable)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--clients", type=int, default=50)
+    parser.add_argument("--writes", type=int, default=40)
+    parser.add_argument("--windows", default="0,2,5,10,20")
+    args = parser.parse_args()
+    windows = [int(w) for w in args.windows.split(",") if w.strip()]
+    asyncio.run(run(args.clients, args.writes, windows))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+"""Measure event-loop lag while a burst of long messages is checked for profanity.
+
+A ticker sleeps 1 ms at a time and records how late it wakes up, standing in
+for gateway heartbeats and every other handler. Meanwhile a burst of long
+(~4000 character) messages is checked concurrently, as on_message would for
+messages arriving together, once per ProfanityScanner executor mode.
+
+A second table shows what offloading costs per message at each message size
+(scans awaited one at a time): the inline scan time next to the extra
+dispatch time of the thread and process pools, which is what
+PROFANITY_EXECUTOR_THRESHOLD trades against.
+
+Usage: python -m benchmarks.loop_lag [--burst N] [--threshold CHARS] [--workers N]
+"""
+
+import argparse
+import asyncio
+import time
+
+from benchmarks.profanity import build_corpus
+from utils.profanity_scanner import EXECUTOR_MODES, ProfanityScanner
+
+
+def _percentile(samples, pct):
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+async def _ticker(lags, stop, interval=0.001):
+    while not stop.is_set():
+        expected = time.perf_counter() + interval
+        await asyncio.sleep(interval)
+        lags.append(max(0.0, time.perf_counter() - expected))
+
+
+async def run_burst(mode, corpus, threshold, workers):
+    scanner = ProfanityScanner(mode=mode, threshold=threshold, workers=workers)
+    try:
+        # Start the pool (and for processes, build their matchers) up front.
+        await scanner.contains_profanity(corpus[0])
+        lags = []
+        stop = asyncio.Event()
+        ticker = asyncio.create_task(_ticker(lags, stop))
+        await asyncio.sleep(0.01)
+        lags.clear()
+
+        started = time.perf_counter()
+        await asyncio.gather(*(scanner.contains_profanity(text) for text in corpus))
+        elapsed = time.perf_counter() - started
+        stop.set()
+        await ticker
+    finally:
+        scanner.close()
+
+    print(
+        f"{mode:<8} {elapsed * 1000:>9.1f} {len(corpus) / elapsed:>9.0f} "
+        f"{_percentile(lags, 50) * 1000:>8.2f} {_percentile(lags, 99) * 1000:>8.2f} {max(lags) * 1000:>8.2f}"
+    )
+
+
+async def run_overhead(workers, count=200):
+    print(f"{'size':<7} {'chars':>6} {'scan us':>8} {'thread +us':>10} {'process +us':>11}")
+    for size in ("short", "medium", "long"):
+        corpus = build_corpus(count, size, 0.0, seed=11)
+        timings = {}
+        for mode in EXECUTOR_MODES:
+            scanner = ProfanityScanner(mode=mode, threshold=0, workers=workers)
+            try:
+                await scanner.contains_profanity(corpus[0])
+                for text in corpus:
+                    await scanner.contains_profanity(text)
+            finally:
+                scanner.close()
+            timings[mode] = scanner.metrics
+        chars = sum(len(text) for text in corpus) // len(corpus)
+        scan = timings["none"].get("inline").percentile(50)
+        thread = timings["thread"].get("dispatch").percentile(50)
+        process = timings["process"].get("dispatch").percentile(50)
+        print(f"{size:<7} {chars:>6} {scan * 1e6:>8.0f} {thread * 1e6:>10.0f} {process * 1e6:>11.0f}")
+
+
+async def run(burst, threshold, workers):
+    corpus = build_corpus(burst, "long", 0.0, seed=7)
+    print(f"Burst of {len(corpus)} messages of ~{sum(map(len, corpus)) // len(corpus)} chars, {workers} worker(s)")
+    print(f"{'mode':<8} {'burst ms':>9} {'msgs/s':>9} {'lag p50':>8} {'lag p99':>8} {'lag max':>8}")
+    for mode in EXECUTOR_MODES:
+        await run_burst(mode, corpus, threshold, workers)
+    print()
+    await run_overhead(workers)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--burst", type=int, default=200)
+    parser.add_argument("--threshold", type=int, default=1000)
+    parser.add_argument("--workers", type=int, default=2)
+    args = parser.parse_args()
+    asyncio.run(run(args.burst, args.threshold, args.workers))
+
+
+if __name__ == "__main__":
+    main()
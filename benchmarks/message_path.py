@@ -0,0 +1,149 @@
+"""Benchmark the per-message hot path (profanity check + AFK/XP) per storage engine.
+
+Feeds synthetic messages through the same MessagePipeline bot.on_message uses,
+with the Moderation and General stages registered, so engines can be compared
+with and without disk I/O. XP/AFK jobs run on the work queue, and the time to
+drain it is included. Per-stage timings are printed for each engine.
+
+The profanity scan itself is disabled by default (settings are still looked
+up) so the numbers reflect storage cost; pass --profanity to include it.
+
+Guilds use the default XP cooldown unless --xp-cooldown is given (0 grants XP
+on every message, as before cooldowns existed).
+
+Usage: python -m benchmarks.message_path [--messages N] [--engines sqlite,memory] [--profanity] [--xp-cooldown S]
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import tempfile
+import time
+from types import SimpleNamespace
+
+from cogs.general import General
+from cogs.moderation import Moderation
+from database import PersistentDB
+from memory_db import MemoryDB
+from utils.message_pipeline import MessagePipeline
+from utils.profanity_scanner import ProfanityScanner
+from utils.work_queue import WorkQueue
+
+WORDS = "the quick brown fox jumps over lazy dog hello team good game see you later".split()
+
+
+class FakeChannel:
+    def __init__(self, channel_id):
+        self.id = channel_id
+        self.sent = 0
+
+    async def send(self, *args, **kwargs):
+        self.sent += 1
+
+
+class FakeMessage:
+    def __init__(self, guild, channel, author, content, mentions):
+        self.guild = guild
+        self.channel = channel
+        self.author = author
+        self.content = content
+        self.mentions = mentions
+
+    async def delete(self):
+        pass
+
+
+def _member(user_id):
+    return SimpleNamespace(
+        id=user_id,
+        bot=False,
+        name=f"user{user_id}",
+        display_name=f"User {user_id}",
+        mention=f"<@{user_id}>",
+        guild_permissions=SimpleNamespace(administrator=False),
+    )
+
+
+def build_messages(count, guilds=20, users=500, seed=7):
+    rng = random.Random(seed)
+    guild_objs = [SimpleNamespace(id=guild_id) for guild_id in range(1, guilds + 1)]
+    members = [_member(user_id) for user_id in range(1, users + 1)]
+    channels = [FakeChannel(channel_id) for channel_id in range(1, guilds + 1)]
+    messages = []
+    for _ in range(count):
+        index = rng.randrange(guilds)
+        mentions = rng.sample(members, rng.choice((0, 0, 0, 1, 3)))
+        content = " ".join(rng.choice(WORDS) for _ in range(rng.randint(3, 20)))
+        messages.append(
+            FakeMessage(guild_objs[index], channels[index], rng.choice(members), content, mentions)
+        )
+    return messages
+
+
+async def _make_db(engine, directory):
+    if engine == "memory":
+        db = MemoryDB()
+    else:
+        db = PersistentDB(os.path.join(directory, "message_path.db"))
+    await db.connect()
+    return db
+
+
+async def run_engine(engine, messages, directory, profanity, xp_cooldown):
+    db = await _make_db(engine, directory)
+    pipeline = MessagePipeline(db)
+    # Big enough that nothing is shed; this benchmark measures cost, not overload.
+    work_queue = WorkQueue(maxsize=len(messages))
+    bot = SimpleNamespace(
+        db=db, message_pipeline=pipeline, work_queue=work_queue, profanity_scanner=ProfanityScanner()
+    )
+    await Moderation(bot).cog_load()
+    await General(bot).cog_load()
+    try:
+        # A few AFK users so the AFK branch is exercised.
+        for user_id in range(1, 6):
+            await db.set_afk(1, user_id, "brb")
+        for guild_id in {message.guild.id for message in messages}:
+            await db.set_automod_settings(guild_id, profanity, 3, "kick", xp_cooldown)
+
+        work_queue.start()
+        start = time.perf_counter()
+        for message in messages:
+            await pipeline.process(message)
+            # Yield like the gateway does between events so workers keep up.
+            await asyncio.sleep(0)
+        await work_queue.stop()
+        elapsed = time.perf_counter() - start
+    finally:
+        await db.close()
+
+    print(
+        f"{engine:<8} {len(messages) / elapsed:>10.0f} msgs/sec  "
+        f"{elapsed / len(messages) * 1e6:>8.1f} us/msg  "
+        f"{work_queue.get_stats()['enqueued']:>7} XP/AFK jobs"
+    )
+    for stage, timing in pipeline.metrics.snapshot().items():
+        print(f"  {stage:<12} p50 {timing['p50_ms'] * 1000:>7.1f} us  p99 {timing['p99_ms'] * 1000:>7.1f} us")
+
+
+async def run(count, engines, profanity, xp_cooldown):
+    messages = build_messages(count)
+    with tempfile.TemporaryDirectory(dir=os.getcwd()) as directory:
+        for engine in engines:
+            await run_engine(engine, messages, directory, profanity, xp_cooldown)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--messages", type=int, default=20000)
+    parser.add_argument("--engines", default="sqlite,memory")
+    parser.add_argument("--profanity", action="store_true")
+    parser.add_argument("--xp-cooldown", type=int, default=None)
+    args = parser.parse_args()
+    engines = [engine.strip() for engine in args.engines.split(",") if engine.strip()]
+    asyncio.run(run(args.messages, engines, args.profanity, args.xp_cooldown))
+
+
+if __name__ == "__main__":
+    main()
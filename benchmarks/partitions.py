@@ -0,0 +1,117 @@
+"""Measure how a write storm in one guild affects writes in other guilds.
+
+One "storm" guild runs many concurrent clients calling add_warning() with
+write-through commits. Meanwhile a few quiet guilds each write once every few
+milliseconds, and their latency is recorded. With a single file every quiet
+write queues behind the storm on the one writer connection. With partitions,
+guilds in other files keep their own writer.
+
+Usage: python -m benchmarks.partitions [--storm-clients N] [--seconds S] [--partitions 1,2,4,8]
+"""
+
+import argparse
+import asyncio
+import os
+import statistics
+import tempfile
+import time
+
+from database import PersistentDB
+from partitioned_db import PartitionedDB
+
+STORM_GUILD = 1
+
+
+def _percentile(samples, pct):
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def _quiet_guilds(db, count):
+    # Pick guilds outside the storm's partition; with one file there is no choice.
+    if not isinstance(db, PartitionedDB):
+        return list(range(2, 2 + count))
+    storm_shard = db._shard(STORM_GUILD)
+    guilds = []
+    guild_id = 2
+    while len(guilds) < count:
+        if db._shard(guild_id) is not storm_shard:
+            guilds.append(guild_id)
+        guild_id += 1
+    return guilds
+
+
+async def _storm(db, client_id, stop):
+    writes = 0
+    while not stop.is_set():
+        await db.add_warning(STORM_GUILD, client_id)
+        writes += 1
+    return writes
+
+
+async def _quiet(db, guild_id, stop, latencies):
+    user_id = 0
+    while not stop.is_set():
+        start = time.perf_counter()
+        await db.add_warning(guild_id, user_id)
+        latencies.append(time.perf_counter() - start)
+        user_id += 1
+        await asyncio.sleep(0.005)
+
+
+async def run_layout(directory, partitions, storm_clients, quiet_count, seconds):
+    path = os.path.join(directory, f"partitions_{partitions}.db")
+    options = {"xp_flush_interval": 0, "read_pool_size": 0}
+    if partitions > 1:
+        db = PartitionedDB(path, partitions=partitions, **options)
+    else:
+        db = PersistentDB(path, **options)
+    await db.connect()
+
+    stop = asyncio.Event()
+    latencies = []
+    try:
+        tasks = [asyncio.create_task(_storm(db, c, stop)) for c in range(storm_clients)]
+        tasks += [
+            asyncio.create_task(_quiet(db, guild_id, stop, latencies))
+            for guild_id in _quiet_guilds(db, quiet_count)
+        ]
+        await asyncio.sleep(seconds)
+        stop.set()
+        results = await asyncio.gather(*tasks)
+    finally:
+        await db.close()
+
+    storm_writes = sum(results[:storm_clients])
+    print(
+        f"{partitions:>10} {storm_writes / seconds:>12.0f} {len(latencies):>8} "
+        f"{statistics.median(latencies) * 1000:>9.2f} {_percentile(latencies, 95) * 1000:>9.2f} "
+        f"{_percentile(latencies, 99) * 1000:>9.2f}"
+    )
+
+
+async def run(storm_clients, quiet_count, seconds, layouts):
+    with tempfile.TemporaryDirectory(dir=os.getcwd()) as directory:
+        print(f"{storm_clients} storm clients in guild {STORM_GUILD}, {quiet_count} quiet guild(s), {seconds}s each")
+        print(
+            f"{'partitions':>10} {'storm w/s':>12} {'quiet n':>8} "
+            f"{'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}"
+        )
+        for partitions in layouts:
+            await run_layout(directory, partitions, storm_clients, quiet_count, seconds)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--storm-clients", type=int, default=50)
+    parser.add_argument("--quiet-guilds", type=int, default=4)
+    parser.add_argument("--seconds", type=float, default=5)
+    parser.add_argument("--partitions", default="1,2,4,8")
+    args = parser.parse_args()
+    layouts = [int(p) for p in args.partitions.split(",") if p.strip()]
+    asyncio.run(run(args.storm_clients, args.quiet_guilds, args.seconds, layouts))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+"""Compare better_profanity with ProfanityMatcher on a synthetic chat corpus.
+
+Messages are built from everyday words with a share of listed words mixed in,
+some written in leetspeak, mixed case, or split by separators ("f.u.c.k",
+"hand job"). For each message length both checkers scan the same messages;
+the table shows messages/sec for each and how many verdicts differ (this
+should always be 0).
+
+Usage: python -m benchmarks.profanity [--messages N] [--profane-share F] [--seed N]
+"""
+
+import argparse
+import random
+import time
+
+from better_profanity import profanity
+
+from utils.profanity_matcher import ProfanityMatcher, default_words
+
+WORDS = (
+    "the quick brown fox jumps over lazy dog hello team good game see you later "
+    "class assume passage shitake scunthorpe analysis cocktail butterfly therapist "
+    "lol gg wp brb @everyone https://example.com/a-b_c?x=1 :) <3 café naïve"
+).split()
+LEET = {"a": "@4", "i": "1!", "o": "0", "e": "3", "s": "$5", "t": "7"}
+# Words per message, and how much smaller than --messages each corpus is.
+SIZES = {"short": (3, 20, 1), "medium": (40, 80, 10), "long": (600, 700, 100)}
+
+
+def _disguise(word, rng):
+    chars = []
+    for char in word:
+        if char in LEET and rng.random() < 0.3:
+            char = rng.choice(LEET[char])
+        elif rng.random() < 0.2:
+            char = char.upper()
+        chars.append(char)
+    return "".join(chars)
+
+
+def build_corpus(count, size, profane_share, seed):
+    rng = random.Random(seed)
+    listed = default_words()
+    low, high, _ = SIZES[size]
+    corpus = []
+    for _ in range(count):
+        words = [rng.choice(WORDS) for _ in range(rng.randint(low, high))]
+        if rng.random() < profane_share:
+            words[rng.randrange(len(words))] = _disguise(rng.choice(listed), rng)
+        corpus.append(" ".join(words)[:4000])
+    return corpus
+
+
+def _rate(check, corpus):
+    started = time.perf_counter()
+    verdicts = [check(text) for text in corpus]
+    return len(corpus) / (time.perf_counter() - started), verdicts
+
+
+def run(count, profane_share, seed):
+    started = time.perf_counter()
+    matcher = ProfanityMatcher()
+    print(
+        f"ProfanityMatcher: {matcher.word_count} words, {matcher.state_count} states, "
+        f"joins up to {matcher.max_joined_words} words, "
+        f"built in {(time.perf_counter() - started) * 1000:.1f} ms"
+    )
+    print(f"{'size':<7} {'msgs':>6} {'profane':>7} {'library/s':>10} {'matcher/s':>10} {'speedup':>8} {'mismatch':>8}")
+    for size, (_, _, divisor) in SIZES.items():
+        # better_profanity is slow on long messages; keep its runs short.
+        corpus = build_corpus(max(20, count // divisor), size, profane_share, seed)
+        library_rate, expected = _rate(profanity.contains_profanity, corpus)
+        matcher_rate, actual = _rate(matcher.contains_profanity, corpus)
+        mismatches = sum(left != right for left, right in zip(expected, actual))
+        print(
+            f"{size:<7} {len(corpus):>6} {sum(expected):>7} {library_rate:>10.0f} {matcher_rate:>10.0f} "
+            f"{matcher_rate / library_rate:>7.0f}x {mismatches:>8}"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--messages", type=int, default=2000)
+    parser.add_argument("--profane-share", type=float, default=0.1)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+    run(args.messages, args.profane_share, args.seed)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+"""Count aiosqlite worker-thread hops per message: separate calls vs db.batch().
+
+Each simulated message does what a busy one does on the message path: the
+author returns from AFK, earns XP and picks up a warning, and the handler
+reads the guild's automod settings. Hops are counted by wrapping the
+connection's internal _execute(), which every aiosqlite call goes through.
+
+Usage: python -m benchmarks.unit_of_work [--messages N]
+"""
+
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+
+from database import PersistentDB
+
+
+def _count_hops(db):
+    counter = {"hops": 0}
+    original = db.conn._execute
+
+    async def counting_execute(fn, *args, **kwargs):
+        counter["hops"] += 1
+        return await original(fn, *args, **kwargs)
+
+    db.conn._execute = counting_execute
+    return counter
+
+
+async def separate_calls(db, guild_id, user_id):
+    await db.get_automod_settings(guild_id)
+    await db.remove_afk(guild_id, user_id)
+    level = await db.add_xp(guild_id, user_id, 10)
+    warnings = await db.add_warning(guild_id, user_id)
+    return level, warnings
+
+
+async def batched(db, guild_id, user_id):
+    async with db.batch() as batch:
+        batch.get_automod_settings(guild_id)
+        batch.remove_afk(guild_id, user_id)
+        level = batch.add_xp(guild_id, user_id, 10)
+        warnings = batch.add_warning(guild_id, user_id)
+    return level.result(), warnings.result()
+
+
+async def run_case(directory, label, handler, messages, **db_options):
+    db = PersistentDB(os.path.join(directory, f"{label}.db"), **db_options)
+    await db.connect()
+    try:
+        for user_id in range(messages):
+            await db.set_afk(1, user_id, "brb")
+        counter = _count_hops(db)
+        start = time.perf_counter()
+        for user_id in range(messages):
+            await handler(db, 1, user_id)
+        elapsed = time.perf_counter() - start
+    finally:
+        await db.close()
+
+    print(
+        f"{label:<28} {counter['hops'] / messages:>6.2f} hops/msg "
+        f"{messages / elapsed:>9.0f} msgs/sec"
+    )
+
+
+async def run(messages):
+    with tempfile.TemporaryDirectory(dir=os.getcwd()) as directory:
+        for mode, options in (
+            ("write-through xp", {"xp_flush_interval": 0}),
+            ("buffered xp", {"xp_flush_interval": 60, "xp_flush_threshold": messages + 1}),
+        ):
+            print(f"\n{mode}")
+            await run_case(directory, f"separate ({mode})", separate_calls, messages, **options)
+            await run_case(directory, f"batch ({mode})", batched, messages, **options)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--messages", type=int, default=3000)
+    args = parser.parse_args()
+    asyncio.run(run(args.messages))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+"""Compare the legacy multi-statement add_xp/add_warning with UPSERT ... RETURNING.
+
+Usage: python -m benchmarks.upsert_returning [--calls N] [--users N]
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import tempfile
+import time
+
+from database import PersistentDB
+
+
+async def legacy_add_xp(conn, guild_id, user_id, xp_to_add):
+    await conn.execute(
+        "INSERT OR IGNORE INTO user_data (guild_id, user_id, xp, level) VALUES (?, ?, 0, 0)",
+        (guild_id, user_id),
+    )
+    await conn.execute(
+        "UPDATE user_data SET xp = xp + ? WHERE guild_id = ? AND user_id = ?",
+        (xp_to_add, guild_id, user_id),
+    )
+
+    async with conn.execute(
+        "SELECT xp, level FROM user_data WHERE guild_id=? AND user_id=?",
+        (guild_id, user_id),
+    ) as cursor:
+        row = await cursor.fetchone()
+        xp, level = row if row else (0, 0)
+
+    required_xp = (level + 1) * 100
+    if xp >= required_xp:
+        new_level = level + 1
+        new_xp = xp - required_xp
+        await conn.execute(
+            "UPDATE user_data SET level = ?, xp = ? WHERE guild_id = ? AND user_id = ?",
+            (new_level, new_xp, guild_id, user_id),
+        )
+        await conn.commit()
+        return new_level
+
+    await conn.commit()
+    return None
+
+
+async def legacy_add_warning(conn, guild_id, user_id):
+    await conn.execute(
+        "INSERT INTO warnings (guild_id, user_id, count) VALUES (?, ?, 1) "
+        "ON CONFLICT(guild_id, user_id) DO UPDATE SET count = count + 1",
+        (guild_id, user_id),
+    )
+    await conn.commit()
+
+    async with conn.execute(
+        "SELECT count FROM warnings WHERE guild_id=? AND user_id=?",
+        (guild_id, user_id),
+    ) as cursor:
+        row = await cursor.fetchone()
+        return row[0] if row else 0
+
+
+async def _time_calls(label, calls, func):
+    start = time.perf_counter()
+    for i in range(calls):
+        await func(i)
+    elapsed = time.perf_counter() - start
+    print(f"{label:<32} {calls / elapsed:>10.0f} calls/sec  ({elapsed * 1000:.0f} ms total)")
+    return calls / elapsed
+
+
+async def run(calls, users):
+    rng = random.Random(42)
+    grants = [(rng.randrange(users), rng.randint(5, 15)) for _ in range(calls)]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db = PersistentDB(os.path.join(tmp, "bench.db"), xp_flush_interval=0)
+        await db.connect()
+        try:
+            legacy_xp = await _time_calls(
+                "add_xp (legacy)",
+                calls,
+                lambda i: legacy_add_xp(db.conn, 1, grants[i][0], grants[i][1]),
+            )
+            upsert_xp = await _time_calls(
+                "add_xp (upsert returning)",
+                calls,
+                lambda i: db.add_xp(2, grants[i][0], grants[i][1]),
+            )
+            legacy_warn = await _time_calls(
+                "add_warning (legacy)",
+                calls,
+                lambda i: legacy_add_warning(db.conn, 1, grants[i][0]),
+            )
+            upsert_warn = await _time_calls(
+                "add_warning (upsert returning)",
+                calls,
+                lambda i: db.add_warning(2, grants[i][0]),
+            )
+
+            # Both implementations must end up with identical rows.
+            for table in ("user_data", "warnings"):
+                legacy_rows = await db.conn.execute_fetchall(
+                    f"SELECT * FROM {table} WHERE guild_id=1 ORDER BY user_id"
+                )
+                upsert_rows = await db.conn.execute_fetchall(
+                    f"SELECT * FROM {table} WHERE guild_id=2 ORDER BY user_id"
+                )
+                assert [row[1:] for row in legacy_rows] == [row[1:] for row in upsert_rows], table
+        finally:
+            await db.close()
+
+    print(f"add_xp speedup:      {upsert_xp / legacy_xp:.2f}x")
+    print(f"add_warning speedup: {upsert_warn / legacy_warn:.2f}x")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--calls", type=int, default=5000)
+    parser.add_argument("--users", type=int, default=200)
+    args = parser.parse_args()
+    asyncio.run(run(args.calls, args.users))
+
+
+if __name__ == "__main__":
+    main()
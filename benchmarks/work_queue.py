@@ -0,0 +1,110 @@
+"""Measure message critical-path latency with XP/AFK work inline vs queued.
+
+Storage is MemoryDB with an artificial delay on every XP/AFK write, standing in
+for a slow disk. Messages arrive at a fixed rate. "inline" awaits the XP/AFK
+work before the message is considered handled, as on_message used to;
+"queued" hands it to the WorkQueue. With an arrival rate above what the
+workers can write, the queued run shows shedding and coalescing instead of
+unbounded growth.
+
+Usage: python -m benchmarks.work_queue [--rate N] [--seconds S] [--write-ms MS] [--workers N] [--queue-size N]
+"""
+
+import argparse
+import asyncio
+import time
+from types import SimpleNamespace
+
+from benchmarks.message_path import build_messages
+from cogs.general import General
+from cogs.moderation import Moderation
+from memory_db import MemoryDB
+from utils.message_pipeline import MessagePipeline
+from utils.profanity_scanner import ProfanityScanner
+from utils.work_queue import WorkQueue
+
+
+class SlowWritesDB(MemoryDB):
+    def __init__(self, write_seconds):
+        super().__init__()
+        self.write_seconds = write_seconds
+
+    async def add_xp(self, guild_id, user_id, xp_to_add):
+        await asyncio.sleep(self.write_seconds)
+        return await super().add_xp(guild_id, user_id, xp_to_add)
+
+    async def remove_afk(self, guild_id, user_id):
+        await asyncio.sleep(self.write_seconds)
+        await super().remove_afk(guild_id, user_id)
+
+
+def _percentile(samples, pct):
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+async def run_mode(mode, messages, rate, write_seconds, workers, queue_size):
+    db = SlowWritesDB(write_seconds)
+    await db.connect()
+    pipeline = MessagePipeline(db)
+    work_queue = WorkQueue(maxsize=queue_size, workers=workers)
+    bot = SimpleNamespace(
+        db=db, message_pipeline=pipeline, work_queue=work_queue, profanity_scanner=ProfanityScanner()
+    )
+    general = General(bot)
+    await Moderation(bot).cog_load()
+    if mode == "queued":
+        await general.cog_load()
+    for guild_id in {message.guild.id for message in messages}:
+        await db.set_automod_settings(guild_id, False, 3, "kick")
+
+    latencies = []
+    max_depth = 0
+    work_queue.start()
+    interval = 1 / rate
+    start = time.perf_counter()
+    for index, message in enumerate(messages):
+        delay = start + index * interval - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        received = time.perf_counter()
+        await pipeline.process(message)
+        if mode == "inline":
+            await general._apply_activity((message, 10, False))
+        latencies.append(time.perf_counter() - received)
+        max_depth = max(max_depth, work_queue.get_stats()["depth"])
+    await work_queue.stop()
+    await db.close()
+
+    stats = work_queue.get_stats()
+    print(
+        f"{mode:<7} {_percentile(latencies, 50) * 1000:>8.3f} {_percentile(latencies, 99) * 1000:>8.3f} "
+        f"{max_depth:>6} {stats['enqueued']:>8} {stats['coalesced']:>9} {stats['dropped']:>7}"
+    )
+
+
+async def run(rate, seconds, write_seconds, workers, queue_size):
+    messages = build_messages(int(rate * seconds))
+    print(
+        f"{len(messages)} messages at {rate}/s, {write_seconds * 1000:.1f} ms per write, "
+        f"{workers} worker(s), queue size {queue_size}"
+    )
+    print(f"{'mode':<7} {'p50 ms':>8} {'p99 ms':>8} {'depth':>6} {'enqueued':>8} {'coalesced':>9} {'dropped':>7}")
+    for mode in ("inline", "queued"):
+        await run_mode(mode, messages, rate, write_seconds, workers, queue_size)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rate", type=float, default=2000)
+    parser.add_argument("--seconds", type=float, default=3)
+    parser.add_argument("--write-ms", type=float, default=2)
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--queue-size", type=int, default=1000)
+    args = parser.parse_args()
+    asyncio.run(run(args.rate, args.seconds, args.write_ms / 1000, args.workers, args.queue_size))
+
+
+if __name__ == "__main__":
+    main()
@@ -13,7 +13,12 @@ from waitress import serve as waitress_serve
 
 from api_server import app, run_api_server
 from database import PersistentDB
+from memory_db import MemoryDB
+from partitioned_db import PartitionedDB
 from utils.logger import log
+from utils.message_pipeline import MessagePipeline
+from utils.profanity_scanner import ProfanityScanner
+from utils.work_queue import WorkQueue
 
 load_dotenv()
 
@@ -24,15 +29,18 @@ GEMINI_MODEL = os.getenv("GEMINI_MODEL", "gemini-3-flash-preview")
 class SeromodBot(commands.Bot):
     async def setup_hook(self):
         await self.db.connect()
+        self.work_queue.start()
 
         initial_extensions = [
             "cogs.admin",
             "cogs.general",
             "cogs.events",
             "cogs.moderation",
+            "cogs.spam_guard",
             "cogs.ai_commands",
             "cogs.server_edit",
             "cogs.scheduled_tasks",
+            "cogs.db_maintenance",
         ]
 
         for extension in initial_extensions:
@@ -55,10 +63,38 @@ class SeromodBot(commands.Bot):
         try:
             await super().close()
         finally:
+            if hasattr(self, "work_queue"):
+                # Let queued XP/AFK jobs land before the database closes.
+                await self.work_queue.stop()
+            if hasattr(self, "profanity_scanner"):
+                self.profanity_scanner.close()
             if hasattr(self, "db"):
+                # PersistentDB.close() flushes any XP still sitting in the write-behind buffer.
                 await self.db.close()
 
 
+def create_storage(engine):
+    if engine == "memory":
+        log.warning("DB_ENGINE=memory: nothing will be persisted across restarts.")
+        return MemoryDB()
+
+    if engine == "sqlite":
+        options = {
+            "xp_flush_interval": float(os.getenv("XP_FLUSH_INTERVAL", "5")),
+            "xp_flush_threshold": int(os.getenv("XP_FLUSH_THRESHOLD", "500")),
+            "group_commit_window": float(os.getenv("DB_GROUP_COMMIT_MS", "0")) / 1000,
+            "read_pool_size": int(os.getenv("DB_READ_POOL_SIZE", "2")),
+            "slow_query_ms": float(os.getenv("DB_SLOW_QUERY_MS", "250")),
+        }
+        partitions = int(os.getenv("DB_PARTITIONS", "1"))
+        if partitions > 1:
+            return PartitionedDB(partitions=partitions, **options)
+        return PersistentDB(**options)
+
+    log.error("Unknown DB_ENGINE %r. Expected 'sqlite' or 'memory'.", engine)
+    sys.exit(1)
+
+
 def run_bot():
     token = os.getenv("DISCORD_TOKEN", "").strip()
     gemini_api_key = os.getenv("GEMINI_API_KEY", "").strip()
@@ -93,7 +129,17 @@ def run_bot():
     bot.chats = LRUCache(maxsize=500)
     bot.reaction_role_mapping = {}
     bot.gemini_semaphore = asyncio.Semaphore(2)
-    bot.db = PersistentDB()
+    bot.db = create_storage(os.getenv("DB_ENGINE", "sqlite").strip().lower())
+    bot.message_pipeline = MessagePipeline(bot.db)
+    bot.work_queue = WorkQueue(
+        maxsize=int(os.getenv("WORK_QUEUE_SIZE", "1000")),
+        workers=int(os.getenv("WORK_QUEUE_WORKERS", "2")),
+    )
+    bot.profanity_scanner = ProfanityScanner(
+        mode=os.getenv("PROFANITY_EXECUTOR", "thread").strip().lower(),
+        threshold=int(os.getenv("PROFANITY_EXECUTOR_THRESHOLD", "1000")),
+        workers=int(os.getenv("PROFANITY_EXECUTOR_WORKERS", "2")),
+    )
 
     def _run_api():
         port = int(os.getenv("PORT", 5000))
@@ -122,18 +168,10 @@ def run_bot():
         if message.author.bot or not message.guild:
             return
 
-        moderation_cog = bot.get_cog("Moderation")
-        if moderation_cog and await moderation_cog.check_message_for_profanity(message):
+        # Cogs register their message handlers as pipeline stages in cog_load.
+        if await bot.message_pipeline.process(message):
             return
 
-        ai_cog = bot.get_cog("AICommands")
-        if ai_cog and await ai_cog.handle_bot_mention(message):
-            return
-
-        general_cog = bot.get_cog("General")
-        if general_cog:
-            await general_cog.handle_afk_and_xp(message)
-
         await bot.process_commands(message)
 
     def _shutdown_handler(signum, frame):
@@ -1,9 +1,14 @@
 import logging
+import sqlite3
+import tempfile
 
+import aiohttp
 import discord
 from discord import app_commands
 from discord.ext import commands
 
+from utils.guild_backup import iter_ndjson, spool_lines
+
 log = logging.getLogger(__name__)
 
 
@@ -90,6 +95,61 @@ class Admin(commands.Cog):
         except Exception as e:
             await interaction.followup.send(f"An error occurred: {e}", ephemeral=True)
 
+    @app_commands.command(name="exportdata", description="Export this server's bot data as an NDJSON backup.")
+    @app_commands.checks.has_permissions(administrator=True)
+    async def exportdata(self, interaction: discord.Interaction):
+        await interaction.response.defer(ephemeral=True)
+        guild = interaction.guild
+
+        # Spool to disk chunk by chunk so memory stays flat for big servers.
+        with tempfile.TemporaryFile() as fp:
+            async for text in iter_ndjson(self.db, guild.id):
+                fp.write(text.encode("utf-8"))
+
+            size = fp.tell()
+            if size > guild.filesize_limit:
+                await interaction.followup.send(
+                    "The backup is too large to upload here. Use the dashboard API export instead.",
+                    ephemeral=True,
+                )
+                return
+
+            fp.seek(0)
+            await interaction.followup.send(
+                "Here is this server's backup.",
+                file=discord.File(fp, filename=f"guild-{guild.id}-backup.ndjson"),
+                ephemeral=True,
+            )
+
+    @app_commands.command(name="importdata", description="Import an NDJSON backup into this server.")
+    @app_commands.describe(backup="A backup file created by /exportdata.")
+    @app_commands.checks.has_permissions(administrator=True)
+    async def importdata(self, interaction: discord.Interaction, backup: discord.Attachment):
+        await interaction.response.defer(ephemeral=True)
+
+        try:
+            # Read the attachment line by line instead of loading it whole, and
+            # check all of it before importing anything.
+            async with aiohttp.ClientSession() as session:
+                async with session.get(backup.url) as response:
+                    response.raise_for_status()
+                    spool = await spool_lines(response.content)
+            with spool:
+                counts = await self.db.import_guild(interaction.guild.id, spool)
+        except ValueError as e:
+            await interaction.followup.send(f"That file is not a valid backup: {e}", ephemeral=True)
+            return
+        except (aiohttp.ClientError, sqlite3.Error) as e:
+            log.error("Backup import for guild %s failed: %s", interaction.guild.id, e)
+            await interaction.followup.send(f"Import failed: {e}", ephemeral=True)
+            return
+
+        if counts.get("reaction_roles") or counts.get("reaction_role_mappings"):
+            self.bot.reaction_role_mapping = await self.db.get_all_reaction_roles()
+
+        summary = ", ".join(f"{rows} {table}" for table, rows in counts.items()) or "nothing"
+        await interaction.followup.send(f"Imported {summary}.", ephemeral=True)
+
     @commands.Cog.listener()
     async def on_raw_reaction_add(self, payload: discord.RawReactionActionEvent):
         await self._handle_reaction(payload, add_role=True)
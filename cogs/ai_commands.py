@@ -10,6 +10,8 @@ import google.generativeai as genai
 from discord import app_commands, ui
 from discord.ext import commands
 
+from utils.build_plan_cache import BuildPlanCache, normalize_theme, plan_cache_key
+from utils.message_pipeline import AI_MENTION_STAGE, MessageContext
 from utils.sanitize import sanitize_prompt
 
 log = logging.getLogger(__name__)
@@ -100,6 +102,17 @@ class AICommands(commands.Cog):
         self.bot = bot
         self.bot.add_view(DeleteChannelView())
         self.max_messages_to_keep = 10
+        self.plan_cache = BuildPlanCache(
+            bot.db,
+            max_entries=int(os.getenv("BUILD_PLAN_CACHE_SIZE", "256")),
+            ttl=float(os.getenv("BUILD_PLAN_CACHE_TTL", str(7 * 24 * 3600))),
+        )
+
+    async def cog_load(self):
+        self.bot.message_pipeline.register("ai_mention", self.handle_bot_mention, AI_MENTION_STAGE)
+
+    async def cog_unload(self):
+        self.bot.message_pipeline.unregister("ai_mention")
 
     async def _manage_history(self, chat_session):
         history_length = len(chat_session.history)
@@ -121,11 +134,22 @@ class AICommands(commands.Cog):
                 return channel
         return None
 
-    async def generate_build_plan(self, theme: str, variation_hint: str = ""):
+    async def generate_build_plan(self, theme: str, variation_hint: str = "", new_variation: bool = False):
+        """Build plan for theme, served from plan_cache when the same theme and
+        hint were planned before. new_variation always asks the model for a
+        fresh plan and leaves the cache untouched."""
         clean_theme = sanitize_prompt(theme)
         clean_variation_hint = sanitize_prompt(str(variation_hint), max_length=80)
         setup_prompt = self._get_setup_prompt(clean_theme, clean_variation_hint)
+        cache_key = plan_cache_key(
+            model.model_name,
+            self._get_setup_prompt(normalize_theme(clean_theme), normalize_theme(clean_variation_hint)),
+        )
+        return await self.plan_cache.get_or_generate(
+            cache_key, lambda: self._request_build_plan(setup_prompt), bypass=new_variation
+        )
 
+    async def _request_build_plan(self, setup_prompt: str):
         async with self.bot.gemini_semaphore:
             response = await model.generate_content_async(setup_prompt)
 
@@ -173,7 +197,8 @@ class AICommands(commands.Cog):
 
         await self._execute_build_plan(guild, feedback_channel, setup_plan, reset_server)
 
-    async def handle_bot_mention(self, message: discord.Message) -> bool:
+    async def handle_bot_mention(self, ctx: MessageContext) -> bool:
+        message = ctx.message
         if self.bot.user in message.mentions:
             cleaned_message = message.content.replace(f"<@{self.bot.user.id}>", "").strip()
             if not cleaned_message:
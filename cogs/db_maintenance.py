@@ -0,0 +1,66 @@
+import logging
+import os
+import time
+
+from discord.ext import commands, tasks
+
+log = logging.getLogger(__name__)
+
+
+class DBMaintenance(commands.Cog):
+    def __init__(self, bot: commands.Bot):
+        self.bot = bot
+        self.checkpoint_interval = float(os.getenv("DB_CHECKPOINT_INTERVAL", "300"))
+        self.wal_truncate_bytes = int(os.getenv("DB_WAL_TRUNCATE_BYTES", str(32 * 1024 * 1024)))
+        self.optimize_interval = float(os.getenv("DB_OPTIMIZE_INTERVAL", "21600"))
+        self.vacuum_pages = int(os.getenv("DB_VACUUM_PAGES", "500"))
+
+    async def cog_load(self):
+        if self.checkpoint_interval > 0:
+            self.checkpoint_wal.change_interval(seconds=self.checkpoint_interval)
+            self.checkpoint_wal.start()
+        if self.optimize_interval > 0:
+            self.optimize_db.change_interval(seconds=self.optimize_interval)
+            self.optimize_db.start()
+
+    def cog_unload(self):
+        self.checkpoint_wal.cancel()
+        self.optimize_db.cancel()
+
+    @tasks.loop(seconds=300)
+    async def checkpoint_wal(self):
+        db = self.bot.db
+        try:
+            metrics = await db.get_db_metrics()
+            # PASSIVE never blocks writers or readers. Once the WAL has grown
+            # past the threshold, TRUNCATE resets it to zero bytes instead.
+            mode = "TRUNCATE" if metrics.get("wal_bytes", 0) >= self.wal_truncate_bytes else "PASSIVE"
+            result = await db.checkpoint(mode)
+            metrics = await db.get_db_metrics()
+            log.debug("WAL checkpoint (%s): %s, metrics: %s", mode, result, metrics)
+        except Exception as e:
+            log.warning("WAL checkpoint failed: %s", e)
+
+    @tasks.loop(seconds=21600)
+    async def optimize_db(self):
+        db = self.bot.db
+        try:
+            await db.optimize()
+            pruned = await db.prune_build_plans(time.time())
+            if pruned:
+                log.info("Pruned %s expired build plan(s).", pruned)
+            if self.vacuum_pages > 0:
+                freed = await db.incremental_vacuum(self.vacuum_pages)
+                if freed:
+                    log.info("Incremental vacuum released %s page(s).", freed)
+        except Exception as e:
+            log.warning("Database optimize/vacuum failed: %s", e)
+
+    @checkpoint_wal.before_loop
+    @optimize_db.before_loop
+    async def before_maintenance(self):
+        await self.bot.wait_until_ready()
+
+
+async def setup(bot: commands.Bot):
+    await bot.add_cog(DBMaintenance(bot))
@@ -2,42 +2,134 @@ import logging
 import random
 
 import discord
-from discord import app_commands
+from discord import app_commands, ui
 from discord.ext import commands
 
+from utils.message_pipeline import AFK_XP_STAGE, MessageContext
+from utils.xp_cooldown import XpCooldowns
+
 log = logging.getLogger(__name__)
 
+LEADERBOARD_PAGE_SIZE = 10
+
+
+def _merge_activity(pending, new):
+    # Latest message (for where to reply), summed XP, and clear AFK if any
+    # of the merged messages would have.
+    return new[0], pending[1] + new[1], pending[2] or new[2]
+
+
+class LeaderboardView(ui.View):
+    def __init__(self, db, guild: discord.Guild):
+        super().__init__(timeout=180)
+        self.db = db
+        self.guild = guild
+        # Keyset cursors for every page visited so far; the last one is the
+        # current page. None fetches the top of the leaderboard.
+        self.cursors = [None]
+        self.next_cursor = None
+
+    async def build_embed(self) -> discord.Embed:
+        rows = await self.db.get_leaderboard(
+            self.guild.id,
+            LEADERBOARD_PAGE_SIZE + 1,
+            self.cursors[-1],
+        )
+        page = rows[:LEADERBOARD_PAGE_SIZE]
+        has_more = len(rows) > LEADERBOARD_PAGE_SIZE
+        self.next_cursor = (page[-1][1], page[-1][2], page[-1][0]) if has_more else None
+        self.previous_button.disabled = len(self.cursors) == 1
+        self.next_button.disabled = not has_more
+
+        first_position = (len(self.cursors) - 1) * LEADERBOARD_PAGE_SIZE + 1
+        lines = [
+            f"**#{position}** <@{user_id}> - Level **{level}** ({xp} XP)"
+            for position, (user_id, level, xp) in enumerate(page, start=first_position)
+        ]
+
+        embed = discord.Embed(
+            title=f"Leaderboard for {self.guild.name}",
+            description="\n".join(lines) or "Nobody has earned any XP yet.",
+            color=discord.Color.og_blurple(),
+        )
+        embed.set_footer(text=f"Page {len(self.cursors)}")
+        return embed
+
+    @ui.button(label="Previous", style=discord.ButtonStyle.secondary)
+    async def previous_button(self, interaction: discord.Interaction, button: ui.Button):
+        if len(self.cursors) > 1:
+            self.cursors.pop()
+        await interaction.response.edit_message(embed=await self.build_embed(), view=self)
+
+    @ui.button(label="Next", style=discord.ButtonStyle.primary)
+    async def next_button(self, interaction: discord.Interaction, button: ui.Button):
+        if self.next_cursor is not None:
+            self.cursors.append(self.next_cursor)
+        await interaction.response.edit_message(embed=await self.build_embed(), view=self)
+
 
 class General(commands.Cog):
     def __init__(self, bot: commands.Bot):
         self.bot = bot
         self.db = bot.db
+        self.xp_cooldowns = XpCooldowns()
+
+    async def cog_load(self):
+        self.bot.message_pipeline.register("afk_xp", self.handle_afk_and_xp, AFK_XP_STAGE)
+
+    async def cog_unload(self):
+        self.bot.message_pipeline.unregister("afk_xp")
+
+    async def handle_afk_and_xp(self, ctx: MessageContext) -> bool:
+        # XP, AFK clearing and the notices they trigger don't need to finish
+        # before commands run, so they go to the bounded work queue. Activity
+        # from one user that piles up while queued collapses into one job.
+        message = ctx.message
+        # Messages inside the guild's XP cooldown earn nothing and, unless
+        # the author is coming back from AFK, never reach the database.
+        xp = 0
+        if self.xp_cooldowns.try_grant(ctx.guild_id, message.author.id, ctx.settings["xpCooldown"]):
+            xp = random.randint(5, 15)
+        if xp or ctx.author_is_afk:
+            self.bot.work_queue.submit_coalesced(
+                ("activity", ctx.guild_id, message.author.id),
+                self._apply_activity,
+                (message, xp, ctx.author_is_afk),
+                _merge_activity,
+            )
+        if any(user_id != message.author.id for user_id in ctx.afk_users):
+            self.bot.work_queue.submit(self._announce_afk_mentions, message, ctx.afk_users)
+        return False
 
-    async def handle_afk_and_xp(self, message: discord.Message):
-        if message.author.bot or not message.guild:
-            return
-
+    async def _apply_activity(self, activity):
+        message, xp, clear_afk = activity
         guild_id = message.guild.id
         user_id = message.author.id
 
-        if await self.db.get_afk_user(guild_id, user_id):
-            await self.db.remove_afk(guild_id, user_id)
+        # Clearing AFK and granting XP share one DB round trip.
+        async with self.db.batch() as batch:
+            if clear_afk:
+                batch.remove_afk(guild_id, user_id)
+            level_up = batch.add_xp(guild_id, user_id, xp) if xp else None
+
+        if clear_afk:
             await message.channel.send(
                 f"Welcome back, {message.author.mention}! I've removed your AFK status.",
                 delete_after=10,
             )
 
-        for member in message.mentions:
-            afk_message = await self.db.get_afk_user(guild_id, member.id)
-            if afk_message:
-                await message.channel.send(f"{member.display_name} is currently AFK: `{afk_message}`")
-
-        new_level = await self.db.add_xp(guild_id, user_id, random.randint(5, 15))
+        new_level = level_up.result() if level_up else None
         if new_level is not None:
             await message.channel.send(
                 f"Congrats {message.author.mention}, you leveled up to **Level {new_level}**!"
             )
 
+    async def _announce_afk_mentions(self, message: discord.Message, afk_users):
+        for member in message.mentions:
+            afk_message = afk_users.get(member.id)
+            if afk_message and member.id != message.author.id:
+                await message.channel.send(f"{member.display_name} is currently AFK: `{afk_message}`")
+
     @commands.Cog.listener()
     async def on_member_join(self, member: discord.Member):
         welcome_channel = discord.utils.get(member.guild.text_channels, name="welcome")
@@ -60,6 +152,7 @@ class General(commands.Cog):
     @app_commands.command(name="level", description="Check your current level and XP.")
     async def level(self, interaction: discord.Interaction):
         xp, level = await self.db.get_xp_and_level(interaction.guild.id, interaction.user.id)
+        rank, total = await self.db.get_rank(interaction.guild.id, interaction.user.id)
 
         xp_needed = (level + 1) * 100
         xp_to_next = xp_needed - xp
@@ -70,9 +163,19 @@ class General(commands.Cog):
         )
         embed.add_field(name="Level", value=f"**{level}**", inline=True)
         embed.add_field(name="XP", value=f"**{xp} / {xp_needed}**", inline=True)
+        embed.add_field(
+            name="Rank",
+            value=f"**#{rank}** of {total}" if rank else "Unranked",
+            inline=True,
+        )
         embed.set_footer(text=f"{xp_to_next} XP remaining until next level.")
         await interaction.response.send_message(embed=embed, ephemeral=True)
 
+    @app_commands.command(name="leaderboard", description="Show the server's XP leaderboard.")
+    async def leaderboard(self, interaction: discord.Interaction):
+        view = LeaderboardView(self.db, interaction.guild)
+        await interaction.response.send_message(embed=await view.build_embed(), view=view)
+
     @app_commands.command(name="afk", description="Set your AFK message. Will be removed when you next speak.")
     @app_commands.describe(message="Your AFK message (optional)")
     async def afk(self, interaction: discord.Interaction, message: str = "I'm currently away."):
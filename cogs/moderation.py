@@ -1,10 +1,11 @@
 import logging
 
 import discord
-from better_profanity import profanity
 from discord import app_commands
 from discord.ext import commands
 
+from utils.message_pipeline import MODERATION_STAGE, MessageContext
+
 log = logging.getLogger(__name__)
 
 
@@ -12,35 +13,47 @@ class Moderation(commands.Cog):
     def __init__(self, bot: commands.Bot):
         self.bot = bot
         self.db = bot.db
-        profanity.load_censor_words()
+        self.scanner = bot.profanity_scanner
+
+    async def cog_load(self):
+        self.bot.message_pipeline.register("profanity", self.check_message_for_profanity, MODERATION_STAGE)
+
+    async def cog_unload(self):
+        self.bot.message_pipeline.unregister("profanity")
 
-    async def check_message_for_profanity(self, message: discord.Message) -> bool:
+    async def check_message_for_profanity(self, ctx: MessageContext) -> bool:
+        message = ctx.message
         log.debug("Running profanity check for user: %s", message.author.name)
 
         if message.author.guild_permissions.administrator:
             log.debug("User is an administrator. Skipping profanity check.")
             return False
 
-        settings = await self.db.get_automod_settings(message.guild.id)
-        log.debug("Fetched AutoMod settings: %s", settings)
+        settings = ctx.settings
 
         if not settings.get("profanityFilter", False):
             log.debug("Profanity filter is disabled in settings. Skipping check.")
             return False
 
-        contains_profanity = profanity.contains_profanity(message.content)
-        log.debug("better_profanity returned: %s", contains_profanity)
+        contains_profanity = await self.scanner.contains_profanity(
+            message.content,
+            settings.get("blockedWords", ()),
+            settings.get("allowedWords", ()),
+        )
+        log.debug("Profanity matcher returned: %s", contains_profanity)
 
         if contains_profanity:
+            guild_id = message.guild.id
+            user_id = message.author.id
+
             try:
                 await message.delete()
+                await self.db.log_moderation_event(guild_id, "delete", user_id, reason="Profanity")
             except (discord.Forbidden, discord.NotFound):
                 pass
 
-            guild_id = message.guild.id
-            user_id = message.author.id
-
             new_warnings = await self.db.add_warning(guild_id, user_id)
+            await self.db.log_moderation_event(guild_id, "warning", user_id, reason="Profanity")
             warning_limit = settings.get("warningLimit", 3)
             punishment_type = settings.get("limitAction", "kick").lower()
 
@@ -54,6 +67,9 @@ class Moderation(commands.Cog):
                 try:
                     if punishment_type == "kick":
                         await message.author.kick(reason="Exceeded profanity warning limit")
+                        await self.db.log_moderation_event(
+                            guild_id, "kick", user_id, reason="Exceeded profanity warning limit"
+                        )
                         await message.channel.send(
                             f"{message.author.mention} has been kicked for repeated profanity."
                         )
@@ -62,6 +78,9 @@ class Moderation(commands.Cog):
                             message.author,
                             reason="Exceeded profanity warning limit",
                         )
+                        await self.db.log_moderation_event(
+                            guild_id, "ban", user_id, reason="Exceeded profanity warning limit"
+                        )
                         await message.channel.send(
                             f"{message.author.mention} has been banned for repeated profanity."
                         )
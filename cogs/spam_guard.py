@@ -0,0 +1,194 @@
+import asyncio
+import logging
+from datetime import timedelta
+
+import discord
+from discord.ext import commands
+
+from utils.message_pipeline import SPAM_STAGE, MessageContext
+from utils.spam_detector import CHANNEL_FLOOD, DUPLICATE, SpamDetector
+
+log = logging.getLogger(__name__)
+
+# Spam messages are collected per channel for this long and then removed with
+# one bulk delete per 100 messages instead of one request each.
+DELETE_BATCH_DELAY = 1.0
+BULK_DELETE_LIMIT = 100
+SPAM_TIMEOUT = timedelta(minutes=10)
+# Slowmode applied to a flooded channel, and how long before it is lifted.
+SLOWMODE_SECONDS = 5
+SLOWMODE_DURATION = 300
+# Joins during a raid are reported together in one alert per this interval.
+RAID_ALERT_DELAY = 10.0
+RAID_ALERT_MENTIONS = 20
+
+
+class SpamGuard(commands.Cog):
+    def __init__(self, bot: commands.Bot):
+        self.bot = bot
+        self.db = bot.db
+        self.detector = SpamDetector()
+        # channel_id -> (channel, message ids waiting for the next bulk delete)
+        self._pending_deletes = {}
+        # guild_id -> ids of members who joined during a raid, not yet reported
+        self._raid_joins = {}
+        self._tasks = {}
+
+    async def cog_load(self):
+        self.bot.message_pipeline.register("spam", self.check_message_for_spam, SPAM_STAGE)
+
+    async def cog_unload(self):
+        self.bot.message_pipeline.unregister("spam")
+        for task in self._tasks.values():
+            task.cancel()
+
+    def _schedule(self, key, coro_factory, delay):
+        """Run coro_factory() after delay unless one is already scheduled for key."""
+        if key in self._tasks:
+            return
+
+        async def run():
+            try:
+                await asyncio.sleep(delay)
+            finally:
+                self._tasks.pop(key, None)
+            # Unregistered first, so work queued while this runs schedules
+            # its own follow-up instead of waiting on a task that is done.
+            await coro_factory()
+
+        self._tasks[key] = asyncio.create_task(run())
+
+    async def check_message_for_spam(self, ctx: MessageContext) -> bool:
+        message = ctx.message
+        settings = ctx.settings
+        if not settings.get("spamFilter", False) or message.author.guild_permissions.administrator:
+            return False
+
+        verdict = self.detector.check_message(
+            message.guild.id, message.channel.id, message.author.id, message.id, message.content, settings
+        )
+        if verdict is None:
+            return False
+
+        if verdict.reason == CHANNEL_FLOOD:
+            await self._slow_down(message.channel)
+            # The channel is busy, not this member; carry on as normal.
+            return False
+
+        queued = self._queue_deletes(message.guild, verdict.messages)
+        for _ in range(queued):
+            await self.db.log_moderation_event(message.guild.id, "delete", message.author.id, reason="Spam")
+        if verdict.new_episode:
+            await self._punish(message, verdict.reason)
+        return True
+
+    def _queue_deletes(self, guild, messages):
+        """Queue (channel_id, message_id) pairs for deletion in their own
+        channels; returns how many were newly queued."""
+        by_channel = {}
+        for channel_id, message_id in messages:
+            by_channel.setdefault(channel_id, set()).add(message_id)
+
+        queued = 0
+        for channel_id, message_ids in by_channel.items():
+            channel = guild.get_channel_or_thread(channel_id)
+            if channel is None:
+                # Deleted since, or not visible to us; nothing to remove.
+                continue
+            _, pending = self._pending_deletes.setdefault(channel_id, (channel, set()))
+            queued += len(message_ids - pending)
+            pending.update(message_ids)
+            self._schedule(
+                ("delete", channel_id), lambda channel_id=channel_id: self._flush_deletes(channel_id), DELETE_BATCH_DELAY
+            )
+        return queued
+
+    async def _flush_deletes(self, channel_id):
+        channel, message_ids = self._pending_deletes.pop(channel_id, (None, ()))
+        message_ids = sorted(message_ids)
+        for start in range(0, len(message_ids), BULK_DELETE_LIMIT):
+            chunk = [discord.Object(id=message_id) for message_id in message_ids[start : start + BULK_DELETE_LIMIT]]
+            try:
+                await channel.delete_messages(chunk, reason="Spam")
+            except discord.HTTPException as e:
+                log.warning("Bulk delete of %d spam messages in %s failed: %s", len(chunk), channel_id, e)
+
+    async def _punish(self, message, reason):
+        member = message.author
+        what = "repeating the same message" if reason == DUPLICATE else "sending messages too quickly"
+        try:
+            await member.timeout(SPAM_TIMEOUT, reason=f"Spam: {what}")
+        except discord.HTTPException as e:
+            log.warning("Could not time out %s for spam in guild %s: %s", member.id, message.guild.id, e)
+            await message.channel.send(f"{member.mention}, stop {what}.", delete_after=15)
+            return
+        await self.db.log_moderation_event(message.guild.id, "timeout", member.id, reason=f"Spam: {what}")
+        await message.channel.send(
+            f"{member.mention} has been timed out for {SPAM_TIMEOUT.seconds // 60} minutes for {what}.",
+            delete_after=15,
+        )
+
+    async def _slow_down(self, channel):
+        if getattr(channel, "slowmode_delay", None) != 0:
+            # Already slowed, by us or a moderator; leave it alone.
+            return
+        try:
+            await channel.edit(slowmode_delay=SLOWMODE_SECONDS, reason="Message flood")
+        except discord.HTTPException as e:
+            log.warning("Could not enable slowmode in channel %s: %s", channel.id, e)
+            return
+        log.info("Enabled slowmode in channel %s after a message flood.", channel.id)
+        self._schedule(("slowmode", channel.id), lambda: self._lift_slowmode(channel), SLOWMODE_DURATION)
+
+    async def _lift_slowmode(self, channel):
+        if channel.slowmode_delay != SLOWMODE_SECONDS:
+            return
+        try:
+            await channel.edit(slowmode_delay=0, reason="Message flood over")
+        except discord.HTTPException as e:
+            log.warning("Could not lift slowmode in channel %s: %s", channel.id, e)
+
+    @commands.Cog.listener()
+    async def on_member_join(self, member: discord.Member):
+        guild = member.guild
+        settings = await self.db.get_automod_settings(guild.id)
+        if not settings.get("spamFilter", False):
+            return
+
+        member_ids, new_raid = self.detector.record_join(guild.id, member.id, settings)
+        if not member_ids:
+            return
+        if new_raid:
+            log.warning("Join raid detected in guild %s.", guild.id)
+            await self._raise_verification(guild)
+        self._raid_joins.setdefault(guild.id, []).extend(member_ids)
+        self._schedule(("raid", guild.id), lambda: self._report_raid(guild), RAID_ALERT_DELAY)
+
+    async def _raise_verification(self, guild):
+        if guild.verification_level >= discord.VerificationLevel.high:
+            return
+        try:
+            await guild.edit(verification_level=discord.VerificationLevel.high, reason="Join raid")
+        except discord.HTTPException as e:
+            log.warning("Could not raise verification level in guild %s: %s", guild.id, e)
+
+    async def _report_raid(self, guild):
+        member_ids = self._raid_joins.pop(guild.id, [])
+        channel = guild.system_channel
+        if not member_ids or channel is None:
+            return
+        mentions = " ".join(f"<@{member_id}>" for member_id in member_ids[:RAID_ALERT_MENTIONS])
+        if len(member_ids) > RAID_ALERT_MENTIONS:
+            mentions += f" and {len(member_ids) - RAID_ALERT_MENTIONS} more"
+        try:
+            await channel.send(
+                f"⚠️ Possible raid: {len(member_ids)} member(s) joined in quick succession; "
+                f"review these accounts: {mentions}",
+                allowed_mentions=discord.AllowedMentions.none(),
+            )
+        except discord.HTTPException as e:
+            log.warning("Could not send raid alert in guild %s: %s", guild.id, e)
+
+
+async def setup(bot):
+    await bot.add_cog(SpamGuard(bot))
@@ -165,6 +165,61 @@ const GuildSelector = ({ guilds, onSelectGuild, isLoading }) => (
     </div>
 );
 
+// Bar chart of moderation actions per hour or day, from the precomputed rollups.
+const ModerationActivity = ({ selectedGuild, showToast }) => {
+    const [granularity, setGranularity] = useState('hour');
+    const [activity, setActivity] = useState(null);
+
+    const fetchActivity = useCallback(async () => {
+        try {
+            const response = await apiFetch(`/api/guilds/${selectedGuild.id}/moderation/stats?granularity=${granularity}`);
+            const data = await response.json();
+            if (!response.ok) throw new Error(data.error || 'Failed to fetch moderation stats.');
+            setActivity(data);
+        } catch (error) {
+            showToast(error.message, 'error');
+        }
+    }, [selectedGuild, granularity, showToast]);
+
+    useEffect(() => {
+        fetchActivity();
+    }, [fetchActivity]);
+
+    if (!activity) {
+        return <div className="flex justify-center items-center h-24"><Loader2 className="w-8 h-8 animate-spin text-white" /></div>;
+    }
+
+    const bucketTotal = (bucket) => Object.values(bucket.counts).reduce((sum, count) => sum + count, 0);
+    const peak = Math.max(1, ...activity.buckets.map(bucketTotal));
+
+    return (
+        <div>
+            <div className="flex justify-between items-center mb-4">
+                <h3 className="text-xl font-bold text-white">Moderation Activity</h3>
+                <select value={granularity} onChange={(e) => setGranularity(e.target.value)} className="bg-transparent border-none rounded-lg p-2 text-white focus:outline-none focus:ring-0 transition">
+                    <option value="hour" className="bg-[#0a0a0a]">Last 48 hours</option>
+                    <option value="day" className="bg-[#0a0a0a]">Last 30 days</option>
+                </select>
+            </div>
+            <div className="flex items-end gap-px h-32 mb-4">
+                {activity.buckets.map((bucket) => (
+                    <div
+                        key={bucket.start}
+                        title={`${new Date(bucket.start * 1000).toLocaleString()}: ${bucketTotal(bucket)} action(s)`}
+                        className="flex-1 bg-[#5865F2] rounded-t"
+                        style={{ height: `${(bucketTotal(bucket) / peak) * 100}%` }}
+                    />
+                ))}
+            </div>
+            <div className="flex flex-wrap gap-6 text-sm text-gray-400">
+                {Object.entries(activity.totals).map(([action, count]) => (
+                    <span key={action}><span className="capitalize">{action}s</span>: <span className="text-white font-bold">{count}</span></span>
+                ))}
+            </div>
+        </div>
+    );
+};
+
 const OverviewView = ({ selectedGuild, showToast }) => {
     const [stats, setStats] = useState({
         member_count: 0,
@@ -222,6 +277,7 @@ const OverviewView = ({ selectedGuild, showToast }) => {
                     ))}
                 </div>
             )}
+            <ModerationActivity selectedGuild={selectedGuild} showToast={showToast} />
         </div>
     );
 };
@@ -274,6 +330,7 @@ const AIManagerView = ({ showToast, selectedGuild }) => {
                     prompt: prompt,
                     resetServer: resetOverride,
                     variationHint: regenerate ? `${Date.now()}` : '',
+                    regenerate,
                 }),
             });
             const data = await response.json();
@@ -475,8 +532,21 @@ const AIManagerView = ({ showToast, selectedGuild }) => {
     );
 };
 
+// Custom word lists are edited as one word per line.
+const toWordList = (text) => text.split('\n').map((word) => word.trim()).filter(Boolean);
+
+// Spam and raid limits: [settings key, label, min, max, default].
+const SPAM_LIMIT_FIELDS = [
+    ['spamMessageLimit', 'Messages per member', 2, 100, 6],
+    ['spamChannelLimit', 'Messages per channel', 2, 500, 20],
+    ['spamWindow', 'Window (seconds)', 1, 300, 5],
+    ['spamDuplicateLimit', 'Repeated messages (30s)', 2, 100, 3],
+    ['raidJoinLimit', 'Joins for a raid (0 = off)', 0, 1000, 10],
+    ['raidWindow', 'Raid window (seconds)', 1, 300, 60],
+];
+
 const AutoModView = ({ showToast, selectedGuild }) => {
-    const [settings, setSettings] = useState({ profanityFilter: false, warningLimit: 3, limitAction: 'Kick' });
+    const [settings, setSettings] = useState({ profanityFilter: false, warningLimit: 3, limitAction: 'Kick', xpCooldown: 60, blockedWords: '', allowedWords: '', spamFilter: false, ...Object.fromEntries(SPAM_LIMIT_FIELDS.map(([key, , , , fallback]) => [key, fallback])) });
     const [isLoading, setIsLoading] = useState(true);
     const [isSaving, setIsSaving] = useState(false);
     const [members, setMembers] = useState([]);
@@ -494,6 +564,11 @@ const AutoModView = ({ showToast, selectedGuild }) => {
                 profanityFilter: data.profanityFilter || false,
                 warningLimit: data.warningLimit || 3,
                 limitAction: data.limitAction || 'Kick',
+                xpCooldown: data.xpCooldown ?? 60,
+                blockedWords: (data.blockedWords || []).join('\n'),
+                allowedWords: (data.allowedWords || []).join('\n'),
+                spamFilter: data.spamFilter || false,
+                ...Object.fromEntries(SPAM_LIMIT_FIELDS.map(([key, , , , fallback]) => [key, data[key] ?? fallback])),
             });
         } catch (error) {
             showToast(error.message, 'error');
@@ -527,7 +602,11 @@ const AutoModView = ({ showToast, selectedGuild }) => {
         try {
             const response = await apiFetch(`/api/automod_settings/${selectedGuild.id}`, {
                 method: 'POST',
-                body: JSON.stringify(settings),
+                body: JSON.stringify({
+                    ...settings,
+                    blockedWords: toWordList(settings.blockedWords),
+                    allowedWords: toWordList(settings.allowedWords),
+                }),
             });
             const data = await response.json();
             if (!response.ok) throw new Error(data.error || 'Failed to save settings.');
@@ -553,6 +632,7 @@ const AutoModView = ({ showToast, selectedGuild }) => {
             const data = await response.json();
             if (!response.ok) throw new Error(data.error || 'Failed to reset warnings.');
             showToast(data.message || 'Warnings reset successfully!', 'success');
+            setMembers((prev) => prev.map((member) => (member.id === selectedMember ? { ...member, warnings: 0 } : member)));
             setSelectedMember('');
         } catch (error) {
             showToast(error.message, 'error');
@@ -612,6 +692,65 @@ const AutoModView = ({ showToast, selectedGuild }) => {
                     </div>
                 </div>
 
+                <div>
+                    <h3 className="text-xl font-bold text-white">XP Cooldown</h3>
+                    <p className="text-gray-400 mb-4">Seconds a member must wait between XP grants. Set to 0 to award XP on every message.</p>
+                    <input
+                        type="number"
+                        min="0"
+                        max="3600"
+                        value={settings.xpCooldown}
+                        onChange={(e) => handleSettingChange('xpCooldown', Math.min(3600, Math.max(0, parseInt(e.target.value) || 0)))}
+                        className="w-32 bg-transparent border border-white/20 rounded-lg p-2 text-white focus:outline-none focus:ring-0 transition"
+                    />
+                </div>
+
+                <div>
+                    <h3 className="text-xl font-bold text-white">Custom Words</h3>
+                    <p className="text-gray-400 mb-4">One word or phrase per line. Blocked words are filtered on top of the built-in list; allowed words are never filtered.</p>
+                    <div className="grid grid-cols-1 md:grid-cols-2 gap-6 max-w-3xl">
+                        <div>
+                            <label className="block text-gray-300 mb-2">Blocked Words</label>
+                            <textarea
+                                rows="6"
+                                value={settings.blockedWords}
+                                onChange={(e) => handleSettingChange('blockedWords', e.target.value)}
+                                className="w-full bg-transparent border border-white/20 rounded-lg p-2 text-white focus:outline-none focus:ring-0 transition"
+                            />
+                        </div>
+                        <div>
+                            <label className="block text-gray-300 mb-2">Allowed Words</label>
+                            <textarea
+                                rows="6"
+                                value={settings.allowedWords}
+                                onChange={(e) => handleSettingChange('allowedWords', e.target.value)}
+                                className="w-full bg-transparent border border-white/20 rounded-lg p-2 text-white focus:outline-none focus:ring-0 transition"
+                            />
+                        </div>
+                    </div>
+                </div>
+
+                <div>
+                    <h3 className="text-xl font-bold text-white">Spam &amp; Raid Protection</h3>
+                    <p className="text-gray-400 mb-4">Deletes floods and repeated messages and times out the sender, slows down flooded channels, and raises the verification level when many members join at once.</p>
+                    <button onClick={() => handleSettingChange('spamFilter', !settings.spamFilter)} className={`px-4 py-2 rounded-lg font-semibold transition-colors text-white ${settings.spamFilter ? 'bg-green-500 hover:bg-green-600' : 'bg-red-500 hover:bg-red-600'}`}>{settings.spamFilter ? 'Enabled' : 'Disabled'}</button>
+                    <div className="grid grid-cols-1 sm:grid-cols-2 md:grid-cols-3 gap-6 max-w-3xl mt-6">
+                        {SPAM_LIMIT_FIELDS.map(([key, label, min, max]) => (
+                            <div key={key}>
+                                <label className="block text-gray-300 mb-2">{label}</label>
+                                <input
+                                    type="number"
+                                    min={min}
+                                    max={max}
+                                    value={settings[key]}
+                                    onChange={(e) => handleSettingChange(key, Math.min(max, Math.max(min, parseInt(e.target.value) || min)))}
+                                    className="w-32 bg-transparent border border-white/20 rounded-lg p-2 text-white focus:outline-none focus:ring-0 transition"
+                                />
+                            </div>
+                        ))}
+                    </div>
+                </div>
+
                 {/* Reset User Warnings */}
                 <div>
                     <h3 className="text-xl font-bold text-white">Reset User Warnings</h3>
@@ -629,6 +768,7 @@ const AutoModView = ({ showToast, selectedGuild }) => {
                                 {members.map((member) => (
                                     <option key={member.id} value={member.id} className="bg-[#0a0a0a]">
                                         {member.name || member.username || member.id}
+                                        {member.warnings ? ` (${member.warnings} warning${member.warnings === 1 ? '' : 's'})` : ''}
                                     </option>
                                 ))}
                             </select>
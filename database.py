@@ -1,237 +1,1383 @@
+import asyncio
+import functools
+import json
+import logging
+import os
+import sqlite3
+import time
+from contextlib import asynccontextmanager, nullcontext, suppress
+from pathlib import Path
+
 import aiosqlite
+from cachetools import LRUCache
 
+from storage import (
+    DEFAULT_AUTOMOD_SETTINGS,
+    MODERATION_ACTIONS,
+    SequentialBatch,
+    StorageBackend,
+    decode_spam_settings,
+    decode_words,
+    encode_spam_settings,
+    encode_words,
+    rollup_counts,
+)
+from utils.guild_backup import BACKUP_TABLES, check_record
+from utils.metrics import MetricsRegistry
+from utils.rank_index import RankIndex
 
-class PersistentDB:
-    def __init__(self, path="bot_data.db"):
-        self.path = path
-        self.conn = None
+log = logging.getLogger(__name__)
 
-    async def connect(self):
-        if self.conn:
-            return
 
-        self.conn = await aiosqlite.connect(self.path, timeout=10)
-        await self.conn.execute("PRAGMA foreign_keys = ON;")
-        await self.conn.execute("PRAGMA journal_mode=WAL;")
+async def _migrate_base_schema(conn):
+    await conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS automod_settings (
+            guild_id INTEGER PRIMARY KEY,
+            profanity_filter_enabled BOOLEAN DEFAULT 1,
+            warning_limit INTEGER DEFAULT 3,
+            punishment_type TEXT DEFAULT 'kick'
+        )
+        """
+    )
 
-        await self.conn.execute(
-            """
-            CREATE TABLE IF NOT EXISTS automod_settings (
-                guild_id INTEGER PRIMARY KEY,
-                profanity_filter_enabled BOOLEAN DEFAULT 1,
-                warning_limit INTEGER DEFAULT 3,
-                punishment_type TEXT DEFAULT 'kick'
-            )
-            """
+    await conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS warnings (
+            guild_id INTEGER NOT NULL,
+            user_id INTEGER NOT NULL,
+            count INTEGER DEFAULT 1,
+            PRIMARY KEY (guild_id, user_id)
         )
+        """
+    )
 
-        await self.conn.execute(
-            """
-            CREATE TABLE IF NOT EXISTS warnings (
-                guild_id INTEGER NOT NULL,
-                user_id INTEGER NOT NULL,
-                count INTEGER DEFAULT 1,
-                PRIMARY KEY (guild_id, user_id)
-            )
-            """
+    await conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS user_data (
+            guild_id INTEGER NOT NULL,
+            user_id INTEGER NOT NULL,
+            xp INTEGER DEFAULT 0,
+            level INTEGER DEFAULT 0,
+            PRIMARY KEY (guild_id, user_id)
         )
+        """
+    )
 
-        await self.conn.execute(
-            """
-            CREATE TABLE IF NOT EXISTS user_data (
-                guild_id INTEGER NOT NULL,
-                user_id INTEGER NOT NULL,
-                xp INTEGER DEFAULT 0,
-                level INTEGER DEFAULT 0,
-                PRIMARY KEY (guild_id, user_id)
-            )
-            """
+    await conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS afk_users (
+            guild_id INTEGER NOT NULL,
+            user_id INTEGER NOT NULL,
+            message TEXT,
+            PRIMARY KEY (guild_id, user_id)
         )
+        """
+    )
 
-        await self.conn.execute(
-            """
-            CREATE TABLE IF NOT EXISTS afk_users (
-                guild_id INTEGER NOT NULL,
-                user_id INTEGER NOT NULL,
-                message TEXT,
-                PRIMARY KEY (guild_id, user_id)
-            )
-            """
+    await conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS reaction_roles (
+            message_id INTEGER PRIMARY KEY,
+            guild_id INTEGER NOT NULL,
+            channel_id INTEGER NOT NULL
         )
+        """
+    )
 
-        await self.conn.execute(
-            """
-            CREATE TABLE IF NOT EXISTS reaction_roles (
-                message_id INTEGER PRIMARY KEY,
-                guild_id INTEGER NOT NULL,
-                channel_id INTEGER NOT NULL
-            )
-            """
+    await conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS reaction_role_mappings (
+            message_id INTEGER NOT NULL,
+            emoji TEXT NOT NULL,
+            role_id INTEGER NOT NULL,
+            PRIMARY KEY (message_id, emoji),
+            FOREIGN KEY (message_id) REFERENCES reaction_roles(message_id) ON DELETE CASCADE
         )
+        """
+    )
 
-        await self.conn.execute(
-            """
-            CREATE TABLE IF NOT EXISTS reaction_role_mappings (
-                message_id INTEGER NOT NULL,
-                emoji TEXT NOT NULL,
-                role_id INTEGER NOT NULL,
-                PRIMARY KEY (message_id, emoji),
-                FOREIGN KEY (message_id) REFERENCES reaction_roles(message_id) ON DELETE CASCADE
-            )
-            """
+    await conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS scheduled_events (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            guild_id INTEGER NOT NULL,
+            channel_id INTEGER NOT NULL,
+            event_name TEXT NOT NULL,
+            description TEXT,
+            event_time INTEGER NOT NULL,
+            reminder_time INTEGER NOT NULL,
+            ping_role_id INTEGER,
+            reminder_sent BOOLEAN DEFAULT 0
         )
+        """
+    )
 
-        await self.conn.execute(
-            """
-            CREATE TABLE IF NOT EXISTS scheduled_events (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                guild_id INTEGER NOT NULL,
-                channel_id INTEGER NOT NULL,
-                event_name TEXT NOT NULL,
-                description TEXT,
-                event_time INTEGER NOT NULL,
-                reminder_time INTEGER NOT NULL,
-                ping_role_id INTEGER,
-                reminder_sent BOOLEAN DEFAULT 0
-            )
-            """
+
+async def _migrate_punishment_type(conn):
+    # Databases created before punishment_type existed still have the old
+    # automod_settings table, which CREATE TABLE IF NOT EXISTS leaves alone.
+    async with conn.execute("PRAGMA table_info(automod_settings)") as cursor:
+        columns = {row[1] async for row in cursor}
+    if "punishment_type" not in columns:
+        await conn.execute(
+            "ALTER TABLE automod_settings ADD COLUMN punishment_type TEXT DEFAULT 'kick'"
+        )
+
+
+async def _migrate_indexes(conn):
+    # Matches get_pending_reminders' WHERE reminder_time <= ? AND reminder_sent = 0,
+    # and stays small because sent reminders drop out of it.
+    await conn.execute(
+        "CREATE INDEX IF NOT EXISTS idx_scheduled_events_pending "
+        "ON scheduled_events (reminder_time) WHERE reminder_sent = 0"
+    )
+    await conn.execute(
+        "CREATE INDEX IF NOT EXISTS idx_scheduled_events_guild ON scheduled_events (guild_id)"
+    )
+    await conn.execute(
+        "CREATE INDEX IF NOT EXISTS idx_reaction_roles_guild ON reaction_roles (guild_id)"
+    )
+    await conn.execute(
+        "CREATE INDEX IF NOT EXISTS idx_reaction_role_mappings_role "
+        "ON reaction_role_mappings (role_id)"
+    )
+    # Covers leaderboard-style scans: ordered per guild, user_id included so
+    # the table itself is never visited.
+    await conn.execute(
+        "CREATE INDEX IF NOT EXISTS idx_user_data_leaderboard "
+        "ON user_data (guild_id, level DESC, xp DESC, user_id DESC)"
+    )
+
+
+async def _migrate_xp_cooldown(conn):
+    await conn.execute("ALTER TABLE automod_settings ADD COLUMN xp_cooldown INTEGER DEFAULT 60")
+
+
+async def _migrate_custom_words(conn):
+    # JSON arrays of words; NULL means no custom words.
+    await conn.execute("ALTER TABLE automod_settings ADD COLUMN blocked_words TEXT")
+    await conn.execute("ALTER TABLE automod_settings ADD COLUMN allowed_words TEXT")
+
+
+async def _migrate_spam_settings(conn):
+    # JSON object of spam/raid limits; NULL or missing keys use the defaults.
+    await conn.execute("ALTER TABLE automod_settings ADD COLUMN spam_settings TEXT")
+
+
+async def _migrate_moderation_events(conn):
+    # Append-only; rows are never updated or deleted by the bot.
+    await conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS moderation_events (
+            id INTEGER PRIMARY KEY,
+            guild_id INTEGER NOT NULL,
+            action TEXT NOT NULL,
+            user_id INTEGER,
+            moderator_id INTEGER,
+            reason TEXT,
+            created_at INTEGER NOT NULL
+        )
+        """
+    )
+    await conn.execute(
+        "CREATE INDEX IF NOT EXISTS idx_moderation_events_guild "
+        "ON moderation_events (guild_id, created_at)"
+    )
+    # Counts per hour and per day, kept up to date as events are written so
+    # charts never scan moderation_events.
+    await conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS moderation_rollups (
+            guild_id INTEGER NOT NULL,
+            granularity TEXT NOT NULL,
+            bucket_start INTEGER NOT NULL,
+            action TEXT NOT NULL,
+            count INTEGER NOT NULL,
+            PRIMARY KEY (guild_id, granularity, bucket_start, action)
+        ) WITHOUT ROWID
+        """
+    )
+
+
+async def _migrate_build_plan_cache(conn):
+    # Generated server plans keyed by a hash of the model and prompt; see
+    # utils/build_plan_cache.py.
+    await conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS build_plan_cache (
+            cache_key TEXT PRIMARY KEY,
+            plan TEXT NOT NULL,
+            expires_at REAL NOT NULL
+        ) WITHOUT ROWID
+        """
+    )
+    await conn.execute(
+        "CREATE INDEX IF NOT EXISTS idx_build_plan_cache_expiry ON build_plan_cache (expires_at)"
+    )
+
+
+async def _migrate_multi_level_grants(conn):
+    # Grants used to level up at most once, which could leave a row with more
+    # XP than its next level needs. Level those rows up the way grants now do.
+    rows = await conn.execute_fetchall(
+        "SELECT guild_id, user_id, xp, level FROM user_data WHERE xp >= (level + 1) * 100"
+    )
+    updates = []
+    for guild_id, user_id, xp, level in rows:
+        state = [xp, level]
+        _grant_xp(state, 0)
+        updates.append((state[0], state[1], guild_id, user_id))
+    await conn.executemany("UPDATE user_data SET xp=?, level=? WHERE guild_id=? AND user_id=?", updates)
+
+
+async def _migrate_drop_unused_indexes(conn):
+    # Added by _migrate_indexes, but no query filters mappings by role_id
+    # (lookups go by message_id and emoji), so it only cost writes and space.
+    await conn.execute("DROP INDEX IF EXISTS idx_reaction_role_mappings_role")
+
+
+# Applied in order; PRAGMA user_version records how many have run. Append new
+# migrations to the end and never edit or reorder ones that have shipped.
+MIGRATIONS = [
+    _migrate_base_schema,
+    _migrate_punishment_type,
+    _migrate_indexes,
+    _migrate_xp_cooldown,
+    _migrate_custom_words,
+    _migrate_spam_settings,
+    _migrate_moderation_events,
+    _migrate_build_plan_cache,
+    _migrate_multi_level_grants,
+    _migrate_drop_unused_indexes,
+]
+
+ADD_WARNING_SQL = (
+    "INSERT INTO warnings (guild_id, user_id, count) VALUES (?, ?, 1) "
+    "ON CONFLICT(guild_id, user_id) DO UPDATE SET count = count + 1 "
+    "RETURNING count"
+)
+SELECT_WARNINGS_SQL = "SELECT count FROM warnings WHERE guild_id=? AND user_id=?"
+RESET_WARNINGS_SQL = "DELETE FROM warnings WHERE guild_id=? AND user_id=?"
+# Id lists are passed as one JSON array, so a page of any size is a single
+# bound parameter rather than one per id.
+RESET_WARNINGS_BULK_SQL = (
+    "DELETE FROM warnings WHERE guild_id=? AND user_id IN (SELECT value FROM json_each(?))"
+)
+SELECT_MEMBER_STATS_SQL = """
+    SELECT ids.value, COALESCE(w.count, 0), COALESCE(d.xp, 0), COALESCE(d.level, 0)
+    FROM json_each(?2) AS ids
+    LEFT JOIN warnings w ON w.guild_id = ?1 AND w.user_id = ids.value
+    LEFT JOIN user_data d ON d.guild_id = ?1 AND d.user_id = ids.value
+"""
+SELECT_AUTOMOD_SETTINGS_SQL = (
+    "SELECT profanity_filter_enabled, warning_limit, punishment_type, xp_cooldown, "
+    "blocked_words, allowed_words, spam_settings "
+    "FROM automod_settings WHERE guild_id=?"
+)
+# A NULL xp_cooldown, word list or spam_settings keeps the stored value, so
+# callers that don't manage those settings can't reset them. spam_settings is
+# merged key by key, so an update may carry only the limits that changed.
+SET_AUTOMOD_SETTINGS_SQL = """
+    INSERT INTO automod_settings
+        (guild_id, profanity_filter_enabled, warning_limit, punishment_type, xp_cooldown,
+         blocked_words, allowed_words, spam_settings)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+    ON CONFLICT(guild_id) DO UPDATE SET
+        profanity_filter_enabled = excluded.profanity_filter_enabled,
+        warning_limit = excluded.warning_limit,
+        punishment_type = excluded.punishment_type,
+        xp_cooldown = COALESCE(excluded.xp_cooldown, xp_cooldown),
+        blocked_words = COALESCE(excluded.blocked_words, blocked_words),
+        allowed_words = COALESCE(excluded.allowed_words, allowed_words),
+        spam_settings = COALESCE(
+            json_patch(COALESCE(spam_settings, '{}'), excluded.spam_settings), spam_settings
+        )
+"""
+SELECT_XP_SQL = "SELECT xp, level FROM user_data WHERE guild_id=? AND user_id=?"
+# SET expressions see the pre-update row, so the level-up check and the
+# carry-over are computed atomically in a single statement.
+# Same leveling as _grant_xp: the recursive CTE levels up once per step for
+# as long as the XP covers the next threshold, and the deepest step is stored.
+ADD_XP_SQL = """
+    WITH RECURSIVE granted(xp, level) AS (
+        SELECT COALESCE(MAX(xp), 0) + ?3, COALESCE(MAX(level), 0)
+        FROM user_data WHERE guild_id = ?1 AND user_id = ?2
+        UNION ALL
+        SELECT xp - (level + 1) * 100, level + 1 FROM granted WHERE xp >= (level + 1) * 100
+    )
+    INSERT INTO user_data (guild_id, user_id, xp, level)
+    SELECT ?1, ?2, xp, level FROM granted ORDER BY level DESC LIMIT 1
+    ON CONFLICT(guild_id, user_id) DO UPDATE SET xp = excluded.xp, level = excluded.level
+    RETURNING xp, level
+"""
+INSERT_MODERATION_EVENT_SQL = (
+    "INSERT INTO moderation_events (guild_id, action, user_id, moderator_id, reason, created_at) "
+    "VALUES (?, ?, ?, ?, ?, ?)"
+)
+ADD_MODERATION_ROLLUP_SQL = (
+    "INSERT INTO moderation_rollups (guild_id, granularity, bucket_start, action, count) "
+    "VALUES (?, ?, ?, ?, ?) "
+    "ON CONFLICT(guild_id, granularity, bucket_start, action) DO UPDATE SET count = count + excluded.count"
+)
+SELECT_MODERATION_ROLLUPS_SQL = (
+    "SELECT bucket_start, action, count FROM moderation_rollups "
+    "WHERE guild_id=? AND granularity=? AND bucket_start >= ? AND bucket_start < ? "
+    "ORDER BY bucket_start, action"
+)
+SELECT_BUILD_PLAN_SQL = "SELECT plan, expires_at FROM build_plan_cache WHERE cache_key=? AND expires_at > ?"
+SET_BUILD_PLAN_SQL = "INSERT OR REPLACE INTO build_plan_cache (cache_key, plan, expires_at) VALUES (?, ?, ?)"
+PRUNE_BUILD_PLANS_SQL = "DELETE FROM build_plan_cache WHERE expires_at <= ?"
+SET_AFK_SQL = "INSERT OR REPLACE INTO afk_users (guild_id, user_id, message) VALUES (?, ?, ?)"
+REMOVE_AFK_SQL = "DELETE FROM afk_users WHERE guild_id=? AND user_id=?"
+
+EXPORT_SQL = {
+    "automod_settings": "SELECT * FROM automod_settings WHERE guild_id=?",
+    "warnings": "SELECT * FROM warnings WHERE guild_id=? ORDER BY user_id",
+    "user_data": "SELECT * FROM user_data WHERE guild_id=? ORDER BY user_id",
+    "afk_users": "SELECT * FROM afk_users WHERE guild_id=? ORDER BY user_id",
+    "reaction_roles": "SELECT * FROM reaction_roles WHERE guild_id=? ORDER BY message_id",
+    "reaction_role_mappings": (
+        "SELECT m.* FROM reaction_role_mappings m "
+        "JOIN reaction_roles r ON r.message_id = m.message_id WHERE r.guild_id=? "
+        "ORDER BY m.message_id, m.emoji"
+    ),
+    "scheduled_events": "SELECT * FROM scheduled_events WHERE guild_id=? ORDER BY id",
+}
+# Upsert conflict targets for imports. Scheduled events have no natural key,
+# so they are matched on these columns instead and only inserted when new.
+IMPORT_KEYS = {
+    "automod_settings": ("guild_id",),
+    "warnings": ("guild_id", "user_id"),
+    "user_data": ("guild_id", "user_id"),
+    "afk_users": ("guild_id", "user_id"),
+    "reaction_roles": ("message_id",),
+    "reaction_role_mappings": ("message_id", "emoji"),
+}
+EVENT_MATCH_COLUMNS = ("guild_id", "channel_id", "event_name", "event_time")
+
+
+def _settings_from_row(row):
+    if row:
+        return {
+            "profanityFilter": bool(row[0]),
+            "warningLimit": row[1],
+            "limitAction": row[2],
+            "xpCooldown": row[3] if row[3] is not None else DEFAULT_AUTOMOD_SETTINGS["xpCooldown"],
+            "blockedWords": decode_words(row[4]),
+            "allowedWords": decode_words(row[5]),
+            **decode_spam_settings(row[6]),
+        }
+    return dict(DEFAULT_AUTOMOD_SETTINGS)
+
+
+def _grant_xp(state, xp_to_add):
+    # state is a mutable [xp, level] pair; returns the new level on level-up.
+    # A large grant (or several coalesced ones) can cross more than one level.
+    state[0] += xp_to_add
+    old_level = state[1]
+    while state[0] >= (state[1] + 1) * 100:
+        state[0] -= (state[1] + 1) * 100
+        state[1] += 1
+    return state[1] if state[1] > old_level else None
+
+
+def _level_up_from_returning(xp, level, xp_to_add):
+    # RETURNING only exposes the new row. Rows always hold less XP than their
+    # next threshold, so any level-up subtracts more than the row had before
+    # the grant, which leaves less XP than was just granted.
+    if xp_to_add > 0 and xp < xp_to_add:
+        return level
+    return None
+
+
+LOCK_RETRIES = 3
+
+
+def _import_sql(table, columns):
+    placeholders = ", ".join("?" for _ in columns)
+    if table == "scheduled_events":
+        match = " AND ".join(f"{column}=?" for column in EVENT_MATCH_COLUMNS)
+        return (
+            f"INSERT INTO scheduled_events ({', '.join(columns)}) SELECT {placeholders} "
+            f"WHERE NOT EXISTS (SELECT 1 FROM scheduled_events WHERE {match})"
         )
 
-        migration_stmts = [
-            "ALTER TABLE automod_settings ADD COLUMN punishment_type TEXT DEFAULT 'kick'",
-        ]
-        for stmt in migration_stmts:
+    keys = IMPORT_KEYS[table]
+    # guild_id is never rewritten: a conflicting row must stay with its guild.
+    updates = [column for column in columns if column not in keys and column != "guild_id"]
+    if updates:
+        action = "DO UPDATE SET " + ", ".join(f"{column} = excluded.{column}" for column in updates)
+        if table == "reaction_roles":
+            # Message ids are global; another guild's reaction role is left alone.
+            action += " WHERE reaction_roles.guild_id = excluded.guild_id"
+    else:
+        action = "DO NOTHING"
+
+    if table == "reaction_role_mappings":
+        # Only mappings under a reaction role message of the importing guild.
+        return (
+            f"INSERT INTO {table} ({', '.join(columns)}) SELECT {placeholders} "
+            "WHERE EXISTS (SELECT 1 FROM reaction_roles WHERE message_id=? AND guild_id=?) "
+            f"ON CONFLICT({', '.join(keys)}) {action}"
+        )
+    return (
+        f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({placeholders}) "
+        f"ON CONFLICT({', '.join(keys)}) {action}"
+    )
+
+
+def _row_count(result):
+    if result is None:
+        return 0
+    if isinstance(result, (list, dict)):
+        return len(result)
+    return 1
+
+
+def _describe_arg(arg):
+    # Ids and short strings are logged as-is; a record batch or a long string
+    # is reduced to its type and size so one slow import can't flood the log.
+    if isinstance(arg, (int, float, bool)) or arg is None:
+        return repr(arg)
+    if isinstance(arg, str) and len(arg) <= 64:
+        return repr(arg)
+    try:
+        return f"<{type(arg).__name__} len={len(arg)}>"
+    except TypeError:
+        return f"<{type(arg).__name__}>"
+
+
+def instrumented(retry_locked=False):
+    """Record latency, rows and failures for a PersistentDB method.
+
+    With retry_locked, "database is locked" errors are retried with backoff.
+    Only read methods opt in; a failed write may already sit in an open
+    transaction, so retrying it could apply it twice.
+    """
+
+    def decorator(func):
+        name = func.__name__
+
+        @functools.wraps(func)
+        async def wrapper(self, *args, **kwargs):
+            histogram = self._query_metrics.get(name)
+            started = time.perf_counter()
+            attempt = 0
+            while True:
+                try:
+                    result = await func(self, *args, **kwargs)
+                    break
+                except sqlite3.OperationalError as e:
+                    if retry_locked and "locked" in str(e) and attempt < LOCK_RETRIES:
+                        attempt += 1
+                        histogram.lock_retries += 1
+                        await asyncio.sleep(0.05 * 2**attempt)
+                        continue
+                    histogram.errors += 1
+                    raise
+                except Exception:
+                    histogram.errors += 1
+                    raise
+
+            elapsed = time.perf_counter() - started
+            histogram.record(elapsed, _row_count(result))
+            if elapsed * 1000 >= self.slow_query_ms:
+                log.warning(
+                    "Slow DB call %s(%s) took %.1f ms",
+                    name,
+                    ", ".join(_describe_arg(arg) for arg in args[:2]),
+                    elapsed * 1000,
+                )
+            return result
+
+        return wrapper
+
+    return decorator
+
+
+def _run_unit_of_work(conn, steps, writes, commit):
+    # Runs on the aiosqlite worker thread against the raw sqlite3 connection.
+    # A group-commit window may already have a transaction open; nest in a
+    # savepoint so a failure here can't roll back other callers' writes.
+    nested = writes and conn.in_transaction
+    if nested:
+        conn.execute("SAVEPOINT unit_of_work")
+    elif writes:
+        conn.execute("BEGIN")
+
+    try:
+        results = [step(conn) for step in steps]
+    except Exception:
+        if nested:
+            conn.execute("ROLLBACK TO unit_of_work")
+            conn.execute("RELEASE unit_of_work")
+        elif writes:
+            conn.rollback()
+        raise
+
+    if nested:
+        conn.execute("RELEASE unit_of_work")
+    if commit:
+        conn.commit()
+    return results
+
+
+class _Query:
+    """A single statement of a planned call.
+
+    run() executes it on the raw sqlite3 connection of the aiosqlite worker
+    thread (UnitOfWork), fetch() on an aiosqlite connection. result selects
+    what either returns: "row" (the first row), "value" (its first column, or
+    default without a row) or "rowcount".
+    """
+
+    __slots__ = ("sql", "params", "result", "default")
+
+    def __init__(self, sql, params, result="row", default=None):
+        self.sql = sql
+        self.params = params
+        self.result = result
+        self.default = default
+
+    def _extract(self, row, rowcount):
+        if self.result == "rowcount":
+            return rowcount
+        if self.result == "value":
+            return row[0] if row else self.default
+        return row
+
+    def run(self, conn):
+        cursor = conn.execute(self.sql, self.params)
+        return self._extract(None if self.result == "rowcount" else cursor.fetchone(), cursor.rowcount)
+
+    async def fetch(self, conn):
+        # One worker-thread hop each; these statements return at most one row.
+        if self.result == "rowcount":
+            cursor = await conn.execute(self.sql, self.params)
+            return cursor.rowcount
+        rows = await conn.execute_fetchall(self.sql, self.params)
+        return self._extract(rows[0] if rows else None, -1)
+
+
+class UnitOfWork(SequentialBatch):
+    """Runs every queued call in a single aiosqlite hop and one transaction.
+
+    Calls that PersistentDB can answer from memory (cached settings, buffered
+    XP) are resolved without SQL; if nothing needs SQLite, run() makes no hop.
+    Queued calls are planned when run() starts, so their caches are consulted
+    at that point rather than when they were queued.
+    """
+
+    def _queue(self, planner, *args, uses_xp_buffer=False):
+        future = asyncio.get_running_loop().create_future()
+        self._calls.append((functools.partial(planner, *args), uses_xp_buffer, future))
+        return future
+
+    def add_warning(self, guild_id, user_id):
+        return self._queue(self.db._plan_add_warning, guild_id, user_id)
+
+    def get_warnings(self, guild_id, user_id):
+        return self._queue(self.db._plan_get_warnings, guild_id, user_id)
+
+    def reset_warnings(self, guild_id, user_id):
+        return self._queue(self.db._plan_reset_warnings, guild_id, user_id)
+
+    def get_automod_settings(self, guild_id):
+        return self._queue(self.db._plan_get_automod_settings, guild_id)
+
+    def add_xp(self, guild_id, user_id, xp_to_add):
+        return self._queue(
+            self.db._plan_add_xp, guild_id, user_id, xp_to_add, uses_xp_buffer=bool(self.db.xp_flush_interval)
+        )
+
+    def get_xp_and_level(self, guild_id, user_id):
+        return self._queue(self.db._plan_get_xp_and_level, guild_id, user_id)
+
+    def set_afk(self, guild_id, user_id, message):
+        return self._queue(self.db._plan_set_afk, guild_id, user_id, message)
+
+    def remove_afk(self, guild_id, user_id):
+        return self._queue(self.db._plan_remove_afk, guild_id, user_id)
+
+    async def run(self):
+        calls, self._calls = self._calls, []
+        if not calls:
+            return
+
+        db = self.db
+        started = time.perf_counter()
+        db._batch_stats["batches"] += 1
+        db._batch_stats["calls"] += len(calls)
+        uses_xp_buffer = any(uses_buffer for _, uses_buffer, _ in calls)
+        writes = False
+        try:
+            # Buffered add_xp loads base rows; holding the XP lock keeps a
+            # flush from landing between that SELECT and the buffer insert.
+            async with db._xp_lock if uses_xp_buffer else nullcontext():
+                plans = [planner() for planner, _, _ in calls]
+                steps = [query.run for query, _, _ in plans if query is not None]
+                writes = any(write for _, _, write in plans)
+                results = iter(await db._run_steps(steps, writes) if steps else ())
+                for (query, apply, _), (_, _, future) in zip(plans, calls):
+                    value = next(results) if query is not None else None
+                    future.set_result(apply(value) if apply else value)
+        except Exception:
+            db._query_metrics.get("batch").errors += 1
+            raise
+        finally:
+            for _, _, future in calls:
+                future.cancel()
+
+        db._query_metrics.get("batch").record(time.perf_counter() - started, len(calls))
+        if writes and db.group_commit_window:
+            await db._commit()
+        if uses_xp_buffer and len(db._xp_buffer) >= db.xp_flush_threshold:
+            await db.flush_xp()
+
+
+class PersistentDB(StorageBackend):
+    def __init__(
+        self,
+        path="bot_data.db",
+        xp_flush_interval=5.0,
+        xp_flush_threshold=500,
+        settings_cache_size=10000,
+        group_commit_window=0,
+        read_pool_size=2,
+        rank_index_guilds=1000,
+        journal_size_limit=64 * 1024 * 1024,
+        slow_query_ms=250,
+    ):
+        self.path = path
+        self.conn = None
+        # XP is write-behind: grants accumulate in _xp_buffer as absolute
+        # (xp, level) state and are flushed in one transaction. An interval of
+        # 0 disables buffering and writes every grant straight through.
+        self.xp_flush_interval = xp_flush_interval
+        self.xp_flush_threshold = xp_flush_threshold
+        self._xp_buffer = {}
+        # The batch a flush has taken out of _xp_buffer, until it commits.
+        self._xp_flushing = {}
+        self._xp_lock = asyncio.Lock()
+        self._flush_task = None
+        # Moderation events are buffered the same way and appended, with their
+        # rollup increments, in one transaction per flush.
+        self._event_buffer = []
+        self._event_lock = asyncio.Lock()
+        self._settings_cache = LRUCache(maxsize=settings_cache_size)
+        self._settings_cache_stats = {"lookups": 0, "hits": 0, "misses": 0, "invalidations": 0}
+        self._settings_version = 0
+        # Mirror of afk_users: {guild_id: {user_id: message}}. Loaded once on
+        # connect and kept in sync by set_afk/remove_afk, so AFK lookups on the
+        # message path never touch SQLite.
+        self._afk_index = {}
+        # With a non-zero window, mutating methods leave their writes in the
+        # open transaction and a single COMMIT is issued per window. Callers
+        # that need durability await wait_for_commit().
+        self.group_commit_window = group_commit_window
+        self._pending_commit = None
+        # The window whose COMMIT is running: it takes no new writes but isn't
+        # durable yet.
+        self._committing = None
+        self._group_commit_stats = {"commits": 0, "writes": 0}
+        self._batch_stats = {"batches": 0, "calls": 0, "hops": 0}
+        # Read-only connections for dashboard/API reads so they don't queue
+        # behind message-path writes on self.conn. WAL lets them run alongside
+        # the writer; they only see committed data.
+        self.read_pool_size = read_pool_size
+        self._readers = []
+        self._reader_pool = None
+        self._rank_index = RankIndex(max_guilds=rank_index_guilds)
+        self._rank_loads = {}
+        self.journal_size_limit = journal_size_limit
+        self._maintenance_stats = {}
+        self._db_metrics = {}
+        self.slow_query_ms = slow_query_ms
+        self._query_metrics = MetricsRegistry()
+        self._table_columns = {}
+
+    async def connect(self):
+        if self.conn:
+            return
+
+        self.conn = await aiosqlite.connect(self.path, timeout=10)
+        await self.conn.execute("PRAGMA foreign_keys = ON;")
+        # Only takes effect on a brand-new file, before any table exists; older
+        # databases keep auto_vacuum=NONE until someone runs a manual VACUUM.
+        await self.conn.execute("PRAGMA auto_vacuum = INCREMENTAL;")
+        await self.conn.execute("PRAGMA journal_mode=WAL;")
+        # Without a limit the -wal file keeps its high-water size after every
+        # checkpoint; with one, SQLite truncates it back down.
+        await self.conn.execute(f"PRAGMA journal_size_limit = {int(self.journal_size_limit)};")
+
+        await self._run_migrations()
+
+        await self._load_afk_index()
+        await self._open_read_pool()
+
+        if self.xp_flush_interval:
+            self._flush_task = asyncio.create_task(self._flush_loop())
+
+    async def _run_migrations(self):
+        async with self.conn.execute("PRAGMA user_version") as cursor:
+            version = (await cursor.fetchone())[0]
+
+        if version >= len(MIGRATIONS):
+            return
+
+        for target, migration in enumerate(MIGRATIONS[version:], start=version + 1):
+            await self.conn.execute("BEGIN")
             try:
-                await self.conn.execute(stmt)
+                await migration(self.conn)
+                await self.conn.execute(f"PRAGMA user_version = {target}")
+                await self.conn.commit()
             except Exception:
-                pass
-
-        await self.conn.commit()
+                await self.conn.rollback()
+                log.exception("Database migration %s (%s) failed.", target, migration.__name__)
+                raise
+            log.info("Applied database migration %s: %s", target, migration.__name__)
 
     async def close(self):
+        if self._flush_task:
+            # Holding both locks lets a flush that is already running finish
+            # instead of being cancelled halfway through its writes.
+            async with self._xp_lock, self._event_lock:
+                self._flush_task.cancel()
+            await asyncio.gather(self._flush_task, return_exceptions=True)
+            self._flush_task = None
+
         if self.conn:
+            try:
+                await self.flush_xp()
+            except Exception as e:
+                log.error("Failed to flush buffered XP on close: %s", e)
+            try:
+                await self.flush_moderation_events()
+            except Exception as e:
+                log.error("Failed to flush buffered moderation events on close: %s", e)
+            try:
+                await self.wait_for_commit()
+            except Exception as e:
+                log.error("Failed to commit pending writes on close: %s", e)
+            try:
+                await self.conn.execute("PRAGMA optimize;")
+            except Exception as e:
+                log.warning("PRAGMA optimize failed on close: %s", e)
             await self.conn.close()
             self.conn = None
 
-    async def add_warning(self, guild_id, user_id):
-        await self.conn.execute(
-            "INSERT INTO warnings (guild_id, user_id, count) VALUES (?, ?, 1) "
-            "ON CONFLICT(guild_id, user_id) DO UPDATE SET count = count + 1",
-            (guild_id, user_id),
+        for reader in self._readers:
+            await reader.close()
+        self._readers = []
+        self._reader_pool = None
+
+    async def _open_read_pool(self):
+        if self.path == ":memory:" or self.read_pool_size <= 0:
+            return
+
+        self._reader_pool = asyncio.Queue()
+        for _ in range(self.read_pool_size):
+            reader = await self._open_reader()
+            self._readers.append(reader)
+            self._reader_pool.put_nowait(reader)
+
+    async def _open_reader(self):
+        uri = f"{Path(self.path).resolve().as_uri()}?mode=ro"
+        reader = await aiosqlite.connect(uri, uri=True, timeout=10)
+        await reader.execute("PRAGMA query_only = ON;")
+        return reader
+
+    @asynccontextmanager
+    async def _reader(self):
+        if self._reader_pool is None:
+            yield self.conn
+            return
+
+        if self._pending_commit is not None or self._committing is not None:
+            # The pool only sees committed rows, so let writes waiting on a
+            # group commit land first; callers read back their own writes.
+            # A failed commit is reported by the group commit itself.
+            with suppress(Exception):
+                await self.wait_for_commit()
+
+        reader = await self._reader_pool.get()
+        try:
+            yield reader
+        finally:
+            self._reader_pool.put_nowait(reader)
+
+    async def _flush_loop(self):
+        while True:
+            await asyncio.sleep(self.xp_flush_interval)
+            try:
+                await self.flush_xp()
+            except Exception as e:
+                log.error("Periodic XP flush failed: %s", e)
+            try:
+                await self.flush_moderation_events()
+            except Exception as e:
+                log.error("Periodic moderation event flush failed: %s", e)
+
+    @instrumented()
+    async def flush_xp(self):
+        async with self._xp_lock:
+            if not self._xp_buffer:
+                return 0
+
+            pending, self._xp_buffer = self._xp_buffer, {}
+            self._xp_flushing = pending
+            try:
+                await self.conn.executemany(
+                    "INSERT INTO user_data (guild_id, user_id, xp, level) VALUES (?, ?, ?, ?) "
+                    "ON CONFLICT(guild_id, user_id) DO UPDATE SET xp = excluded.xp, level = excluded.level",
+                    [(guild_id, user_id, xp, level) for (guild_id, user_id), (xp, level) in pending.items()],
+                )
+                await self.conn.commit()
+            except BaseException:
+                # Rows carry absolute values, so re-running a partially applied
+                # flush is harmless. Rolling back here would also discard
+                # unrelated writes waiting on a group commit. A cancelled flush
+                # is requeued too, or its grants would be lost.
+                for key, state in pending.items():
+                    self._xp_buffer.setdefault(key, state)
+                raise
+            finally:
+                self._xp_flushing = {}
+
+            log.debug("Flushed buffered XP for %s user(s).", len(pending))
+            return len(pending)
+
+    @instrumented()
+    async def flush_moderation_events(self):
+        async with self._event_lock:
+            if not self._event_buffer:
+                return 0
+
+            pending, self._event_buffer = self._event_buffer, []
+            # Events aren't idempotent like XP rows, so they and their rollup
+            # increments land together or not at all. Both run in one worker
+            # hop, so no other caller's COMMIT can end the transaction (or the
+            # savepoint nested in a group commit's) between them.
+            try:
+                rollups = [(*key, count) for key, count in rollup_counts(pending).items()]
+                steps = [
+                    lambda conn: conn.executemany(INSERT_MODERATION_EVENT_SQL, pending),
+                    lambda conn: conn.executemany(ADD_MODERATION_ROLLUP_SQL, rollups),
+                ]
+                await self._execute_steps(steps, writes=True, commit=True)
+            except Exception:
+                self._event_buffer[:0] = pending
+                raise
+
+            log.debug("Flushed %s moderation event(s).", len(pending))
+            return len(pending)
+
+    async def _commit(self):
+        if not self.group_commit_window:
+            await self.conn.commit()
+            return
+
+        self._group_commit_stats["writes"] += 1
+        if self._pending_commit is None:
+            self._pending_commit = asyncio.get_running_loop().create_future()
+            asyncio.create_task(self._run_group_commit(self._pending_commit))
+
+    async def _run_group_commit(self, future):
+        await asyncio.sleep(self.group_commit_window)
+        # Writes issued after this point join the next window. aiosqlite runs
+        # calls in FIFO order, so every write that joined this window is
+        # already queued ahead of the COMMIT below.
+        if self._pending_commit is future:
+            self._pending_commit = None
+        self._committing = future
+        try:
+            await self.conn.commit()
+        except Exception as e:
+            log.error("Group commit failed: %s", e)
+            future.set_exception(e)
+            # Mark the exception as retrieved; waiters still receive it.
+            future.exception()
+            return
+        finally:
+            if self._committing is future:
+                self._committing = None
+
+        self._group_commit_stats["commits"] += 1
+        future.set_result(None)
+
+    def batch(self):
+        return UnitOfWork(self)
+
+    # The calls UnitOfWork can batch are planned as (query, apply, writes): the
+    # _Query the call needs, or None if memory can answer it, and a function
+    # turning the query's result into the return value. The methods below run
+    # one plan each and UnitOfWork runs a whole batch of them in one hop.
+
+    async def _run_plan(self, plan, writer=False):
+        query, apply, writes = plan
+        value = None
+        if query is not None:
+            if writes or writer:
+                value = await query.fetch(self.conn)
+            else:
+                async with self._reader() as conn:
+                    value = await query.fetch(conn)
+            if writes:
+                await self._commit()
+        return apply(value) if apply else value
+
+    def _plan_add_warning(self, guild_id, user_id):
+        return _Query(ADD_WARNING_SQL, (guild_id, user_id), "value", 0), None, True
+
+    def _plan_get_warnings(self, guild_id, user_id):
+        return _Query(SELECT_WARNINGS_SQL, (guild_id, user_id), "value", 0), None, False
+
+    def _plan_reset_warnings(self, guild_id, user_id):
+        return _Query(RESET_WARNINGS_SQL, (guild_id, user_id), "rowcount"), lambda _: None, True
+
+    def _plan_get_automod_settings(self, guild_id):
+        self._settings_cache_stats["lookups"] += 1
+        cached = self._settings_cache.get(guild_id)
+        if cached is not None:
+            self._settings_cache_stats["hits"] += 1
+            return None, lambda _: dict(cached), False
+
+        self._settings_cache_stats["misses"] += 1
+        version = self._settings_version
+
+        def apply(row):
+            settings = _settings_from_row(row)
+            self._cache_automod_settings(guild_id, settings, version)
+            return dict(settings)
+
+        return _Query(SELECT_AUTOMOD_SETTINGS_SQL, (guild_id,)), apply, False
+
+    def _plan_add_xp(self, guild_id, user_id, xp_to_add):
+        if not self.xp_flush_interval:
+            def apply_direct(row):
+                xp, level = row
+                self._rank_index.update(guild_id, user_id, level, xp)
+                return _level_up_from_returning(xp, level, xp_to_add)
+
+            return _Query(ADD_XP_SQL, (guild_id, user_id, xp_to_add)), apply_direct, True
+
+        # Buffered grants only read the base row, and only for users not yet
+        # in the buffer. Callers hold _xp_lock while that read is in flight.
+        key = (guild_id, user_id)
+
+        def apply_buffered(row):
+            state = self._xp_buffer.get(key)
+            if state is None:
+                state = list(row) if row else [0, 0]
+                self._xp_buffer[key] = state
+            new_level = _grant_xp(state, xp_to_add)
+            self._rank_index.update(guild_id, user_id, state[1], state[0])
+            return new_level
+
+        query = None if key in self._xp_buffer else _Query(SELECT_XP_SQL, key)
+        return query, apply_buffered, False
+
+    def _plan_get_xp_and_level(self, guild_id, user_id):
+        key = (guild_id, user_id)
+
+        def apply(row):
+            # A grant may have buffered the user while the row was read.
+            state = self._buffered_xp(key)
+            if state is not None:
+                return state[0], state[1]
+            return (row[0], row[1]) if row else (0, 0)
+
+        query = None if self._buffered_xp(key) is not None else _Query(SELECT_XP_SQL, key)
+        return query, apply, False
+
+    def _plan_set_afk(self, guild_id, user_id, message):
+        def apply(_):
+            self._afk_index.setdefault(guild_id, {})[user_id] = message
+
+        return _Query(SET_AFK_SQL, (guild_id, user_id, message), "rowcount"), apply, True
+
+    def _plan_remove_afk(self, guild_id, user_id):
+        return (
+            _Query(REMOVE_AFK_SQL, (guild_id, user_id), "rowcount"),
+            lambda _: self._forget_afk(guild_id, user_id),
+            True,
         )
-        await self.conn.commit()
 
-        async with self.conn.execute(
-            "SELECT count FROM warnings WHERE guild_id=? AND user_id=?",
-            (guild_id, user_id),
-        ) as cursor:
-            row = await cursor.fetchone()
-            return row[0] if row else 0
+    async def _run_steps(self, steps, writes):
+        self._batch_stats["hops"] += 1
+        return await self._execute_steps(steps, writes, commit=writes and not self.group_commit_window)
+
+    async def _execute_steps(self, steps, writes, commit):
+        # Connection._execute and ._conn are aiosqlite internals; requirements.txt
+        # pins the range of releases this has been tested against.
+        return await self.conn._execute(_run_unit_of_work, self.conn._conn, steps, writes, commit)
+
+    async def wait_for_commit(self):
+        # The open window, and one whose COMMIT hasn't landed yet.
+        for future in (self._committing, self._pending_commit):
+            if future is not None:
+                await asyncio.shield(future)
 
+    def _record_maintenance(self, name, started, result=None):
+        duration_ms = (time.perf_counter() - started) * 1000
+        entry = self._maintenance_stats.setdefault(
+            name,
+            {"runs": 0, "total_ms": 0.0, "max_ms": 0.0, "last_ms": 0.0},
+        )
+        entry["runs"] += 1
+        entry["total_ms"] += duration_ms
+        entry["max_ms"] = max(entry["max_ms"], duration_ms)
+        entry["last_ms"] = duration_ms
+        entry["last_run"] = int(time.time())
+        if result is not None:
+            entry["last_result"] = result
+        return duration_ms
+
+    @instrumented()
+    async def checkpoint(self, mode="PASSIVE"):
+        mode = mode.upper()
+        if mode not in ("PASSIVE", "FULL", "RESTART", "TRUNCATE"):
+            raise ValueError(f"Unknown checkpoint mode: {mode}")
+
+        started = time.perf_counter()
+        async with self.conn.execute(f"PRAGMA wal_checkpoint({mode});") as cursor:
+            busy, wal_frames, checkpointed_frames = await cursor.fetchone()
+        result = {
+            "busy": bool(busy),
+            "wal_frames": wal_frames,
+            "checkpointed_frames": checkpointed_frames,
+        }
+        duration_ms = self._record_maintenance(f"checkpoint_{mode.lower()}", started, result)
+        log.debug("WAL checkpoint (%s) took %.1f ms: %s", mode, duration_ms, result)
+        return result
+
+    @instrumented()
+    async def optimize(self, analyze=False):
+        started = time.perf_counter()
+        # PRAGMA optimize only re-analyzes tables whose stats look stale; a full
+        # ANALYZE is reserved for explicit requests since it scans every index.
+        await self.conn.execute("ANALYZE;" if analyze else "PRAGMA optimize;")
+        self._record_maintenance("analyze" if analyze else "optimize", started)
+
+    @instrumented()
+    async def incremental_vacuum(self, pages=500):
+        async with self.conn.execute("PRAGMA auto_vacuum;") as cursor:
+            auto_vacuum = (await cursor.fetchone())[0]
+        if auto_vacuum != 2:
+            return 0
+
+        started = time.perf_counter()
+        async with self.conn.execute("PRAGMA freelist_count;") as cursor:
+            before = (await cursor.fetchone())[0]
+        # executescript steps the pragma to completion (a plain execute() frees
+        # only the first page). It also commits any open group-commit window.
+        await self.conn.executescript(f"PRAGMA incremental_vacuum({int(pages)});")
+        async with self.conn.execute("PRAGMA freelist_count;") as cursor:
+            after = (await cursor.fetchone())[0]
+        self._record_maintenance("incremental_vacuum", started, {"pages_freed": before - after})
+        return before - after
+
+    @instrumented(retry_locked=True)
+    async def get_db_metrics(self):
+        metrics = {}
+        for pragma in ("page_size", "page_count", "freelist_count", "auto_vacuum"):
+            async with self.conn.execute(f"PRAGMA {pragma};") as cursor:
+                metrics[pragma] = (await cursor.fetchone())[0]
+
+        for suffix, key in (("", "db_bytes"), ("-wal", "wal_bytes"), ("-shm", "shm_bytes")):
+            try:
+                metrics[key] = os.path.getsize(self.path + suffix)
+            except OSError:
+                metrics[key] = 0
+
+        self._db_metrics = metrics
+        return metrics
+
+    @instrumented()
+    async def add_warning(self, guild_id, user_id):
+        return await self._run_plan(self._plan_add_warning(guild_id, user_id))
+
+    @instrumented(retry_locked=True)
     async def get_warnings(self, guild_id, user_id):
-        async with self.conn.execute(
-            "SELECT count FROM warnings WHERE guild_id=? AND user_id=?",
-            (guild_id, user_id),
-        ) as cursor:
-            row = await cursor.fetchone()
-            return row[0] if row else 0
+        return await self._run_plan(self._plan_get_warnings(guild_id, user_id))
 
+    @instrumented()
     async def reset_warnings(self, guild_id, user_id):
-        await self.conn.execute(
-            "DELETE FROM warnings WHERE guild_id=? AND user_id=?",
-            (guild_id, user_id),
-        )
-        await self.conn.commit()
+        await self._run_plan(self._plan_reset_warnings(guild_id, user_id))
 
-    async def get_automod_settings(self, guild_id):
-        async with self.conn.execute(
-            "SELECT profanity_filter_enabled, warning_limit, punishment_type "
-            "FROM automod_settings WHERE guild_id=?",
-            (guild_id,),
-        ) as cursor:
-            row = await cursor.fetchone()
-            if row:
-                return {
-                    "profanityFilter": bool(row[0]),
-                    "warningLimit": row[1],
-                    "limitAction": row[2],
-                }
+    @instrumented()
+    async def reset_warnings_bulk(self, guild_id, user_ids):
+        cursor = await self.conn.execute(RESET_WARNINGS_BULK_SQL, (guild_id, json.dumps(list(user_ids))))
+        await self._commit()
+        return cursor.rowcount
+
+    @instrumented(retry_locked=True)
+    async def get_member_stats(self, guild_id, user_ids):
+        async with self._reader() as conn:
+            rows = await conn.execute_fetchall(SELECT_MEMBER_STATS_SQL, (guild_id, json.dumps(list(user_ids))))
+        stats = {user_id: (warnings, xp, level) for user_id, warnings, xp, level in rows}
+        # Buffered XP is newer than what the table holds.
+        for user_id in stats:
+            state = self._buffered_xp((guild_id, user_id))
+            if state is not None:
+                stats[user_id] = (stats[user_id][0], *state)
+        return stats
+
+    def get_stats(self):
         return {
-            "profanityFilter": True,
-            "warningLimit": 3,
-            "limitAction": "kick",
+            "engine": "sqlite",
+            "automod_settings_cache": {
+                **self._settings_cache_stats,
+                "size": len(self._settings_cache),
+            },
+            "xp_buffer": {"pending_users": len(self._xp_buffer)},
+            "moderation_event_buffer": {"pending_events": len(self._event_buffer)},
+            "read_pool": {
+                "size": len(self._readers),
+                "idle": self._reader_pool.qsize() if self._reader_pool else 0,
+            },
+            "group_commit": {
+                **self._group_commit_stats,
+                "window_ms": self.group_commit_window * 1000,
+            },
+            "unit_of_work": self._batch_stats,
+            "queries": self._query_metrics.snapshot(),
+            "rank_index": self._rank_index.stats(),
+            "maintenance": {
+                "metrics": self._db_metrics,
+                "operations": self._maintenance_stats,
+            },
+            "afk_index": {
+                "guilds": len(self._afk_index),
+                "users": sum(len(users) for users in self._afk_index.values()),
+            },
         }
 
-    async def set_automod_settings(self, guild_id, profanity_filter, limit, punishment):
+    @instrumented(retry_locked=True)
+    async def get_automod_settings(self, guild_id):
+        return await self._get_automod_settings(guild_id)
+
+    async def _get_automod_settings(self, guild_id):
+        return await self._run_plan(self._plan_get_automod_settings(guild_id))
+
+    def _cache_automod_settings(self, guild_id, settings, version):
+        # Don't cache a read that raced with set_automod_settings.
+        if version == self._settings_version:
+            self._settings_cache[guild_id] = settings
+
+    def invalidate_automod_settings(self, guild_id):
+        self._settings_version += 1
+        if self._settings_cache.pop(guild_id, None) is not None:
+            self._settings_cache_stats["invalidations"] += 1
+
+    @instrumented()
+    async def set_automod_settings(
+        self,
+        guild_id,
+        profanity_filter,
+        limit,
+        punishment,
+        xp_cooldown=None,
+        blocked_words=None,
+        allowed_words=None,
+        spam_settings=None,
+    ):
         await self.conn.execute(
-            "INSERT OR REPLACE INTO automod_settings "
-            "(guild_id, profanity_filter_enabled, warning_limit, punishment_type) "
-            "VALUES (?, ?, ?, ?)",
-            (guild_id, profanity_filter, limit, punishment),
+            SET_AUTOMOD_SETTINGS_SQL,
+            (
+                guild_id,
+                profanity_filter,
+                limit,
+                punishment,
+                xp_cooldown,
+                encode_words(blocked_words),
+                encode_words(allowed_words),
+                encode_spam_settings(spam_settings),
+            ),
         )
-        await self.conn.commit()
+        await self._commit()
+        # Cache misses are served by the read pool, which only sees committed
+        # rows, so the write must land before the entry can be dropped.
+        await self.wait_for_commit()
+        self.invalidate_automod_settings(guild_id)
 
+    @instrumented()
     async def add_xp(self, guild_id, user_id, xp_to_add):
-        await self.conn.execute(
-            "INSERT OR IGNORE INTO user_data (guild_id, user_id, xp, level) VALUES (?, ?, 0, 0)",
-            (guild_id, user_id),
-        )
-        await self.conn.execute(
-            "UPDATE user_data SET xp = xp + ? WHERE guild_id = ? AND user_id = ?",
-            (xp_to_add, guild_id, user_id),
-        )
+        if not self.xp_flush_interval:
+            return await self._run_plan(self._plan_add_xp(guild_id, user_id, xp_to_add))
 
-        async with self.conn.execute(
-            "SELECT xp, level FROM user_data WHERE guild_id=? AND user_id=?",
-            (guild_id, user_id),
-        ) as cursor:
-            row = await cursor.fetchone()
-            xp, level = row if row else (0, 0)
-
-        required_xp = (level + 1) * 100
-        if xp >= required_xp:
-            new_level = level + 1
-            new_xp = xp - required_xp
-            await self.conn.execute(
-                "UPDATE user_data SET level = ?, xp = ? WHERE guild_id = ? AND user_id = ?",
-                (new_level, new_xp, guild_id, user_id),
+        if (guild_id, user_id) in self._xp_buffer:
+            new_level = await self._run_plan(self._plan_add_xp(guild_id, user_id, xp_to_add))
+        else:
+            # Holding the lock keeps a concurrent flush from landing between
+            # the SELECT and the insert, which would resurrect stale XP.
+            async with self._xp_lock:
+                new_level = await self._run_plan(self._plan_add_xp(guild_id, user_id, xp_to_add), writer=True)
+
+        if len(self._xp_buffer) >= self.xp_flush_threshold:
+            await self.flush_xp()
+
+        return new_level
+
+    @instrumented()
+    async def log_moderation_event(
+        self,
+        guild_id,
+        action,
+        user_id=None,
+        moderator_id=None,
+        reason=None,
+        created_at=None,
+    ):
+        if action not in MODERATION_ACTIONS:
+            raise ValueError(f"Unknown moderation action {action!r}")
+        created_at = int(time.time()) if created_at is None else int(created_at)
+        self._event_buffer.append((guild_id, action, user_id, moderator_id, reason, created_at))
+        if not self.xp_flush_interval or len(self._event_buffer) >= self.xp_flush_threshold:
+            await self.flush_moderation_events()
+
+    @instrumented(retry_locked=True)
+    async def get_moderation_stats(self, guild_id, granularity, since, until):
+        await self.flush_moderation_events()
+        async with self._reader() as conn:
+            return await conn.execute_fetchall(
+                SELECT_MODERATION_ROLLUPS_SQL, (guild_id, granularity, since, until)
             )
-            await self.conn.commit()
-            return new_level
 
-        await self.conn.commit()
-        return None
+    @instrumented(retry_locked=True)
+    async def get_build_plan(self, cache_key, now):
+        async with self._reader() as conn:
+            async with conn.execute(SELECT_BUILD_PLAN_SQL, (cache_key, now)) as cursor:
+                row = await cursor.fetchone()
+        return tuple(row) if row else None
+
+    @instrumented()
+    async def set_build_plan(self, cache_key, plan_json, expires_at):
+        await self.conn.execute(SET_BUILD_PLAN_SQL, (cache_key, plan_json, expires_at))
+        await self._commit()
 
+    @instrumented()
+    async def prune_build_plans(self, now):
+        cursor = await self.conn.execute(PRUNE_BUILD_PLANS_SQL, (now,))
+        await self._commit()
+        return cursor.rowcount
+
+    @instrumented(retry_locked=True)
     async def get_xp_and_level(self, guild_id, user_id):
-        async with self.conn.execute(
-            "SELECT xp, level FROM user_data WHERE guild_id=? AND user_id=?",
-            (guild_id, user_id),
-        ) as cursor:
-            row = await cursor.fetchone()
-            return (row[0], row[1]) if row else (0, 0)
+        return await self._run_plan(self._plan_get_xp_and_level(guild_id, user_id))
+
+    def _buffered_xp(self, key):
+        # Unflushed XP, including a batch a flush is still writing: the read
+        # pool can't see those rows until the flush commits.
+        state = self._xp_buffer.get(key)
+        return state if state is not None else self._xp_flushing.get(key)
+
+    async def _load_afk_index(self):
+        self._afk_index = {}
+        async with self.conn.execute("SELECT guild_id, user_id, message FROM afk_users") as cursor:
+            async for guild_id, user_id, message in cursor:
+                self._afk_index.setdefault(guild_id, {})[user_id] = message
+
+    @instrumented(retry_locked=True)
+    async def get_rank(self, guild_id, user_id):
+        if not self._rank_index.is_loaded(guild_id):
+            await self._load_rank_index(guild_id)
+        return self._rank_index.rank(guild_id, user_id)
+
+    async def _load_rank_index(self, guild_id):
+        loading = self._rank_loads.get(guild_id)
+        if loading is not None:
+            await asyncio.shield(loading)
+            return
+
+        loading = asyncio.get_running_loop().create_future()
+        self._rank_loads[guild_id] = loading
+        try:
+            # Start tracking updates before the scan so grants that land while
+            # it runs aren't lost, and layer unflushed XP over committed rows.
+            # That includes a batch a flush is still writing, which the scan
+            # may not see yet.
+            self._rank_index.begin_load(guild_id)
+            for buffered in (self._xp_flushing, self._xp_buffer):
+                for (buffered_guild_id, user_id), (xp, level) in buffered.items():
+                    if buffered_guild_id == guild_id:
+                        self._rank_index.update(guild_id, user_id, level, xp)
 
+            async with self._reader() as conn:
+                rows = await conn.execute_fetchall(
+                    "SELECT user_id, level, xp FROM user_data WHERE guild_id=?",
+                    (guild_id,),
+                )
+            self._rank_index.fill(guild_id, rows)
+            loading.set_result(None)
+        except Exception as e:
+            self._rank_index.discard(guild_id)
+            loading.set_exception(e)
+            loading.exception()
+            raise
+        finally:
+            del self._rank_loads[guild_id]
+
+    @instrumented(retry_locked=True)
+    async def get_leaderboard(self, guild_id, limit=10, after=None):
+        # Keyset pagination over idx_user_data_leaderboard: `after` is the
+        # (level, xp, user_id) of the last row on the previous page, so every
+        # page is an index seek no matter how deep it is.
+        await self.flush_xp()
+        if after is None:
+            query = (
+                "SELECT user_id, level, xp FROM user_data WHERE guild_id=? "
+                "ORDER BY level DESC, xp DESC, user_id DESC LIMIT ?"
+            )
+            params = (guild_id, limit)
+        else:
+            query = (
+                "SELECT user_id, level, xp FROM user_data "
+                "WHERE guild_id=? AND (level, xp, user_id) < (?, ?, ?) "
+                "ORDER BY level DESC, xp DESC, user_id DESC LIMIT ?"
+            )
+            params = (guild_id, *after, limit)
+
+        async with self._reader() as conn:
+            return await conn.execute_fetchall(query, params)
+
+    @instrumented()
     async def set_afk(self, guild_id, user_id, message):
-        await self.conn.execute(
-            "INSERT OR REPLACE INTO afk_users (guild_id, user_id, message) VALUES (?, ?, ?)",
-            (guild_id, user_id, message),
-        )
-        await self.conn.commit()
+        await self._run_plan(self._plan_set_afk(guild_id, user_id, message))
 
+    @instrumented()
     async def remove_afk(self, guild_id, user_id):
-        await self.conn.execute(
-            "DELETE FROM afk_users WHERE guild_id=? AND user_id=?",
-            (guild_id, user_id),
-        )
-        await self.conn.commit()
+        await self._run_plan(self._plan_remove_afk(guild_id, user_id))
 
+    def _forget_afk(self, guild_id, user_id):
+        guild_afk = self._afk_index.get(guild_id)
+        if guild_afk is not None:
+            guild_afk.pop(user_id, None)
+            if not guild_afk:
+                del self._afk_index[guild_id]
+
+    @instrumented(retry_locked=True)
     async def get_afk_user(self, guild_id, user_id):
-        async with self.conn.execute(
-            "SELECT message FROM afk_users WHERE guild_id=? AND user_id=?",
-            (guild_id, user_id),
-        ) as cursor:
-            row = await cursor.fetchone()
-            return row[0] if row else None
+        return self._afk_index.get(guild_id, {}).get(user_id)
 
+    @instrumented(retry_locked=True)
+    async def get_afk_users(self, guild_id, user_ids):
+        return self._afk_users(guild_id, user_ids)
+
+    def _afk_users(self, guild_id, user_ids):
+        guild_afk = self._afk_index.get(guild_id)
+        if not guild_afk:
+            return {}
+        return {user_id: guild_afk[user_id] for user_id in user_ids if user_id in guild_afk}
+
+    @instrumented(retry_locked=True)
+    async def get_message_context(self, guild_id, user_ids):
+        # Settings come from the LRU cache and AFK state from the in-memory
+        # index, so this only reaches SQLite on a settings cache miss.
+        return await self._get_automod_settings(guild_id), self._afk_users(guild_id, user_ids)
+
+    @instrumented()
     async def add_reaction_role(self, message_id, guild_id, channel_id, emoji, role_id):
         await self.conn.execute(
             "INSERT OR IGNORE INTO reaction_roles (message_id, guild_id, channel_id) VALUES (?, ?, ?)",
@@ -241,8 +1387,9 @@ class PersistentDB:
             "INSERT OR REPLACE INTO reaction_role_mappings (message_id, emoji, role_id) VALUES (?, ?, ?)",
             (message_id, emoji, role_id),
         )
-        await self.conn.commit()
+        await self._commit()
 
+    @instrumented(retry_locked=True)
     async def get_reaction_role(self, message_id, emoji):
         async with self.conn.execute(
             "SELECT role_id FROM reaction_role_mappings WHERE message_id=? AND emoji=?",
@@ -251,6 +1398,7 @@ class PersistentDB:
             row = await cursor.fetchone()
             return row[0] if row else None
 
+    @instrumented(retry_locked=True)
     async def get_all_reaction_roles(self):
         roles = {}
         query = "SELECT message_id, emoji, role_id FROM reaction_role_mappings"
@@ -261,6 +1409,7 @@ class PersistentDB:
                 roles[message_id][emoji] = role_id
         return roles
 
+    @instrumented()
     async def add_event(
         self,
         guild_id,
@@ -287,8 +1436,9 @@ class PersistentDB:
                 ping_role_id,
             ),
         )
-        await self.conn.commit()
+        await self._commit()
 
+    @instrumented(retry_locked=True)
     async def get_pending_reminders(self, now_ts):
         async with self.conn.execute(
             """
@@ -300,9 +1450,99 @@ class PersistentDB:
         ) as cursor:
             return await cursor.fetchall()
 
+    @instrumented()
     async def mark_reminder_sent(self, event_id):
         await self.conn.execute(
             "UPDATE scheduled_events SET reminder_sent = 1 WHERE id = ?",
             (event_id,),
         )
-        await self.conn.commit()
+        await self._commit()
+
+    @asynccontextmanager
+    async def _snapshot(self):
+        if self.path == ":memory:":
+            yield self.conn
+            return
+
+        # A dedicated connection, so a slow export never holds a pool reader.
+        # Its read transaction pins one WAL snapshot across every table; WAL
+        # checkpoints can't pass that point until it ends.
+        conn = await self._open_reader()
+        try:
+            await conn.execute("BEGIN")
+            yield conn
+        finally:
+            await conn.close()
+
+    async def export_guild(self, guild_id, chunk_size=500):
+        await self.flush_xp()
+        await self.wait_for_commit()
+
+        async with self._snapshot() as conn:
+            for table in BACKUP_TABLES:
+                async with conn.execute(EXPORT_SQL[table], (guild_id,)) as cursor:
+                    columns = [column[0] for column in cursor.description]
+                    keep = [i for i, column in enumerate(columns) if column not in ("id", "guild_id")]
+                    while rows := await cursor.fetchmany(chunk_size):
+                        yield [
+                            {"table": table, **{columns[i]: row[i] for i in keep}}
+                            for row in rows
+                        ]
+
+    async def _columns(self, table):
+        columns = self._table_columns.get(table)
+        if columns is None:
+            async with self.conn.execute(f"PRAGMA table_info({table})") as cursor:
+                columns = {row[1] async for row in cursor}
+            self._table_columns[table] = columns
+        return columns
+
+    @instrumented()
+    async def import_guild_records(self, guild_id, records):
+        groups = {}
+        for record in records:
+            check_record(record)
+            table = record["table"]
+            allowed = await self._columns(table)
+            columns = [column for column in record if column in allowed and column not in ("id", "guild_id")]
+            values = [record[column] for column in columns]
+            if "guild_id" in allowed:
+                columns.insert(0, "guild_id")
+                values.insert(0, guild_id)
+            if table == "scheduled_events":
+                values += [guild_id, record["channel_id"], record["event_name"], record["event_time"]]
+            elif table == "reaction_role_mappings":
+                values += [record["message_id"], guild_id]
+            groups.setdefault((table, tuple(columns)), []).append((record, values))
+
+        user_data = [record for (table, _), rows in groups.items() if table == "user_data" for record, _ in rows]
+        counts = {}
+        async with self._xp_lock if user_data else nullcontext():
+            # The backup supersedes any unflushed grants for these users.
+            for record in user_data:
+                self._xp_buffer.pop((guild_id, record["user_id"]), None)
+
+            for table, columns in sorted(groups, key=lambda group: BACKUP_TABLES.index(group[0])):
+                rows = groups[(table, columns)]
+                cursor = await self.conn.executemany(_import_sql(table, columns), [values for _, values in rows])
+                # Reaction role rows for another guild's messages are skipped,
+                # so those count what actually landed.
+                imported = cursor.rowcount if table in ("reaction_roles", "reaction_role_mappings") else len(rows)
+                counts[table] = counts.get(table, 0) + imported
+            await self._commit()
+        await self.wait_for_commit()
+
+        for (table, _), rows in groups.items():
+            if table != "afk_users":
+                continue
+            guild_afk = self._afk_index.setdefault(guild_id, {})
+            for record, _ in rows:
+                if "message" in record:
+                    guild_afk[record["user_id"]] = record["message"]
+                else:
+                    guild_afk.setdefault(record["user_id"], None)
+        if "user_data" in counts:
+            self._rank_index.discard(guild_id)
+        if "automod_settings" in counts:
+            self.invalidate_automod_settings(guild_id)
+        return counts
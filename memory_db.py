@@ -0,0 +1,378 @@
+import time
+
+from storage import (
+    DEFAULT_AUTOMOD_SETTINGS,
+    DEFAULT_SPAM_SETTINGS,
+    MODERATION_ACTIONS,
+    StorageBackend,
+    decode_spam_settings,
+    decode_words,
+    encode_spam_settings,
+    encode_words,
+    rollup_counts,
+)
+from utils.guild_backup import check_record
+from utils.rank_index import RankIndex
+
+
+class MemoryDB(StorageBackend):
+    """Pure in-memory engine with the same behaviour as PersistentDB.
+
+    Nothing survives a restart. It exists for benchmarking the message path
+    without disk I/O and for fast local runs (DB_ENGINE=memory).
+    """
+
+    def __init__(self):
+        self.connected = False
+        self._automod_settings = {}
+        self._warnings = {}
+        self._user_data = {}
+        self._afk = {}
+        self._reaction_roles = {}
+        self._reaction_role_mappings = {}
+        self._events = {}
+        self._next_event_id = 1
+        self._rank_index = RankIndex()
+        self._moderation_events = []
+        # {(guild_id, granularity, bucket_start, action): count}
+        self._moderation_rollups = {}
+        # cache_key -> (plan_json, expires_at)
+        self._build_plans = {}
+
+    async def connect(self):
+        self.connected = True
+
+    async def close(self):
+        self.connected = False
+
+    def get_stats(self):
+        return {
+            "engine": "memory",
+            "rank_index": self._rank_index.stats(),
+            "afk_index": {
+                "guilds": len(self._afk),
+                "users": sum(len(users) for users in self._afk.values()),
+            },
+        }
+
+    async def add_warning(self, guild_id, user_id):
+        key = (guild_id, user_id)
+        self._warnings[key] = self._warnings.get(key, 0) + 1
+        return self._warnings[key]
+
+    async def get_warnings(self, guild_id, user_id):
+        return self._warnings.get((guild_id, user_id), 0)
+
+    async def reset_warnings(self, guild_id, user_id):
+        self._warnings.pop((guild_id, user_id), None)
+
+    async def reset_warnings_bulk(self, guild_id, user_ids):
+        return sum(self._warnings.pop((guild_id, user_id), None) is not None for user_id in set(user_ids))
+
+    async def get_member_stats(self, guild_id, user_ids):
+        return {
+            user_id: (self._warnings.get((guild_id, user_id), 0), *self._user_data.get((guild_id, user_id), (0, 0)))
+            for user_id in user_ids
+        }
+
+    async def get_automod_settings(self, guild_id):
+        return dict(self._automod_settings.get(guild_id, DEFAULT_AUTOMOD_SETTINGS))
+
+    async def set_automod_settings(
+        self,
+        guild_id,
+        profanity_filter,
+        limit,
+        punishment,
+        xp_cooldown=None,
+        blocked_words=None,
+        allowed_words=None,
+        spam_settings=None,
+    ):
+        current = self._automod_settings.get(guild_id, DEFAULT_AUTOMOD_SETTINGS)
+        spam = {key: current[key] for key in DEFAULT_SPAM_SETTINGS}
+        if spam_settings is not None:
+            spam.update((key, value) for key, value in spam_settings.items() if key in DEFAULT_SPAM_SETTINGS)
+        self._automod_settings[guild_id] = {
+            "profanityFilter": bool(profanity_filter),
+            "warningLimit": limit,
+            "limitAction": punishment,
+            "xpCooldown": current["xpCooldown"] if xp_cooldown is None else xp_cooldown,
+            "blockedWords": current["blockedWords"] if blocked_words is None else tuple(blocked_words),
+            "allowedWords": current["allowedWords"] if allowed_words is None else tuple(allowed_words),
+            **spam,
+        }
+
+    async def log_moderation_event(
+        self,
+        guild_id,
+        action,
+        user_id=None,
+        moderator_id=None,
+        reason=None,
+        created_at=None,
+    ):
+        if action not in MODERATION_ACTIONS:
+            raise ValueError(f"Unknown moderation action {action!r}")
+        created_at = int(time.time()) if created_at is None else int(created_at)
+        event = (guild_id, action, user_id, moderator_id, reason, created_at)
+        self._moderation_events.append(event)
+        for key, count in rollup_counts([event]).items():
+            self._moderation_rollups[key] = self._moderation_rollups.get(key, 0) + count
+
+    async def get_moderation_stats(self, guild_id, granularity, since, until):
+        return sorted(
+            (bucket_start, action, count)
+            for (row_guild_id, row_granularity, bucket_start, action), count in self._moderation_rollups.items()
+            if row_guild_id == guild_id and row_granularity == granularity and since <= bucket_start < until
+        )
+
+    async def get_build_plan(self, cache_key, now):
+        entry = self._build_plans.get(cache_key)
+        return entry if entry is not None and entry[1] > now else None
+
+    async def set_build_plan(self, cache_key, plan_json, expires_at):
+        self._build_plans[cache_key] = (plan_json, expires_at)
+
+    async def prune_build_plans(self, now):
+        expired = [key for key, (_, expires_at) in self._build_plans.items() if expires_at <= now]
+        for key in expired:
+            del self._build_plans[key]
+        return len(expired)
+
+    async def add_xp(self, guild_id, user_id, xp_to_add):
+        state = self._user_data.setdefault((guild_id, user_id), [0, 0])
+        state[0] += xp_to_add
+        new_level = None
+        while state[0] >= (state[1] + 1) * 100:
+            state[0] -= (state[1] + 1) * 100
+            state[1] += 1
+            new_level = state[1]
+        self._rank_index.update(guild_id, user_id, state[1], state[0])
+        return new_level
+
+    async def get_xp_and_level(self, guild_id, user_id):
+        xp, level = self._user_data.get((guild_id, user_id), (0, 0))
+        return xp, level
+
+    def _guild_rows(self, guild_id):
+        return [
+            (user_id, level, xp)
+            for (row_guild_id, user_id), (xp, level) in self._user_data.items()
+            if row_guild_id == guild_id
+        ]
+
+    async def get_rank(self, guild_id, user_id):
+        if not self._rank_index.is_loaded(guild_id):
+            self._rank_index.begin_load(guild_id)
+            self._rank_index.fill(guild_id, self._guild_rows(guild_id))
+        return self._rank_index.rank(guild_id, user_id)
+
+    async def get_leaderboard(self, guild_id, limit=10, after=None):
+        rows = sorted(
+            self._guild_rows(guild_id),
+            key=lambda row: (row[1], row[2], row[0]),
+            reverse=True,
+        )
+        if after is not None:
+            rows = [row for row in rows if (row[1], row[2], row[0]) < tuple(after)]
+        return rows[:limit]
+
+    async def set_afk(self, guild_id, user_id, message):
+        self._afk.setdefault(guild_id, {})[user_id] = message
+
+    async def remove_afk(self, guild_id, user_id):
+        guild_afk = self._afk.get(guild_id)
+        if guild_afk is not None:
+            guild_afk.pop(user_id, None)
+            if not guild_afk:
+                del self._afk[guild_id]
+
+    async def get_afk_user(self, guild_id, user_id):
+        return self._afk.get(guild_id, {}).get(user_id)
+
+    async def get_afk_users(self, guild_id, user_ids):
+        guild_afk = self._afk.get(guild_id)
+        if not guild_afk:
+            return {}
+        return {user_id: guild_afk[user_id] for user_id in user_ids if user_id in guild_afk}
+
+    async def add_reaction_role(self, message_id, guild_id, channel_id, emoji, role_id):
+        self._reaction_roles.setdefault(message_id, (guild_id, channel_id))
+        self._reaction_role_mappings.setdefault(message_id, {})[emoji] = role_id
+
+    async def get_reaction_role(self, message_id, emoji):
+        return self._reaction_role_mappings.get(message_id, {}).get(str(emoji))
+
+    async def get_all_reaction_roles(self):
+        return {
+            message_id: dict(mappings)
+            for message_id, mappings in self._reaction_role_mappings.items()
+        }
+
+    async def add_event(
+        self,
+        guild_id,
+        channel_id,
+        name,
+        description,
+        event_ts,
+        reminder_ts,
+        ping_role_id=None,
+    ):
+        event_id = self._next_event_id
+        self._next_event_id += 1
+        self._events[event_id] = {
+            "guild_id": guild_id,
+            "channel_id": channel_id,
+            "event_name": name,
+            "description": description,
+            "event_time": int(event_ts),
+            "reminder_time": int(reminder_ts),
+            "ping_role_id": ping_role_id,
+            "reminder_sent": False,
+        }
+
+    async def get_pending_reminders(self, now_ts):
+        now_ts = int(now_ts)
+        return [
+            (
+                event_id,
+                event["guild_id"],
+                event["channel_id"],
+                event["event_name"],
+                event["description"],
+                event["event_time"],
+                event["ping_role_id"],
+            )
+            for event_id, event in self._events.items()
+            if event["reminder_time"] <= now_ts and not event["reminder_sent"]
+        ]
+
+    async def mark_reminder_sent(self, event_id):
+        event = self._events.get(event_id)
+        if event is not None:
+            event["reminder_sent"] = True
+
+    def _guild_records(self, guild_id):
+        settings = self._automod_settings.get(guild_id)
+        if settings is not None:
+            yield {
+                "table": "automod_settings",
+                "profanity_filter_enabled": int(settings["profanityFilter"]),
+                "warning_limit": settings["warningLimit"],
+                "punishment_type": settings["limitAction"],
+                "xp_cooldown": settings["xpCooldown"],
+                "blocked_words": encode_words(settings["blockedWords"]),
+                "allowed_words": encode_words(settings["allowedWords"]),
+                "spam_settings": encode_spam_settings(settings),
+            }
+        for (row_guild_id, user_id), count in sorted(self._warnings.items()):
+            if row_guild_id == guild_id:
+                yield {"table": "warnings", "user_id": user_id, "count": count}
+        for (row_guild_id, user_id), (xp, level) in sorted(self._user_data.items()):
+            if row_guild_id == guild_id:
+                yield {"table": "user_data", "user_id": user_id, "xp": xp, "level": level}
+        for user_id, message in sorted(self._afk.get(guild_id, {}).items()):
+            yield {"table": "afk_users", "user_id": user_id, "message": message}
+
+        message_ids = []
+        for message_id, (row_guild_id, channel_id) in sorted(self._reaction_roles.items()):
+            if row_guild_id == guild_id:
+                message_ids.append(message_id)
+                yield {"table": "reaction_roles", "message_id": message_id, "channel_id": channel_id}
+        for message_id in message_ids:
+            for emoji, role_id in sorted(self._reaction_role_mappings.get(message_id, {}).items()):
+                yield {
+                    "table": "reaction_role_mappings",
+                    "message_id": message_id,
+                    "emoji": emoji,
+                    "role_id": role_id,
+                }
+
+        for _, event in sorted(self._events.items()):
+            if event["guild_id"] == guild_id:
+                record = {"table": "scheduled_events", **event}
+                del record["guild_id"]
+                record["reminder_sent"] = int(event["reminder_sent"])
+                yield record
+
+    async def export_guild(self, guild_id, chunk_size=500):
+        chunk = []
+        for record in self._guild_records(guild_id):
+            chunk.append(record)
+            if len(chunk) >= chunk_size:
+                yield chunk
+                chunk = []
+        if chunk:
+            yield chunk
+
+    async def import_guild_records(self, guild_id, records):
+        counts = {}
+        for record in records:
+            check_record(record)
+            table = record["table"]
+            if self._import_record(guild_id, table, record) is not False:
+                counts[table] = counts.get(table, 0) + 1
+        if "user_data" in counts:
+            self._rank_index.discard(guild_id)
+        return counts
+
+    def _import_record(self, guild_id, table, record):
+        if table == "automod_settings":
+            settings = dict(self._automod_settings.get(guild_id, DEFAULT_AUTOMOD_SETTINGS))
+            if "profanity_filter_enabled" in record:
+                settings["profanityFilter"] = bool(record["profanity_filter_enabled"])
+            if "warning_limit" in record:
+                settings["warningLimit"] = record["warning_limit"]
+            if "punishment_type" in record:
+                settings["limitAction"] = record["punishment_type"]
+            if record.get("xp_cooldown") is not None:
+                settings["xpCooldown"] = record["xp_cooldown"]
+            if record.get("blocked_words") is not None:
+                settings["blockedWords"] = decode_words(record["blocked_words"])
+            if record.get("allowed_words") is not None:
+                settings["allowedWords"] = decode_words(record["allowed_words"])
+            if record.get("spam_settings") is not None:
+                settings.update(decode_spam_settings(record["spam_settings"]))
+            self._automod_settings[guild_id] = settings
+        elif table == "warnings":
+            key = (guild_id, record["user_id"])
+            if "count" in record:
+                self._warnings[key] = record["count"]
+            else:
+                self._warnings.setdefault(key, 1)
+        elif table == "user_data":
+            state = self._user_data.setdefault((guild_id, record["user_id"]), [0, 0])
+            state[0] = record.get("xp", state[0])
+            state[1] = record.get("level", state[1])
+        elif table == "afk_users":
+            guild_afk = self._afk.setdefault(guild_id, {})
+            guild_afk[record["user_id"]] = record.get("message", guild_afk.get(record["user_id"]))
+        elif table == "reaction_roles":
+            # Message ids are global; another guild's reaction role is left alone.
+            existing = self._reaction_roles.get(record["message_id"])
+            if existing is not None and existing[0] != guild_id:
+                return False
+            self._reaction_roles[record["message_id"]] = (guild_id, record["channel_id"])
+        elif table == "reaction_role_mappings":
+            parent = self._reaction_roles.get(record["message_id"])
+            if parent is None or parent[0] != guild_id:
+                return False
+            self._reaction_role_mappings.setdefault(record["message_id"], {})[record["emoji"]] = record["role_id"]
+        elif table == "scheduled_events":
+            match = (guild_id, record["channel_id"], record["event_name"], record["event_time"])
+            for event in self._events.values():
+                if (event["guild_id"], event["channel_id"], event["event_name"], event["event_time"]) == match:
+                    return
+            self._events[self._next_event_id] = {
+                "guild_id": guild_id,
+                "channel_id": record["channel_id"],
+                "event_name": record["event_name"],
+                "description": record.get("description"),
+                "event_time": int(record["event_time"]),
+                "reminder_time": int(record["reminder_time"]),
+                "ping_role_id": record.get("ping_role_id"),
+                "reminder_sent": bool(record.get("reminder_sent", False)),
+            }
+            self._next_event_id += 1
@@ -0,0 +1,295 @@
+import asyncio
+import logging
+import zlib
+from pathlib import Path
+
+from database import PersistentDB
+from storage import SequentialBatch, StorageBackend
+
+log = logging.getLogger(__name__)
+
+
+def partition_path(path, index):
+    base = Path(path)
+    return str(base.with_name(f"{base.stem}.p{index}{base.suffix}"))
+
+
+class PartitionedBatch(SequentialBatch):
+    """Routes each queued call to its guild's partition and runs one
+    UnitOfWork per partition, so every partition still gets a single hop."""
+
+    def __init__(self, db):
+        super().__init__(db)
+        self._batches = {}
+
+    def _queue(self, method, *args):
+        shard = self.db._shard(args[0])
+        batch = self._batches.get(id(shard))
+        if batch is None:
+            batch = self._batches[id(shard)] = shard.batch()
+        return getattr(batch, method.__name__)(*args)
+
+    async def run(self):
+        batches, self._batches = self._batches, {}
+        await asyncio.gather(*(batch.run() for batch in batches.values()))
+
+    async def __aexit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            await self.run()
+        else:
+            self._batches = {}
+
+
+class PartitionedDB(StorageBackend):
+    """SQLite split across N files by guild, each with its own PersistentDB.
+
+    SQLite allows one writer per file, so a busy guild only queues behind the
+    guilds that share its partition. Guild-scoped calls go to one partition;
+    cross-guild reads fan out and merge. Event ids are encoded as
+    ``id * partitions + index`` so mark_reminder_sent can find their file.
+
+    The guild-to-file mapping depends on the partition count, which therefore
+    can't change once data exists. Cache sizes and pools are per partition.
+    """
+
+    def __init__(self, path="bot_data.db", partitions=4, **kwargs):
+        if partitions < 2:
+            raise ValueError("PartitionedDB needs at least two partitions; use PersistentDB instead.")
+        self.path = path
+        self.partitions = partitions
+        self.shards = [
+            PersistentDB(partition_path(path, index), **kwargs) for index in range(partitions)
+        ]
+
+    def _index(self, guild_id):
+        return zlib.crc32(str(guild_id).encode()) % self.partitions
+
+    def _shard(self, guild_id):
+        return self.shards[self._index(guild_id)]
+
+    def _check_layout(self):
+        base = Path(self.path)
+        existing = sorted(base.parent.glob(f"{base.stem}.p*{base.suffix}"))
+        expected = {partition_path(self.path, index) for index in range(self.partitions)}
+        unexpected = [str(file) for file in existing if str(file) not in expected]
+        if unexpected:
+            raise RuntimeError(
+                f"Found partition files {unexpected} that don't match {self.partitions} partitions. "
+                "Changing the partition count would move guilds to the wrong file."
+            )
+        if existing and len(existing) != self.partitions:
+            raise RuntimeError(
+                f"Found {len(existing)} partition file(s) but expected {self.partitions}."
+            )
+        if Path(self.path).exists() and not existing:
+            log.warning(
+                "%s exists but partitioned mode reads %s. Export guilds from the old file and "
+                "import them to carry data over.",
+                self.path,
+                partition_path(self.path, "N"),
+            )
+
+    async def connect(self):
+        self._check_layout()
+        await asyncio.gather(*(shard.connect() for shard in self.shards))
+        log.info("Connected to %s SQLite partition(s).", self.partitions)
+
+    async def close(self):
+        results = await asyncio.gather(*(shard.close() for shard in self.shards), return_exceptions=True)
+        for result in results:
+            if isinstance(result, Exception):
+                log.error("Failed to close a database partition: %s", result)
+
+    async def flush_xp(self):
+        return sum(await asyncio.gather(*(shard.flush_xp() for shard in self.shards)))
+
+    async def flush_moderation_events(self):
+        return sum(await asyncio.gather(*(shard.flush_moderation_events() for shard in self.shards)))
+
+    async def wait_for_commit(self):
+        await asyncio.gather(*(shard.wait_for_commit() for shard in self.shards))
+
+    def get_stats(self):
+        return {
+            "engine": "sqlite",
+            "partitions": [shard.get_stats() for shard in self.shards],
+        }
+
+    def batch(self):
+        return PartitionedBatch(self)
+
+    async def checkpoint(self, mode="PASSIVE"):
+        return {
+            "partitions": await asyncio.gather(*(shard.checkpoint(mode) for shard in self.shards)),
+        }
+
+    async def optimize(self, analyze=False):
+        await asyncio.gather(*(shard.optimize(analyze) for shard in self.shards))
+
+    async def incremental_vacuum(self, pages=500):
+        return sum(await asyncio.gather(*(shard.incremental_vacuum(pages) for shard in self.shards)))
+
+    async def get_db_metrics(self):
+        partitions = await asyncio.gather(*(shard.get_db_metrics() for shard in self.shards))
+        metrics = {
+            key: sum(partition.get(key, 0) for partition in partitions)
+            for key in ("page_count", "freelist_count", "db_bytes", "shm_bytes")
+        }
+        # The maintenance loop compares this to its TRUNCATE threshold, which
+        # is about how large any single -wal file has grown.
+        metrics["wal_bytes"] = max(partition.get("wal_bytes", 0) for partition in partitions)
+        metrics["partitions"] = partitions
+        return metrics
+
+    async def add_warning(self, guild_id, user_id):
+        return await self._shard(guild_id).add_warning(guild_id, user_id)
+
+    async def get_warnings(self, guild_id, user_id):
+        return await self._shard(guild_id).get_warnings(guild_id, user_id)
+
+    async def reset_warnings(self, guild_id, user_id):
+        await self._shard(guild_id).reset_warnings(guild_id, user_id)
+
+    async def reset_warnings_bulk(self, guild_id, user_ids):
+        return await self._shard(guild_id).reset_warnings_bulk(guild_id, user_ids)
+
+    async def get_member_stats(self, guild_id, user_ids):
+        return await self._shard(guild_id).get_member_stats(guild_id, user_ids)
+
+    async def get_automod_settings(self, guild_id):
+        return await self._shard(guild_id).get_automod_settings(guild_id)
+
+    def invalidate_automod_settings(self, guild_id):
+        self._shard(guild_id).invalidate_automod_settings(guild_id)
+
+    async def set_automod_settings(
+        self,
+        guild_id,
+        profanity_filter,
+        limit,
+        punishment,
+        xp_cooldown=None,
+        blocked_words=None,
+        allowed_words=None,
+        spam_settings=None,
+    ):
+        await self._shard(guild_id).set_automod_settings(
+            guild_id,
+            profanity_filter,
+            limit,
+            punishment,
+            xp_cooldown,
+            blocked_words,
+            allowed_words,
+            spam_settings,
+        )
+
+    async def log_moderation_event(
+        self,
+        guild_id,
+        action,
+        user_id=None,
+        moderator_id=None,
+        reason=None,
+        created_at=None,
+    ):
+        await self._shard(guild_id).log_moderation_event(
+            guild_id, action, user_id, moderator_id, reason, created_at
+        )
+
+    async def get_moderation_stats(self, guild_id, granularity, since, until):
+        return await self._shard(guild_id).get_moderation_stats(guild_id, granularity, since, until)
+
+    # Build plans aren't guild data; the cache key spreads them over the
+    # partitions just as a guild id would.
+    async def get_build_plan(self, cache_key, now):
+        return await self._shard(cache_key).get_build_plan(cache_key, now)
+
+    async def set_build_plan(self, cache_key, plan_json, expires_at):
+        await self._shard(cache_key).set_build_plan(cache_key, plan_json, expires_at)
+
+    async def prune_build_plans(self, now):
+        return sum(await asyncio.gather(*(shard.prune_build_plans(now) for shard in self.shards)))
+
+    async def add_xp(self, guild_id, user_id, xp_to_add):
+        return await self._shard(guild_id).add_xp(guild_id, user_id, xp_to_add)
+
+    async def get_xp_and_level(self, guild_id, user_id):
+        return await self._shard(guild_id).get_xp_and_level(guild_id, user_id)
+
+    async def get_rank(self, guild_id, user_id):
+        return await self._shard(guild_id).get_rank(guild_id, user_id)
+
+    async def get_leaderboard(self, guild_id, limit=10, after=None):
+        return await self._shard(guild_id).get_leaderboard(guild_id, limit, after)
+
+    async def set_afk(self, guild_id, user_id, message):
+        await self._shard(guild_id).set_afk(guild_id, user_id, message)
+
+    async def remove_afk(self, guild_id, user_id):
+        await self._shard(guild_id).remove_afk(guild_id, user_id)
+
+    async def get_afk_user(self, guild_id, user_id):
+        return await self._shard(guild_id).get_afk_user(guild_id, user_id)
+
+    async def get_afk_users(self, guild_id, user_ids):
+        return await self._shard(guild_id).get_afk_users(guild_id, user_ids)
+
+    async def get_message_context(self, guild_id, user_ids):
+        return await self._shard(guild_id).get_message_context(guild_id, user_ids)
+
+    async def add_reaction_role(self, message_id, guild_id, channel_id, emoji, role_id):
+        await self._shard(guild_id).add_reaction_role(message_id, guild_id, channel_id, emoji, role_id)
+
+    async def get_reaction_role(self, message_id, emoji):
+        # Only the message id is known here, so ask every partition.
+        for role_id in await asyncio.gather(
+            *(shard.get_reaction_role(message_id, emoji) for shard in self.shards)
+        ):
+            if role_id is not None:
+                return role_id
+        return None
+
+    async def get_all_reaction_roles(self):
+        mapping = {}
+        for partition in await asyncio.gather(*(shard.get_all_reaction_roles() for shard in self.shards)):
+            mapping.update(partition)
+        return mapping
+
+    async def add_event(
+        self,
+        guild_id,
+        channel_id,
+        name,
+        description,
+        event_ts,
+        reminder_ts,
+        ping_role_id=None,
+    ):
+        await self._shard(guild_id).add_event(
+            guild_id,
+            channel_id,
+            name,
+            description,
+            event_ts,
+            reminder_ts,
+            ping_role_id,
+        )
+
+    async def get_pending_reminders(self, now_ts):
+        partitions = await asyncio.gather(*(shard.get_pending_reminders(now_ts) for shard in self.shards))
+        return [
+            (event_id * self.partitions + index, *rest)
+            for index, rows in enumerate(partitions)
+            for event_id, *rest in rows
+        ]
+
+    async def mark_reminder_sent(self, event_id):
+        index = event_id % self.partitions
+        await self.shards[index].mark_reminder_sent(event_id // self.partitions)
+
+    def export_guild(self, guild_id, chunk_size=500):
+        return self._shard(guild_id).export_guild(guild_id, chunk_size)
+
+    async def import_guild_records(self, guild_id, records):
+        return await self._shard(guild_id).import_guild_records(guild_id, records)
@@ -0,0 +1,383 @@
+import asyncio
+import json
+from abc import ABC, abstractmethod
+
+# Spam and raid detection limits (see cogs/spam_guard.py). Stored together as
+# one JSON object, since they are always read and edited as a group.
+DEFAULT_SPAM_SETTINGS = {
+    "spamFilter": False,
+    # Messages one member may send within spamWindow seconds.
+    "spamMessageLimit": 6,
+    # Messages a channel may receive within spamWindow seconds before slowmode.
+    "spamChannelLimit": 20,
+    "spamWindow": 5,
+    # Copies of the same message one member may post within 30 seconds.
+    "spamDuplicateLimit": 3,
+    # Joins within raidWindow seconds that count as a raid; 0 turns it off.
+    "raidJoinLimit": 10,
+    "raidWindow": 60,
+}
+
+DEFAULT_AUTOMOD_SETTINGS = {
+    "profanityFilter": True,
+    "warningLimit": 3,
+    "limitAction": "kick",
+    # Seconds between XP grants for one user; 0 grants XP on every message.
+    "xpCooldown": 60,
+    # Words added to / exempted from the profanity list for this guild.
+    "blockedWords": (),
+    "allowedWords": (),
+    **DEFAULT_SPAM_SETTINGS,
+}
+
+
+# Actions recorded in the append-only moderation event log.
+MODERATION_ACTIONS = ("delete", "warning", "timeout", "kick", "ban")
+# Rollup granularities kept for the log, as bucket lengths in seconds (UTC).
+ROLLUP_BUCKETS = {"hour": 3600, "day": 86400}
+
+
+def rollup_counts(events):
+    """Rollup increments for a batch of moderation events.
+
+    events are (guild_id, action, user_id, moderator_id, reason, created_at)
+    tuples; returns {(guild_id, granularity, bucket_start, action): count}.
+    """
+    counts = {}
+    for guild_id, action, _, _, _, created_at in events:
+        for granularity, seconds in ROLLUP_BUCKETS.items():
+            key = (guild_id, granularity, created_at - created_at % seconds, action)
+            counts[key] = counts.get(key, 0) + 1
+    return counts
+
+
+def encode_words(words):
+    """Column value for a custom word list; None stays None (keep current)."""
+    return None if words is None else json.dumps(list(words))
+
+
+def decode_words(value):
+    """Word tuple from a stored column. Unreadable values (e.g. from a
+    hand-edited backup) count as an empty list rather than breaking automod."""
+    if not value:
+        return ()
+    try:
+        words = json.loads(value)
+    except ValueError:
+        return ()
+    if not isinstance(words, list):
+        return ()
+    return tuple(word for word in words if isinstance(word, str))
+
+
+def encode_spam_settings(settings):
+    """Column value for spam settings; None stays None (keep current). Only
+    known keys are stored, so a partial dict updates just those limits."""
+    if settings is None:
+        return None
+    return json.dumps({key: value for key, value in settings.items() if key in DEFAULT_SPAM_SETTINGS})
+
+
+def decode_spam_settings(value):
+    """Full spam settings from a stored column, defaults filling any gaps.
+    Like decode_words, unreadable values fall back to the defaults."""
+    settings = dict(DEFAULT_SPAM_SETTINGS)
+    if not value:
+        return settings
+    try:
+        stored = json.loads(value)
+    except ValueError:
+        return settings
+    if not isinstance(stored, dict):
+        return settings
+    for key, default in DEFAULT_SPAM_SETTINGS.items():
+        if isinstance(stored.get(key), type(default)):
+            settings[key] = stored[key]
+    return settings
+
+
+class SequentialBatch:
+    """Unit of work: queue calls, then run them together with ``run()``.
+
+    Every queued call returns a future that resolves once the batch has run.
+    This fallback simply awaits each call in order; engines with a cheaper way
+    to group work (see PersistentDB.batch) override it. Use it as
+    ``async with db.batch() as batch:`` to run on a clean exit.
+    """
+
+    def __init__(self, db):
+        self.db = db
+        self._calls = []
+
+    def _queue(self, method, *args):
+        future = asyncio.get_running_loop().create_future()
+        self._calls.append((method, args, future))
+        return future
+
+    def add_warning(self, guild_id, user_id):
+        return self._queue(self.db.add_warning, guild_id, user_id)
+
+    def get_warnings(self, guild_id, user_id):
+        return self._queue(self.db.get_warnings, guild_id, user_id)
+
+    def reset_warnings(self, guild_id, user_id):
+        return self._queue(self.db.reset_warnings, guild_id, user_id)
+
+    def get_automod_settings(self, guild_id):
+        return self._queue(self.db.get_automod_settings, guild_id)
+
+    def add_xp(self, guild_id, user_id, xp_to_add):
+        return self._queue(self.db.add_xp, guild_id, user_id, xp_to_add)
+
+    def get_xp_and_level(self, guild_id, user_id):
+        return self._queue(self.db.get_xp_and_level, guild_id, user_id)
+
+    def set_afk(self, guild_id, user_id, message):
+        return self._queue(self.db.set_afk, guild_id, user_id, message)
+
+    def remove_afk(self, guild_id, user_id):
+        return self._queue(self.db.remove_afk, guild_id, user_id)
+
+    async def run(self):
+        calls, self._calls = self._calls, []
+        try:
+            for method, args, future in calls:
+                future.set_result(await method(*args))
+        finally:
+            for _, _, future in calls:
+                future.cancel()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            await self.run()
+        else:
+            self._calls = []
+
+
+class StorageBackend(ABC):
+    """Method set every storage engine exposes to the cogs and the API server.
+
+    Cogs and api_server only ever talk to ``bot.db`` through these methods, so
+    engines can be swapped with DB_ENGINE without touching callers.
+    """
+
+    @abstractmethod
+    async def connect(self):
+        ...
+
+    @abstractmethod
+    async def close(self):
+        ...
+
+    async def flush_xp(self):
+        return 0
+
+    async def flush_moderation_events(self):
+        return 0
+
+    async def wait_for_commit(self):
+        return None
+
+    def get_stats(self):
+        return {}
+
+    def batch(self):
+        return SequentialBatch(self)
+
+    async def checkpoint(self, mode="PASSIVE"):
+        return None
+
+    async def optimize(self, analyze=False):
+        return None
+
+    async def incremental_vacuum(self, pages=500):
+        return 0
+
+    async def get_db_metrics(self):
+        return {}
+
+    @abstractmethod
+    async def add_warning(self, guild_id, user_id):
+        ...
+
+    @abstractmethod
+    async def get_warnings(self, guild_id, user_id):
+        ...
+
+    @abstractmethod
+    async def reset_warnings(self, guild_id, user_id):
+        ...
+
+    @abstractmethod
+    async def reset_warnings_bulk(self, guild_id, user_ids):
+        """Clear the warnings of every user in user_ids in one statement.
+        Returns how many of them had warnings."""
+
+    @abstractmethod
+    async def get_member_stats(self, guild_id, user_ids):
+        """``{user_id: (warnings, xp, level)}`` for every id in user_ids, with
+        zeros for users who have no rows, fetched in a single query."""
+
+    @abstractmethod
+    async def get_automod_settings(self, guild_id):
+        ...
+
+    def invalidate_automod_settings(self, guild_id):
+        return None
+
+    @abstractmethod
+    async def set_automod_settings(
+        self,
+        guild_id,
+        profanity_filter,
+        limit,
+        punishment,
+        xp_cooldown=None,
+        blocked_words=None,
+        allowed_words=None,
+        spam_settings=None,
+    ):
+        """Store a guild's automod settings. xp_cooldown, blocked_words,
+        allowed_words and spam_settings left as None keep their current
+        values; spam_settings may hold only the limits being changed."""
+
+    @abstractmethod
+    async def log_moderation_event(
+        self,
+        guild_id,
+        action,
+        user_id=None,
+        moderator_id=None,
+        reason=None,
+        created_at=None,
+    ):
+        """Append an event to the moderation log and count it in the hourly
+        and daily rollups. created_at defaults to now (Unix seconds).
+        Engines may buffer events and write them in batches."""
+
+    @abstractmethod
+    async def get_moderation_stats(self, guild_id, granularity, since, until):
+        """Rolled-up event counts for since <= bucket start < until, as
+        [(bucket_start, action, count)] ordered by bucket. Reads only the
+        rollups, never the raw events."""
+
+    @abstractmethod
+    async def get_build_plan(self, cache_key, now):
+        """Cached build plan as ``(plan_json, expires_at)``, or None if there
+        is none or it expired before now (Unix seconds)."""
+
+    @abstractmethod
+    async def set_build_plan(self, cache_key, plan_json, expires_at):
+        ...
+
+    @abstractmethod
+    async def prune_build_plans(self, now):
+        """Delete cached build plans that expired before now; returns how many."""
+
+    @abstractmethod
+    async def add_xp(self, guild_id, user_id, xp_to_add):
+        ...
+
+    @abstractmethod
+    async def get_xp_and_level(self, guild_id, user_id):
+        ...
+
+    @abstractmethod
+    async def get_rank(self, guild_id, user_id):
+        ...
+
+    @abstractmethod
+    async def get_leaderboard(self, guild_id, limit=10, after=None):
+        ...
+
+    @abstractmethod
+    async def set_afk(self, guild_id, user_id, message):
+        ...
+
+    @abstractmethod
+    async def remove_afk(self, guild_id, user_id):
+        ...
+
+    @abstractmethod
+    async def get_afk_user(self, guild_id, user_id):
+        ...
+
+    @abstractmethod
+    async def get_afk_users(self, guild_id, user_ids):
+        ...
+
+    async def get_message_context(self, guild_id, user_ids):
+        """Everything the message pipeline needs up front, in one call.
+
+        Returns ``(automod_settings, {user_id: afk_message})``.
+        """
+        return await self.get_automod_settings(guild_id), await self.get_afk_users(guild_id, user_ids)
+
+    @abstractmethod
+    async def add_reaction_role(self, message_id, guild_id, channel_id, emoji, role_id):
+        ...
+
+    @abstractmethod
+    async def get_reaction_role(self, message_id, emoji):
+        ...
+
+    @abstractmethod
+    async def get_all_reaction_roles(self):
+        ...
+
+    @abstractmethod
+    async def add_event(
+        self,
+        guild_id,
+        channel_id,
+        name,
+        description,
+        event_ts,
+        reminder_ts,
+        ping_role_id=None,
+    ):
+        ...
+
+    @abstractmethod
+    async def get_pending_reminders(self, now_ts):
+        ...
+
+    @abstractmethod
+    async def mark_reminder_sent(self, event_id):
+        ...
+
+    @abstractmethod
+    def export_guild(self, guild_id, chunk_size=500):
+        """Async generator yielding one guild's rows as lists of backup records.
+
+        Records are ``{"table": name, **columns}`` dicts in utils.guild_backup
+        table order, without guild_id, so they can be imported into any guild.
+        """
+
+    @abstractmethod
+    async def import_guild_records(self, guild_id, records):
+        """Upsert one batch of backup records into guild_id.
+
+        Returns ``{table: rows}``. Re-importing the same records is harmless.
+        """
+
+    async def import_guild(self, guild_id, records, batch_size=500):
+        """Import an async iterable of backup records in batches."""
+        counts = {}
+        batch = []
+
+        async def import_batch():
+            for table, rows in (await self.import_guild_records(guild_id, batch)).items():
+                counts[table] = counts.get(table, 0) + rows
+            batch.clear()
+
+        async for record in records:
+            batch.append(record)
+            if len(batch) >= batch_size:
+                await import_batch()
+        if batch:
+            await import_batch()
+        return counts
@@ -0,0 +1,5 @@
+import sys
+from pathlib import Path
+
+# The bot runs from the repository root, which is where its modules live.
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
@@ -0,0 +1,40 @@
+import asyncio
+
+from database import PersistentDB
+
+
+def _run(scenario, tmp_path, **kwargs):
+    async def main():
+        db = PersistentDB(str(tmp_path / "bot_data.db"), **kwargs)
+        await db.connect()
+        try:
+            await scenario(db)
+        finally:
+            await db.close()
+
+    asyncio.run(main())
+
+
+def test_wait_for_commit_waits_for_in_flight_commit(tmp_path):
+    async def scenario(db):
+        commit = db.conn.commit
+        committing = asyncio.Event()
+
+        async def slow_commit():
+            committing.set()
+            await asyncio.sleep(0.05)
+            await commit()
+
+        db.conn.commit = slow_commit
+        assert await db.add_warning(1, 2) == 1
+        await committing.wait()
+        # The window has closed but its COMMIT hasn't landed yet.
+        assert db._pending_commit is None
+
+        await db.wait_for_commit()
+        reader = db._readers[0]
+        rows = await reader.execute_fetchall("SELECT count FROM warnings WHERE guild_id=1 AND user_id=2")
+        assert rows == [(1,)]
+        db.conn.commit = commit
+
+    _run(scenario, tmp_path, group_commit_window=0.01, xp_flush_interval=0)
@@ -0,0 +1,71 @@
+import asyncio
+
+import pytest
+
+from database import PersistentDB
+from memory_db import MemoryDB
+from utils.guild_backup import BackupSpool, check_record
+
+
+@pytest.mark.parametrize(
+    "record",
+    [
+        {"table": "user_data", "user_id": 1, "xp": "abc", "level": 0},
+        {"table": "user_data", "user_id": 1, "xp": 10, "level": True},
+        {"table": "user_data", "user_id": 1, "xp": None},
+        {"table": "warnings", "user_id": "1", "count": 2},
+        {"table": "automod_settings", "warning_limit": "3"},
+        {"table": "automod_settings", "xp_cooldown": 1.5},
+        {"table": "automod_settings", "profanity_filter_enabled": 2},
+        {"table": "afk_users", "user_id": 1, "message": 5},
+    ],
+)
+def test_check_record_rejects_wrong_types(record):
+    with pytest.raises(ValueError):
+        check_record(record)
+
+
+def test_check_record_accepts_exported_values():
+    check_record({"table": "automod_settings", "profanity_filter_enabled": 1, "warning_limit": 3, "xp_cooldown": None})
+    check_record({"table": "afk_users", "user_id": 1, "message": None})
+    check_record(
+        {
+            "table": "scheduled_events",
+            "channel_id": 1,
+            "event_name": "x",
+            "event_time": 5,
+            "reminder_time": 4,
+            "reminder_sent": False,
+            "ping_role_id": None,
+        }
+    )
+
+
+@pytest.mark.parametrize("engine", ["sqlite", "memory"])
+def test_malformed_backup_is_rejected_before_any_write(tmp_path, engine):
+    lines = [
+        b'{"format":"guild-backup","version":1,"guild_id":9}\n',
+        b'{"table":"user_data","user_id":1,"xp":50,"level":1}\n',
+        b'{"table":"user_data","user_id":2,"xp":"abc","level":0}\n',
+    ]
+
+    async def scenario():
+        db = PersistentDB(str(tmp_path / "bot_data.db")) if engine == "sqlite" else MemoryDB()
+        await db.connect()
+        try:
+            with BackupSpool() as spool:
+                with pytest.raises(ValueError, match="line 3"):
+                    for line in lines:
+                        spool.add(line)
+            assert await db.get_xp_and_level(1, 1) == (0, 0)
+
+            with BackupSpool() as spool:
+                for line in lines[:2]:
+                    spool.add(line)
+                assert await db.import_guild(1, spool) == {"user_data": 1}
+            assert await db.get_xp_and_level(1, 1) == (50, 1)
+            assert await db.get_rank(1, 1) == (1, 1)
+        finally:
+            await db.close()
+
+    asyncio.run(scenario())
@@ -0,0 +1,65 @@
+import asyncio
+import types
+
+import cogs.spam_guard as spam_guard
+from storage import DEFAULT_SPAM_SETTINGS
+from utils.spam_detector import FLOOD, SpamDetector
+
+SETTINGS = {**DEFAULT_SPAM_SETTINGS, "spamFilter": True, "spamMessageLimit": 4}
+
+
+def test_flood_verdict_keeps_each_message_channel():
+    detector = SpamDetector()
+    verdicts = [
+        detector.check_message(1, 10 + i % 2, 7, 100 + i, f"message {i}", SETTINGS, now=i * 0.1)
+        for i in range(4)
+    ]
+    assert verdicts[:3] == [None, None, None]
+    assert verdicts[3].reason == FLOOD
+    assert verdicts[3].messages == [(10, 100), (11, 101), (10, 102), (11, 103)]
+
+
+class _Channel:
+    slowmode_delay = 0
+
+    def __init__(self, channel_id):
+        self.id = channel_id
+        self.deleted = []
+
+    async def delete_messages(self, messages, reason=None):
+        self.deleted.extend(message.id for message in messages)
+
+
+class _DB:
+    def __init__(self):
+        self.events = []
+
+    async def log_moderation_event(self, guild_id, action, user_id=None, **kwargs):
+        self.events.append((guild_id, action, user_id))
+
+
+def test_cross_channel_flood_is_deleted_in_every_channel(monkeypatch):
+    monkeypatch.setattr(spam_guard, "DELETE_BATCH_DELAY", 0)
+
+    async def scenario():
+        channels = {10: _Channel(10), 11: _Channel(11)}
+        guild = types.SimpleNamespace(id=1, get_channel_or_thread=channels.get)
+        author = types.SimpleNamespace(id=7, guild_permissions=types.SimpleNamespace(administrator=False))
+        db = _DB()
+        cog = spam_guard.SpamGuard(types.SimpleNamespace(db=db))
+        cog._punish = lambda message, reason: asyncio.sleep(0)
+
+        flagged = []
+        for i in range(4):
+            message = types.SimpleNamespace(
+                id=100 + i, guild=guild, channel=channels[10 + i % 2], author=author, content=f"message {i}"
+            )
+            flagged.append(await cog.check_message_for_spam(types.SimpleNamespace(message=message, settings=SETTINGS)))
+        await asyncio.sleep(0.01)
+
+        assert flagged == [False, False, False, True]
+        assert channels[10].deleted == [100, 102]
+        assert channels[11].deleted == [101, 103]
+        assert db.events == [(1, "delete", 7)] * 4
+
+    asyncio.run(scenario())
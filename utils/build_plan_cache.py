@@ -0,0 +1,140 @@
+import asyncio
+import hashlib
+import json
+import logging
+import time
+
+from cachetools import TLRUCache
+
+from utils.metrics import MetricsRegistry
+
+log = logging.getLogger(__name__)
+
+
+def normalize_theme(text):
+    """Theme or variation hint as used for cache keys: case and whitespace
+    differences ("Gaming  Community" vs "gaming community") don't matter."""
+    return " ".join(text.lower().split())
+
+
+def plan_cache_key(model_name, prompt):
+    """Content address of a build plan: the model and the exact prompt it was
+    generated from, so editing the prompt template or switching models never
+    serves plans made for the old one."""
+    return hashlib.sha256(f"{model_name}\0{prompt}".encode()).hexdigest()
+
+
+class BuildPlanCache:
+    """Generated server build plans, in memory and in the database.
+
+    Lookups try an in-process LRU first, then the storage backend's
+    build_plan_cache table, which survives restarts and is shared by every
+    caller of the same database. Entries expire ttl seconds after they were
+    generated in both tiers. Concurrent requests for the same key share one
+    generation instead of each calling the model.
+
+    Plans are kept as JSON text and parsed on every hit, so callers get their
+    own copy to modify. Storage errors are logged and treated as misses; the
+    cache never stops a plan from being generated.
+    """
+
+    def __init__(self, db, max_entries=256, ttl=7 * 24 * 3600):
+        self.db = db
+        self.ttl = ttl
+        # value is (expires_at, plan_json); TLRUCache drops it at expires_at.
+        self._plans = TLRUCache(max_entries, ttu=lambda _key, value, _now: value[0], timer=time.time)
+        self._inflight = {}
+        self._stats = {"memory_hits": 0, "db_hits": 0, "misses": 0, "bypassed": 0, "shared": 0, "errors": 0}
+        self._saved_seconds = 0.0
+        self.metrics = MetricsRegistry()
+        self._generate_timing = self.metrics.get("generate")
+        self._hit_timing = self.metrics.get("hit")
+
+    async def get_or_generate(self, key, generate, bypass=False):
+        """Cached plan for key, or the result of ``await generate()``, which
+        is then cached. With bypass, always generates and caches nothing."""
+        if bypass or self.ttl <= 0:
+            self._stats["bypassed"] += 1
+            return await self._generate(generate)
+
+        started = time.perf_counter()
+        plan_json = await self._lookup(key)
+        if plan_json is not None:
+            elapsed = time.perf_counter() - started
+            self._hit_timing.record(elapsed)
+            if self._generate_timing.count:
+                # Estimated from the mean time a generation has taken so far.
+                mean = self._generate_timing.total / self._generate_timing.count
+                self._saved_seconds += max(0.0, mean - elapsed)
+            return json.loads(plan_json)
+
+        pending = self._inflight.get(key)
+        if pending is not None:
+            self._stats["shared"] += 1
+            return json.loads(await asyncio.shield(pending))
+
+        self._stats["misses"] += 1
+        pending = self._inflight[key] = asyncio.get_running_loop().create_future()
+        try:
+            plan = await self._generate(generate)
+            plan_json = json.dumps(plan)
+            await self._store(key, plan_json)
+        except Exception as e:
+            pending.set_exception(e)
+            # Waiters get the exception; don't warn if there were none.
+            pending.exception()
+            raise
+        except BaseException:
+            pending.cancel()
+            raise
+        else:
+            pending.set_result(plan_json)
+        finally:
+            del self._inflight[key]
+        return plan
+
+    async def _generate(self, generate):
+        started = time.perf_counter()
+        plan = await generate()
+        self._generate_timing.record(time.perf_counter() - started)
+        return plan
+
+    async def _lookup(self, key):
+        entry = self._plans.get(key)
+        if entry is not None:
+            self._stats["memory_hits"] += 1
+            return entry[1]
+        try:
+            row = await self.db.get_build_plan(key, time.time())
+        except Exception as e:
+            self._stats["errors"] += 1
+            log.warning("Build plan cache lookup failed: %s", e)
+            return None
+        if row is None:
+            return None
+        plan_json, expires_at = row
+        self._plans[key] = (expires_at, plan_json)
+        self._stats["db_hits"] += 1
+        return plan_json
+
+    async def _store(self, key, plan_json):
+        expires_at = time.time() + self.ttl
+        self._plans[key] = (expires_at, plan_json)
+        try:
+            await self.db.set_build_plan(key, plan_json, expires_at)
+        except Exception as e:
+            self._stats["errors"] += 1
+            log.warning("Could not persist cached build plan: %s", e)
+
+    def get_stats(self):
+        hits = self._stats["memory_hits"] + self._stats["db_hits"]
+        lookups = hits + self._stats["misses"] + self._stats["shared"]
+        return {
+            **self._stats,
+            "cached": len(self._plans),
+            "max_entries": self._plans.maxsize,
+            "ttl_seconds": self.ttl,
+            "hit_rate": round(hits / lookups, 3) if lookups else 0.0,
+            "saved_seconds": round(self._saved_seconds, 3),
+            "timings": self.metrics.snapshot(),
+        }
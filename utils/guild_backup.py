@@ -0,0 +1,198 @@
+import json
+import tempfile
+import time
+
+BACKUP_FORMAT = "guild-backup"
+BACKUP_VERSION = 1
+
+# Export order. Parents come before children so an import can stream rows
+# straight into the database without buffering.
+BACKUP_TABLES = (
+    "automod_settings",
+    "warnings",
+    "user_data",
+    "afk_users",
+    "reaction_roles",
+    "reaction_role_mappings",
+    "scheduled_events",
+)
+
+# Columns a record can't be imported without (guild_id is always the target's).
+REQUIRED_COLUMNS = {
+    "automod_settings": (),
+    "warnings": ("user_id",),
+    "user_data": ("user_id",),
+    "afk_users": ("user_id",),
+    "reaction_roles": ("message_id", "channel_id"),
+    "reaction_role_mappings": ("message_id", "emoji", "role_id"),
+    "scheduled_events": ("channel_id", "event_name", "event_time", "reminder_time"),
+}
+
+
+# Value types, so a bad backup is rejected up front instead of breaking rank
+# lookups or the message pipeline once imported. Ids, counters, limits and
+# timestamps must be integers (not JSON booleans); flags take 0/1 or a bool.
+INTEGER_COLUMNS = frozenset(
+    (
+        "user_id",
+        "message_id",
+        "channel_id",
+        "role_id",
+        "ping_role_id",
+        "count",
+        "xp",
+        "level",
+        "warning_limit",
+        "xp_cooldown",
+        "event_time",
+        "reminder_time",
+    )
+)
+FLAG_COLUMNS = frozenset(("profanity_filter_enabled", "reminder_sent"))
+TEXT_COLUMNS = frozenset(
+    (
+        "punishment_type",
+        "message",
+        "emoji",
+        "event_name",
+        "description",
+        "blocked_words",
+        "allowed_words",
+        "spam_settings",
+    )
+)
+NULLABLE_COLUMNS = frozenset(
+    ("xp_cooldown", "ping_role_id", "message", "description", "blocked_words", "allowed_words", "spam_settings")
+)
+
+
+def backup_header(guild_id):
+    return {
+        "format": BACKUP_FORMAT,
+        "version": BACKUP_VERSION,
+        "guild_id": guild_id,
+        "exported_at": int(time.time()),
+    }
+
+
+def encode_records(records):
+    """Render records as NDJSON, one line per record."""
+    return "".join(json.dumps(record, separators=(",", ":")) + "\n" for record in records)
+
+
+async def iter_ndjson(db, guild_id, chunk_size=500):
+    """Yield one guild's backup as NDJSON text, one chunk of rows at a time."""
+    yield encode_records([backup_header(guild_id)])
+    async for chunk in db.export_guild(guild_id, chunk_size):
+        yield encode_records(chunk)
+
+
+def parse_line(line):
+    """Decode one NDJSON line into a row record.
+
+    Returns None for blank lines and the header. Raises ValueError for
+    anything that isn't a row of a known table or a supported header.
+    """
+    if isinstance(line, bytes):
+        line = line.decode("utf-8")
+    line = line.strip()
+    if not line:
+        return None
+
+    record = json.loads(line)
+    if not isinstance(record, dict):
+        raise ValueError("Backup lines must be JSON objects.")
+    if "format" in record:
+        if record.get("format") != BACKUP_FORMAT or record.get("version") != BACKUP_VERSION:
+            raise ValueError("Unsupported backup format.")
+        return None
+    check_record(record)
+    return record
+
+
+class BackupSpool:
+    """A backup's records, validated and parked in a temporary file.
+
+    Every line is checked as it is added, so an import that starts only once
+    the whole backup is in the spool never applies part of a bad file.
+    Keeping the records on disk keeps memory flat whatever the guild's size.
+    Iterate it (sync or async) to read the records back.
+    """
+
+    def __init__(self):
+        self._file = tempfile.TemporaryFile("w+", encoding="utf-8")
+        self._line_number = 0
+        self.records = 0
+
+    def add(self, line):
+        self._line_number += 1
+        try:
+            record = parse_line(line)
+        except ValueError as e:
+            raise ValueError(f"line {self._line_number}: {e}") from e
+        if record is not None:
+            self._file.write(json.dumps(record, separators=(",", ":")) + "\n")
+            self.records += 1
+
+    def __iter__(self):
+        self._file.seek(0)
+        for line in self._file:
+            yield json.loads(line)
+
+    async def __aiter__(self):
+        for record in self:
+            yield record
+
+    def close(self):
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+async def spool_lines(lines):
+    """Validate an async iterable of NDJSON lines into a BackupSpool.
+
+    Raises ValueError naming the first bad line.
+    """
+    spool = BackupSpool()
+    try:
+        async for line in lines:
+            spool.add(line)
+    except BaseException:
+        spool.close()
+        raise
+    return spool
+
+
+def check_record(record):
+    table = record.get("table")
+    if table not in BACKUP_TABLES:
+        raise ValueError(f"Unknown backup table: {table!r}")
+    missing = [column for column in REQUIRED_COLUMNS[table] if record.get(column) is None]
+    if missing:
+        raise ValueError(f"{table} record is missing {', '.join(missing)}")
+    for column, value in record.items():
+        _check_value(table, column, value)
+
+
+def _check_value(table, column, value):
+    if value is None:
+        if column in INTEGER_COLUMNS | FLAG_COLUMNS | TEXT_COLUMNS and column not in NULLABLE_COLUMNS:
+            raise ValueError(f"{table}.{column} can't be null")
+        return
+
+    if column in INTEGER_COLUMNS:
+        valid, expected = isinstance(value, int) and not isinstance(value, bool), "an integer"
+    elif column in FLAG_COLUMNS:
+        valid, expected = isinstance(value, int) and value in (0, 1), "0, 1 or a boolean"
+    elif column in TEXT_COLUMNS:
+        valid, expected = isinstance(value, str), "a string"
+    else:
+        # Columns the importers ignore, such as id and guild_id.
+        return
+    if not valid:
+        raise ValueError(f"{table}.{column} must be {expected}, not {type(value).__name__}")
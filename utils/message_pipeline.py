@@ -0,0 +1,81 @@
+import time
+from dataclasses import dataclass, field
+
+from utils.metrics import MetricsRegistry
+
+
+# Stage order used by the built-in cogs. Lower runs first.
+SPAM_STAGE = 50
+MODERATION_STAGE = 100
+AI_MENTION_STAGE = 200
+AFK_XP_STAGE = 300
+
+
+@dataclass
+class MessageContext:
+    """Per-message state fetched once and shared by every stage."""
+
+    message: object
+    settings: dict
+    # AFK messages for the author and mentioned users who are AFK.
+    afk_users: dict = field(default_factory=dict)
+
+    @property
+    def guild_id(self):
+        return self.message.guild.id
+
+    @property
+    def author_is_afk(self):
+        return self.message.author.id in self.afk_users
+
+
+class MessagePipeline:
+    """Ordered message stages fed from a single context fetch.
+
+    Cogs register a coroutine ``stage(ctx) -> bool`` in cog_load and remove it
+    in cog_unload. Returning True marks the message as handled and stops the
+    remaining stages and command processing.
+    """
+
+    def __init__(self, db):
+        self.db = db
+        self._stages = []
+        self.metrics = MetricsRegistry()
+        self._context_timing = self.metrics.get("context")
+
+    def register(self, name, stage, order):
+        self.unregister(name)
+        self._stages.append((order, name, stage, self.metrics.get(name)))
+        self._stages.sort(key=lambda entry: entry[:2])
+
+    def unregister(self, name):
+        self._stages = [entry for entry in self._stages if entry[1] != name]
+
+    async def build_context(self, message):
+        user_ids = [message.author.id, *(member.id for member in message.mentions)]
+        settings, afk_users = await self.db.get_message_context(message.guild.id, user_ids)
+        return MessageContext(message, settings, afk_users)
+
+    async def process(self, message):
+        """Run every stage for message; returns True if a stage handled it."""
+        started = time.perf_counter()
+        ctx = await self.build_context(message)
+        self._context_timing.record(time.perf_counter() - started)
+
+        for _, _, stage, histogram in self._stages:
+            started = time.perf_counter()
+            try:
+                handled = await stage(ctx)
+            except Exception:
+                histogram.errors += 1
+                raise
+            histogram.record(time.perf_counter() - started)
+            if handled:
+                return True
+        return False
+
+    def get_stats(self):
+        return {
+            "stages": [name for _, name, _, _ in self._stages],
+            "timings": self.metrics.snapshot(),
+        }
@@ -0,0 +1,75 @@
+import math
+
+# Log-spaced buckets from 10us: each bucket is 2**(1/4) (~19%) wider than the
+# last, so percentiles are accurate to within one bucket and recording a
+# sample is a single log() and list increment.
+_BASE_SECONDS = 1e-5
+_GROWTH = 2 ** 0.25
+_BUCKETS = 112  # covers up to ~2.7 hours
+
+
+def _bucket_upper_bound(index):
+    return _BASE_SECONDS * _GROWTH**index
+
+
+class LatencyHistogram:
+    __slots__ = ("buckets", "count", "total", "max", "rows", "errors", "lock_retries")
+
+    def __init__(self):
+        self.buckets = [0] * _BUCKETS
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.rows = 0
+        self.errors = 0
+        self.lock_retries = 0
+
+    def record(self, seconds, rows=0):
+        if seconds <= _BASE_SECONDS:
+            index = 0
+        else:
+            index = min(_BUCKETS - 1, int(math.log(seconds / _BASE_SECONDS, _GROWTH)) + 1)
+        self.buckets[index] += 1
+        self.count += 1
+        self.total += seconds
+        self.rows += rows
+        if seconds > self.max:
+            self.max = seconds
+
+    def percentile(self, pct):
+        if not self.count:
+            return 0.0
+        target = max(1, math.ceil(self.count * pct / 100))
+        seen = 0
+        for index, bucket_count in enumerate(self.buckets):
+            seen += bucket_count
+            if seen >= target:
+                return min(_bucket_upper_bound(index), self.max)
+        return self.max
+
+    def snapshot(self):
+        return {
+            "count": self.count,
+            "errors": self.errors,
+            "lock_retries": self.lock_retries,
+            "rows": self.rows,
+            "mean_ms": round(self.total / self.count * 1000, 3) if self.count else 0.0,
+            "p50_ms": round(self.percentile(50) * 1000, 3),
+            "p95_ms": round(self.percentile(95) * 1000, 3),
+            "p99_ms": round(self.percentile(99) * 1000, 3),
+            "max_ms": round(self.max * 1000, 3),
+        }
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._histograms = {}
+
+    def get(self, name):
+        histogram = self._histograms.get(name)
+        if histogram is None:
+            histogram = self._histograms[name] = LatencyHistogram()
+        return histogram
+
+    def snapshot(self):
+        return {name: histogram.snapshot() for name, histogram in sorted(self._histograms.items())}
@@ -0,0 +1,243 @@
+import re
+from collections import OrderedDict, deque
+
+from better_profanity import profanity
+from better_profanity.constants import ALLOWED_CHARACTERS
+from better_profanity.utils import get_complete_path_of_file, read_wordlist
+
+# better_profanity replaces each swear word with this, and contains_profanity
+# compares the censored text to the original, so a word that already reads
+# "****" never counts.
+CENSORED_WORD = "****"
+
+
+def default_words():
+    return list(read_wordlist(get_complete_path_of_file("profanity_wordlist.txt")))
+
+
+def _char_class(chars):
+    """Regex character class body matching chars, with runs collapsed to ranges."""
+    points = sorted(ord(char) for char in chars)
+    parts = []
+    start = previous = points[0]
+    for point in points[1:] + [None]:
+        if point is not None and point == previous + 1:
+            previous = point
+            continue
+        if previous - start > 1:
+            parts.append(f"{re.escape(chr(start))}-{re.escape(chr(previous))}")
+        else:
+            parts.extend(re.escape(chr(code)) for code in range(start, previous + 1))
+        if point is not None:
+            start = previous = point
+    return "".join(parts)
+
+
+# Splits text into better_profanity's words, keeping the separators between them.
+_SEPARATOR_RE = re.compile(f"([^{_char_class(ALLOWED_CHARACTERS)}]+)")
+# Same split for ASCII-only text; the much smaller class runs about twice as fast.
+_ASCII_SEPARATOR_RE = re.compile(
+    f"([^{_char_class(char for char in ALLOWED_CHARACTERS if char.isascii())}]+)"
+)
+
+
+def normalize_words(words):
+    """Canonical form of a custom word list: lowercase, stripped, unique and
+    sorted, so equal lists compare (and cache) equal."""
+    return tuple(sorted({word.strip().lower() for word in words} - {""}))
+
+
+def _max_separators(words):
+    # better_profanity's MAX_NUMBER_COMBINATIONS: how many following words it
+    # joins onto each word, which is at least one.
+    return max([1, *(sum(char not in ALLOWED_CHARACTERS for char in word) for word in words)])
+
+
+def _build_automaton(words, char_map):
+    """Compile words into a deterministic automaton over lowercase text.
+
+    Each listed character accepts any of its leetspeak substitutes, so the
+    word trie is non-deterministic ("*" can stand for several letters); the
+    subset construction turns it into one transition dict per state.
+    Returns (transitions, matches), indexed by state; state 0 is the start and
+    matches holds the listed words that end in that state, if any.
+    """
+    edges = [{}]
+    terminal = {}
+    for word in words:
+        node = 0
+        for char in word:
+            options = char_map.get(char, (char,))
+            child = edges[node].get(options)
+            if child is None:
+                child = edges[node][options] = len(edges)
+                edges.append({})
+            node = child
+        terminal[node] = word
+
+    start = frozenset((0,))
+    state_ids = {start: 0}
+    pending = deque([start])
+    transitions = []
+    matches = []
+    while pending:
+        nodes = pending.popleft()
+        moves = {}
+        for node in nodes:
+            for options, child in edges[node].items():
+                for option in options:
+                    moves.setdefault(option, set()).add(child)
+        table = {}
+        for char, targets in moves.items():
+            target = frozenset(targets)
+            if target not in state_ids:
+                state_ids[target] = len(state_ids)
+                pending.append(target)
+            table[char] = state_ids[target]
+        transitions.append(table)
+        matches.append(frozenset(terminal[node] for node in nodes if node in terminal))
+    return transitions, matches
+
+
+class ProfanityMatcher:
+    """Drop-in for better_profanity's contains_profanity, built from the same
+    word list, leetspeak table and word splitting.
+
+    better_profanity compares every word (and every run of up to N following
+    words, joined with and without their separators) against each listed
+    word in turn, expanding leetspeak variants character by character. Here
+    the list is compiled once into a deterministic automaton, so each word is
+    a walk of dict lookups that usually dies within a character or two, and a
+    join continues from where the previous word's walk stopped.
+
+    Passing base reuses that matcher's automaton and compiles only the words
+    it lacks, so per-guild matchers cost little more than their own words.
+    Allowed words never match, like better_profanity's whitelist_words.
+
+    The quirks of better_profanity's scanner are kept on purpose so results
+    match it exactly: a one-character word at the very end of the text is
+    never looked at on its own or joined onto, and when N is 1 only every
+    other word starts a join.
+    """
+
+    def __init__(self, words=None, allowed=(), base=None):
+        words = {word.lower() for word in (default_words() if words is None else words)}
+        allowed = {word.lower() for word in allowed}
+        if base is None:
+            self._listed = frozenset(words)
+            self._allowed = frozenset(allowed)
+            self._automata = []
+        else:
+            self._listed = base._listed | words
+            self._allowed = frozenset((base._allowed - words) | allowed)
+            self._automata = list(base._automata)
+        extra = words - base._listed if base is not None else words
+        if extra:
+            self._automata.append(_build_automaton(extra, profanity.CHARS_MAPPING))
+        effective = self._listed - self._allowed
+        self.word_count = len(effective)
+        self.max_joined_words = _max_separators(effective)
+
+    @property
+    def state_count(self):
+        return sum(len(transitions) for transitions, _ in self._automata)
+
+    def contains_profanity(self, text):
+        """Return True if text contains a listed word."""
+        tokens = (_ASCII_SEPARATOR_RE if text.isascii() else _SEPARATOR_RE).split(text)
+        # split() alternates word, separator, word...; the first and last
+        # words are empty when text starts or ends with a separator.
+        words = tokens[::2]
+        separators = tokens[1::2]
+        first = 1 if words[0] == "" else 0
+        if words[-1] == "":
+            words.pop()
+        if first >= len(words):
+            return False
+        last_joinable = len(words) - 1
+        if len(words[-1]) == 1 and len(words) == len(separators) + 1:
+            # A word that starts on the final character is skipped entirely.
+            if first == last_joinable:
+                return False
+            last_joinable -= 1
+        return any(
+            self._scan(transitions, matches, words, separators, first, last_joinable)
+            for transitions, matches in self._automata
+        )
+
+    def _scan(self, transitions, matches, words, separators, first, last_joinable):
+        allowed = self._allowed
+
+        def walk(state, text):
+            for char in text:
+                state = transitions[state].get(char)
+                if state is None:
+                    return None
+            return state
+
+        def is_match(state):
+            return state is not None and bool(matches[state]) and not matches[state] <= allowed
+
+        # Joins are tried from every word that has a separator after it, except
+        # that with N=1 better_profanity's lookahead list empties itself on
+        # alternate words, so only every other word starts a join.
+        join_step = 2 if self.max_joined_words == 1 else 1
+        for index in range(first, len(words)):
+            word = words[index].lower()
+            state = walk(0, word)
+            if state is None:
+                continue
+
+            if index < len(separators) and (index - first) % join_step == 0:
+                joined = joined_with_separators = state
+                for next_index in range(index + 1, min(index + self.max_joined_words, last_joinable) + 1):
+                    next_word = words[next_index].lower()
+                    if joined is not None:
+                        joined = walk(joined, next_word)
+                    if joined_with_separators is not None:
+                        joined_with_separators = walk(
+                            joined_with_separators, separators[next_index - 1].lower() + next_word
+                        )
+                    if joined is None and joined_with_separators is None:
+                        break
+                    if is_match(joined) or is_match(joined_with_separators):
+                        return True
+
+            if is_match(state) and word != CENSORED_WORD:
+                return True
+        return False
+
+
+class MatcherCache:
+    """LRU of per-guild matchers keyed by (blocked, allowed) word tuples.
+
+    Guilds without custom words all share base. Because the key is the lists
+    themselves, guilds with identical lists share an entry, and editing a
+    list simply misses and compiles a new matcher while the stale one ages out.
+    """
+
+    def __init__(self, base, max_entries=4096):
+        self.base = base
+        self.max_entries = max_entries
+        self._matchers = OrderedDict()
+        self._stats = {"hits": 0, "misses": 0, "evicted": 0}
+
+    def get(self, blocked=(), allowed=()):
+        if not blocked and not allowed:
+            return self.base
+        key = (tuple(blocked), tuple(allowed))
+        matcher = self._matchers.get(key)
+        if matcher is not None:
+            self._matchers.move_to_end(key)
+            self._stats["hits"] += 1
+            return matcher
+
+        self._stats["misses"] += 1
+        matcher = self._matchers[key] = ProfanityMatcher(blocked, allowed, base=self.base)
+        if len(self._matchers) > self.max_entries:
+            self._matchers.popitem(last=False)
+            self._stats["evicted"] += 1
+        return matcher
+
+    def get_stats(self):
+        return {"cached": len(self._matchers), "max_entries": self.max_entries, **self._stats}
@@ -0,0 +1,125 @@
+import asyncio
+import logging
+import multiprocessing
+import time
+from concurrent.futures import BrokenExecutor, ProcessPoolExecutor, ThreadPoolExecutor
+
+from utils.metrics import MetricsRegistry
+from utils.profanity_matcher import MatcherCache, ProfanityMatcher
+
+log = logging.getLogger(__name__)
+
+EXECUTOR_MODES = ("none", "thread", "process")
+
+# Each process-pool worker keeps its own matchers, built on first use.
+_worker_matchers = None
+
+
+def _init_worker():
+    global _worker_matchers
+    _worker_matchers = MatcherCache(ProfanityMatcher())
+
+
+def _scan_in_worker(blocked, allowed, text):
+    started = time.perf_counter()
+    result = _worker_matchers.get(blocked, allowed).contains_profanity(text)
+    return result, time.perf_counter() - started
+
+
+def _timed_scan(matcher, text):
+    started = time.perf_counter()
+    return matcher.contains_profanity(text), time.perf_counter() - started
+
+
+class ProfanityScanner:
+    """Profanity checks that keep long messages off the event loop.
+
+    Messages shorter than threshold characters are scanned inline, where a
+    scan costs less than handing it to another thread. Longer ones go to the
+    executor so a burst of them can't delay heartbeats and other handlers:
+
+    - "thread": a thread pool. Scans still need the GIL, but the interpreter
+      switches back to the loop every few milliseconds instead of once per scan.
+    - "process": a process pool with its own matchers per worker; the loop is
+      never blocked, at the price of pickling each message.
+    - "none": always inline.
+
+    Timings under get_stats(): "inline" and "offloaded" are scan times,
+    "dispatch" is what offloading added on top (queueing, thread handoff or
+    pickling).
+    """
+
+    def __init__(self, mode="thread", threshold=1000, workers=2, max_matchers=4096):
+        if mode not in EXECUTOR_MODES:
+            raise ValueError(f"Unknown profanity executor {mode!r}; expected one of {EXECUTOR_MODES}.")
+        self.mode = mode
+        self.threshold = threshold
+        self.workers = workers
+        self.matchers = MatcherCache(ProfanityMatcher(), max_matchers)
+        self._executor = None
+        self.metrics = MetricsRegistry()
+        self._inline = self.metrics.get("inline")
+        self._offloaded = self.metrics.get("offloaded")
+        self._dispatch = self.metrics.get("dispatch")
+
+    def _get_executor(self):
+        if self._executor is None:
+            if self.mode == "thread":
+                self._executor = ThreadPoolExecutor(self.workers, thread_name_prefix="profanity")
+            else:
+                # spawn, not fork: the bot process has database and API threads.
+                self._executor = ProcessPoolExecutor(
+                    self.workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                    initializer=_init_worker,
+                )
+        return self._executor
+
+    async def contains_profanity(self, text, blocked=(), allowed=()):
+        if self.mode == "none" or len(text) < self.threshold:
+            return self._scan_inline(text, blocked, allowed)
+
+        loop = asyncio.get_running_loop()
+        executor = self._get_executor()
+        started = time.perf_counter()
+        try:
+            if self.mode == "thread":
+                matcher = self.matchers.get(blocked, allowed)
+                result, seconds = await loop.run_in_executor(executor, _timed_scan, matcher, text)
+            else:
+                result, seconds = await loop.run_in_executor(
+                    executor, _scan_in_worker, tuple(blocked), tuple(allowed), text
+                )
+        except BrokenExecutor:
+            # A worker died (e.g. killed for memory). Start a fresh pool next
+            # time and don't lose this check.
+            self._offloaded.errors += 1
+            if self._executor is executor:
+                log.exception("Profanity executor broke; recreating it.")
+                self._executor = None
+                executor.shutdown(wait=False)
+            return self._scan_inline(text, blocked, allowed)
+        self._offloaded.record(seconds)
+        self._dispatch.record(time.perf_counter() - started - seconds)
+        return result
+
+    def _scan_inline(self, text, blocked, allowed):
+        matcher = self.matchers.get(blocked, allowed)
+        started = time.perf_counter()
+        result = matcher.contains_profanity(text)
+        self._inline.record(time.perf_counter() - started)
+        return result
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    def get_stats(self):
+        return {
+            "mode": self.mode,
+            "threshold": self.threshold,
+            "workers": self.workers,
+            "matchers": self.matchers.get_stats(),
+            "timings": self.metrics.snapshot(),
+        }
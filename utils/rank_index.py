@@ -0,0 +1,71 @@
+from cachetools import LRUCache
+from sortedcontainers import SortedList
+
+
+class _GuildRanks:
+    __slots__ = ("keys", "ordered")
+
+    def __init__(self):
+        self.keys = {}
+        self.ordered = SortedList()
+
+    def set(self, user_id, level, xp):
+        key = (-level, -xp, user_id)
+        old_key = self.keys.get(user_id)
+        if old_key == key:
+            return
+        if old_key is not None:
+            self.ordered.remove(old_key)
+        self.keys[user_id] = key
+        self.ordered.add(key)
+
+
+class RankIndex:
+    """Per-guild (level, xp) ordering with O(log n) updates and rank lookups.
+
+    Guilds are loaded lazily and evicted least-recently-used, so memory is
+    bounded by the number of guilds whose ranks are actually being queried.
+    """
+
+    def __init__(self, max_guilds=1000):
+        self._guilds = LRUCache(maxsize=max_guilds)
+
+    def is_loaded(self, guild_id):
+        return guild_id in self._guilds
+
+    def begin_load(self, guild_id):
+        self._guilds[guild_id] = _GuildRanks()
+
+    def fill(self, guild_id, rows):
+        # Rows come from a snapshot taken after begin_load, so anything that
+        # update() already recorded is newer and must win.
+        ranks = self._guilds.get(guild_id)
+        if ranks is None:
+            return
+        for user_id, level, xp in rows:
+            if user_id not in ranks.keys:
+                ranks.set(user_id, level, xp)
+
+    def discard(self, guild_id):
+        self._guilds.pop(guild_id, None)
+
+    def update(self, guild_id, user_id, level, xp):
+        ranks = self._guilds.get(guild_id)
+        if ranks is not None:
+            ranks.set(user_id, level, xp)
+
+    def rank(self, guild_id, user_id):
+        """Return (rank, total) for the user, or (None, total) if they have no XP row."""
+        ranks = self._guilds[guild_id]
+        key = ranks.keys.get(user_id)
+        if key is None:
+            return None, len(ranks.ordered)
+        # A 2-tuple sorts before every 3-tuple sharing its prefix, so this
+        # counts only users strictly ahead; ties share a rank.
+        return ranks.ordered.bisect_left(key[:2]) + 1, len(ranks.ordered)
+
+    def stats(self):
+        return {
+            "guilds": len(self._guilds),
+            "users": sum(len(ranks.keys) for ranks in self._guilds.values()),
+        }
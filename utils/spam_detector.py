@@ -0,0 +1,191 @@
+import time
+from collections import OrderedDict, deque
+from dataclasses import dataclass, field
+
+# Repeats of the same message by one user are counted over this many seconds,
+# longer than the rate window since copy-paste spam is often paced.
+DUPLICATE_WINDOW = 30
+# Per-key event history caps, so one key can't grow without bound even if a
+# guild sets huge limits.
+MAX_USER_EVENTS = 100
+MAX_CHANNEL_EVENTS = 500
+MAX_JOIN_EVENTS = 1000
+
+FLOOD = "flood"
+DUPLICATE = "duplicate"
+CHANNEL_FLOOD = "channel_flood"
+
+
+def content_hash(content):
+    """Hash of a message with case and whitespace differences folded away."""
+    return hash(" ".join(content.lower().split()))
+
+
+@dataclass
+class SpamVerdict:
+    reason: str
+    # (channel_id, message_id) pairs to delete: everything in the window that
+    # made up the spam, which may span several channels.
+    messages: list = field(default_factory=list)
+    # True for the message that started an episode; later messages in the
+    # same episode are only deleted, not punished again.
+    new_episode: bool = True
+
+
+class _UserWindow:
+    __slots__ = ("events", "penalized_until", "reason", "last_seen")
+
+    def __init__(self):
+        # (timestamp, channel_id, message_id, content hash or None)
+        self.events = deque(maxlen=MAX_USER_EVENTS)
+        self.penalized_until = 0.0
+        self.reason = None
+        self.last_seen = 0.0
+
+
+class _BoundedWindows:
+    """OrderedDict of per-key state, least recently touched first.
+
+    Keys idle for longer than max_age are dropped from the front as new
+    events arrive, and once max_entries is reached the least recently
+    touched key is evicted, so memory stays bounded under a flood of new
+    users or channels.
+    """
+
+    def __init__(self, factory, max_entries, max_age):
+        self.factory = factory
+        self.max_entries = max_entries
+        self.max_age = max_age
+        self.entries = OrderedDict()
+        self.evicted = 0
+
+    def touch(self, key, now):
+        entry = self.entries.get(key)
+        if entry is None:
+            entry = self.entries[key] = self.factory()
+        else:
+            self.entries.move_to_end(key)
+        entry.last_seen = now
+        self._prune(now)
+        return entry
+
+    def _prune(self, now):
+        entries = self.entries
+        while entries:
+            key, entry = next(iter(entries.items()))
+            if now - entry.last_seen < self.max_age and len(entries) <= self.max_entries:
+                break
+            del entries[key]
+            if now - entry.last_seen < self.max_age:
+                self.evicted += 1
+
+
+class _EventWindow:
+    __slots__ = ("events", "last_seen", "flagged_until")
+
+    def __init__(self, maxlen):
+        self.events = deque(maxlen=maxlen)
+        self.last_seen = 0.0
+        self.flagged_until = 0.0
+
+
+def _expire(events, cutoff):
+    while events and events[0][0] <= cutoff:
+        events.popleft()
+
+
+class SpamDetector:
+    """Sliding-window spam and raid detection, all in memory.
+
+    Tracks per-user messages (rate and repeated content), per-channel message
+    rate and per-guild join rate. Limits come from each guild's automod
+    settings on every call, so changes apply immediately. State is bounded
+    by max_users/max_channels/max_guilds and by the event caps above; idle
+    keys expire once they are older than any window could look back.
+
+    The detector only decides; acting on a verdict (deleting, timeouts,
+    slowmode, kicks) is up to the caller.
+    """
+
+    def __init__(self, max_users=50_000, max_channels=10_000, max_guilds=10_000, max_window=300):
+        self.max_window = max_window
+        max_age = max(max_window, DUPLICATE_WINDOW)
+        self._users = _BoundedWindows(_UserWindow, max_users, max_age)
+        self._channels = _BoundedWindows(lambda: _EventWindow(MAX_CHANNEL_EVENTS), max_channels, max_age)
+        self._joins = _BoundedWindows(lambda: _EventWindow(MAX_JOIN_EVENTS), max_guilds, max_age)
+        self._stats = {FLOOD: 0, DUPLICATE: 0, CHANNEL_FLOOD: 0, "raids": 0, "messages": 0, "joins": 0}
+
+    def check_message(self, guild_id, channel_id, user_id, message_id, content, settings, now=None):
+        """Record a message; returns a SpamVerdict if it is spam, else None."""
+        now = time.monotonic() if now is None else now
+        self._stats["messages"] += 1
+        window = min(settings["spamWindow"], self.max_window)
+        digest = content_hash(content) if content.strip() else None
+
+        user = self._users.touch((guild_id, user_id), now)
+        events = user.events
+        _expire(events, now - max(window, DUPLICATE_WINDOW))
+        events.append((now, channel_id, message_id, digest))
+
+        if now < user.penalized_until:
+            # Still inside an episode: keep deleting, and keep it going.
+            user.penalized_until = now + window
+            return SpamVerdict(user.reason, [(channel_id, message_id)], new_episode=False)
+
+        recent = [event for event in events if event[0] > now - window]
+        if len(recent) >= settings["spamMessageLimit"]:
+            return self._flag_user(user, FLOOD, recent, now, window)
+
+        if digest is not None:
+            repeats = [event for event in events if event[3] == digest]
+            if len(repeats) >= settings["spamDuplicateLimit"]:
+                return self._flag_user(user, DUPLICATE, repeats, now, window)
+
+        channel = self._channels.touch((guild_id, channel_id), now)
+        _expire(channel.events, now - window)
+        channel.events.append((now,))
+        if len(channel.events) >= settings["spamChannelLimit"] and now >= channel.flagged_until:
+            channel.flagged_until = now + window
+            self._stats[CHANNEL_FLOOD] += 1
+            return SpamVerdict(CHANNEL_FLOOD)
+        return None
+
+    def _flag_user(self, user, reason, events, now, window):
+        user.penalized_until = now + window
+        user.reason = reason
+        self._stats[reason] += 1
+        messages = [(channel_id, message_id) for _, channel_id, message_id, _ in events]
+        # Each message is only ever handed out for deletion once.
+        user.events.clear()
+        return SpamVerdict(reason, messages)
+
+    def record_join(self, guild_id, member_id, settings, now=None):
+        """Record a member join. Returns (member_ids, new_raid): the joins to
+        treat as part of a raid (all those in the window when a raid starts,
+        then each further join until it calms down), and whether this join
+        started it. member_ids is empty when there is no raid."""
+        now = time.monotonic() if now is None else now
+        self._stats["joins"] += 1
+        limit = settings["raidJoinLimit"]
+        window = min(settings["raidWindow"], self.max_window)
+        joins = self._joins.touch(guild_id, now)
+        _expire(joins.events, now - window)
+        joins.events.append((now, member_id))
+
+        if now < joins.flagged_until:
+            joins.flagged_until = now + window
+            return [member_id], False
+        if limit > 0 and len(joins.events) >= limit:
+            joins.flagged_until = now + window
+            self._stats["raids"] += 1
+            return [member_id for _, member_id in joins.events], True
+        return [], False
+
+    def get_stats(self):
+        return {
+            "users": len(self._users.entries),
+            "channels": len(self._channels.entries),
+            "guilds": len(self._joins.entries),
+            "evicted": self._users.evicted + self._channels.evicted + self._joins.evicted,
+            **self._stats,
+        }
@@ -0,0 +1,104 @@
+import asyncio
+import logging
+
+log = logging.getLogger(__name__)
+
+
+class WorkQueue:
+    """Bounded queue of fire-and-forget jobs served by a fixed worker pool.
+
+    Jobs are zero-argument callables returning a coroutine. Nothing here ever
+    waits for space: when the queue is full a new job is dropped and counted,
+    so overload sheds work instead of growing memory or stalling callers.
+
+    submit_coalesced() folds work for a key into the job already queued for
+    it, e.g. several XP grants for one user become a single grant. A job
+    stops accepting merges once a worker picks it up.
+    """
+
+    def __init__(self, maxsize=1000, workers=2):
+        self.maxsize = maxsize
+        self.workers = workers
+        self._queue = asyncio.Queue(maxsize)
+        self._pending = {}
+        self._tasks = []
+        self._stats = {
+            "enqueued": 0,
+            "processed": 0,
+            "coalesced": 0,
+            "dropped": 0,
+            "failed": 0,
+        }
+
+    def start(self):
+        if not self._tasks:
+            self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def stop(self, timeout=10.0):
+        """Let queued jobs finish (up to timeout), then stop the workers."""
+        if self._tasks:
+            try:
+                await asyncio.wait_for(self._queue.join(), timeout)
+            except asyncio.TimeoutError:
+                log.warning("Work queue stopped with %s job(s) unfinished.", self._queue.qsize())
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def _worker(self):
+        while True:
+            job = await self._queue.get()
+            try:
+                await job()
+                self._stats["processed"] += 1
+            except Exception:
+                self._stats["failed"] += 1
+                log.exception("Background job failed.")
+            finally:
+                self._queue.task_done()
+
+    def _put(self, job):
+        try:
+            self._queue.put_nowait(job)
+        except asyncio.QueueFull:
+            self._stats["dropped"] += 1
+            return False
+        self._stats["enqueued"] += 1
+        return True
+
+    def submit(self, fn, *args):
+        """Queue fn(*args); returns False if it was dropped."""
+        return self._put(lambda: fn(*args))
+
+    def submit_coalesced(self, key, fn, value, merge):
+        """Queue fn(value), or merge value into the job already queued for key.
+
+        merge(pending, value) returns the combined value. Returns False if the
+        work was dropped.
+        """
+        pending = self._pending.get(key)
+        if pending is not None:
+            pending[0] = merge(pending[0], value)
+            self._stats["coalesced"] += 1
+            return True
+
+        pending = [value]
+
+        async def job():
+            del self._pending[key]
+            await fn(pending[0])
+
+        if not self._put(job):
+            return False
+        self._pending[key] = pending
+        return True
+
+    def get_stats(self):
+        return {
+            "depth": self._queue.qsize(),
+            "maxsize": self.maxsize,
+            "workers": len(self._tasks),
+            "pending_keys": len(self._pending),
+            **self._stats,
+        }
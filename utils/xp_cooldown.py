@@ -0,0 +1,50 @@
+import time
+from collections import OrderedDict
+
+
+class XpCooldowns:
+    """Last XP grant time per (guild_id, user_id), bounded in size and age.
+
+    Entries are kept in grant order, so the oldest is always at the front:
+    expired ones are pruned from there as new grants arrive, and once
+    max_entries is reached the oldest grant is evicted. An evicted user can
+    earn XP again early, which only ever errs in their favour.
+    """
+
+    def __init__(self, max_entries=100_000, max_cooldown=3600):
+        self.max_entries = max_entries
+        self.max_cooldown = max_cooldown
+        self._last_grant = OrderedDict()
+        self._stats = {"granted": 0, "skipped": 0, "evicted": 0}
+
+    def try_grant(self, guild_id, user_id, cooldown, now=None):
+        """Record a grant and return True, or False if still cooling down."""
+        if cooldown <= 0:
+            self._stats["granted"] += 1
+            return True
+
+        now = time.monotonic() if now is None else now
+        key = (guild_id, user_id)
+        last = self._last_grant.get(key)
+        if last is not None and now - last < min(cooldown, self.max_cooldown):
+            self._stats["skipped"] += 1
+            return False
+
+        self._last_grant[key] = now
+        self._last_grant.move_to_end(key)
+        self._stats["granted"] += 1
+        self._prune(now)
+        return True
+
+    def _prune(self, now):
+        entries = self._last_grant
+        while entries:
+            key, last = next(iter(entries.items()))
+            if now - last < self.max_cooldown and len(entries) <= self.max_entries:
+                break
+            del entries[key]
+            if now - last < self.max_cooldown:
+                self._stats["evicted"] += 1
+
+    def get_stats(self):
+        return {"tracked": len(self._last_grant), "max_entries": self.max_entries, **self._stats}